@@ -0,0 +1,84 @@
+"""
+提示词token报告 - 每个返回类型在full / compact两种风格下的提示词开销（不含输入数据）
+
+    python bench/prompt_tokens.py
+    python bench/prompt_tokens.py --type my_pkg.models:Order --type my_pkg.models:Invoice
+
+默认用llm.tokens的估算；安装了tiktoken且能加载编码时改用cl100k_base精确计数
+"""
+import argparse
+import importlib
+import os
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from llm.spec import PROMPT_STYLES, compile_spec
+from llm.tokens import estimate_tokens
+from tools.base import AIResponse, typed_response_model
+
+
+def token_counter() -> Tuple[Callable[[str], int], str]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken cl100k_base"
+    except Exception:
+        return estimate_tokens, "估算"
+
+
+def default_types() -> Dict[str, Any]:
+    from typing import List as ListType
+    from typesystem import Company, Employee
+    return {
+        "str": str,
+        "int": int,
+        "List[str]": ListType[str],
+        "Employee": Employee,
+        "List[Employee]": ListType[Employee],
+        "Company": Company,
+        "AIResponse": AIResponse,
+        "AIResponse[Company]": typed_response_model(Company),
+    }
+
+
+def load_type(path: str) -> Any:
+    """"模块:名称" 形式的类型"""
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def report(types: Dict[str, Any], count: Optional[Callable[[str], int]] = None) -> List[Dict[str, Any]]:
+    """每个类型在各风格下的提示词token数"""
+    count = count or estimate_tokens
+    rows = []
+    for label, t in types.items():
+        row = {"type": label}
+        for style in PROMPT_STYLES:
+            row[style] = count(compile_spec(t, style).build_prompt("", ""))
+        row["saved"] = 1 - row["compact"] / row["full"] if row["full"] else 0.0
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--type", action="append", default=[], help="额外的类型，格式 模块:名称，可重复")
+    args = parser.parse_args()
+
+    types = default_types()
+    for path in args.type:
+        types[path] = load_type(path)
+    count, counter_name = token_counter()
+
+    print(f"提示词token数（不含输入数据，计数方式: {counter_name}）")
+    print(f"{'返回类型':<24}{'full':>8}{'compact':>10}{'节省':>8}")
+    for row in report(types, count):
+        print(f"{row['type']:<24}{row['full']:>8}{row['compact']:>10}{row['saved']:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
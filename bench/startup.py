@@ -0,0 +1,103 @@
+"""
+工具发现启动时间基准 - 比较 eager（启动时导入全部工具模块）与 lazy（按清单懒加载）
+
+生成一批合成工具模块作为插件，每次在新进程中测量 discover() 的耗时和进程总耗时：
+    python bench/startup.py --modules 20 --tools 10 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOOL_TEMPLATE = '''
+class {model}(BaseModel):
+    name: str
+    tags: List[str] = []
+    score: Optional[float] = None
+
+
+@ai_tool(name="{name}", description="合成工具 {name}，用于启动基准")
+def {name}(item: {model}, limit: int = 10, options: Dict[str, int] = None) -> str:
+    return item.name
+'''
+
+CHILD = '''
+import json, os, sys, time
+sys.path.insert(0, {plugin_dir!r})
+import tools.base
+# 包导入时已按默认清单发现了内置工具，基准使用单独的清单文件
+os.environ["TOOL_MANIFEST_PATH"] = {manifest!r}
+from tools import discovery
+from tools.base import registry
+modules = {modules!r}
+discovery.local_modules = lambda: {{}}
+discovery.plugin_modules = lambda: modules
+start = time.perf_counter()
+discovery.discover(registry, lazy={lazy!r})
+print(json.dumps({{"discover": time.perf_counter() - start, "tools": len(registry.tools)}}))
+'''
+
+
+def write_plugins(directory: str, module_count: int, tools_per_module: int) -> dict:
+    modules = {}
+    for m in range(module_count):
+        name = f"bench_tools_{m}"
+        parts = ["from typing import Dict, List, Optional",
+                 "from pydantic import BaseModel",
+                 "from tools.base import ai_tool"]
+        for t in range(tools_per_module):
+            parts.append(TOOL_TEMPLATE.format(model=f"Item{m}_{t}", name=f"tool_{m}_{t}"))
+        path = os.path.join(directory, f"{name}.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(parts))
+        modules[name] = path
+    return modules
+
+
+def run_child(plugin_dir: str, modules: dict, lazy: bool, manifest: str) -> dict:
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    code = CHILD.format(plugin_dir=plugin_dir, modules=modules, lazy=lazy, manifest=manifest)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", type=int, default=20)
+    parser.add_argument("--tools", type=int, default=10, help="每个模块的工具数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        modules = write_plugins(directory, args.modules, args.tools)
+        manifest = os.path.join(directory, "manifest.json")
+
+        results = {"eager": [], "lazy(冷清单)": [], "lazy(热清单)": []}
+        for _ in range(args.repeat):
+            results["eager"].append(run_child(directory, modules, False, manifest))
+            if os.path.exists(manifest):
+                os.remove(manifest)
+            results["lazy(冷清单)"].append(run_child(directory, modules, True, manifest))
+            results["lazy(热清单)"].append(run_child(directory, modules, True, manifest))
+
+    print(f"{args.modules}个模块 x {args.tools}个工具，重复{args.repeat}次（中位数）")
+    print(f"{'模式':<14}{'discover(ms)':>14}{'进程总耗时(ms)':>18}")
+    for mode, runs in results.items():
+        discover_ms = statistics.median(r["discover"] for r in runs) * 1000
+        process_ms = statistics.median(r["process"] for r in runs) * 1000
+        print(f"{mode:<14}{discover_ms:>14.1f}{process_ms:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+吞吐基准 - 用FakeBackend在无网络环境下测量框架自身开销与并发吞吐
+
+    python bench/throughput.py --requests 500 --concurrency 50 --latency uniform:0.05,0.2
+
+latency为0时测到的就是每次调用的框架开销（提示词构建、解析、校验）
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+from llm.backend import FakeBackend, use_backend
+from llm.chat import ALLMChat, LLMChat
+from llm.toolchat import AToolChat
+
+
+class Employee(BaseModel):
+    name: str
+    age: int
+    skills: List[str]
+
+
+async def _timed(coro, latencies: List[float]):
+    started = time.perf_counter()
+    await coro
+    latencies.append(time.perf_counter() - started)
+
+
+async def run_async(requests: int, concurrency: int, factory) -> dict:
+    limiter = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one():
+        async with limiter:
+            await _timed(factory(), latencies)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def overhead(requests: int) -> float:
+    """无延迟时同步LLMChat的平均耗时（微秒）"""
+    started = time.perf_counter()
+    for _ in range(requests):
+        LLMChat("张三，28岁，会Python和Go", "提取员工信息", Employee)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", default="uniform:0.05,0.2", help="FakeBackend延迟分布")
+    args = parser.parse_args()
+
+    with use_backend(FakeBackend()):
+        print(f"框架开销（LLMChat -> Employee，无延迟）: {overhead(args.requests):.0f} µs/次")
+
+    script = [[{"name": "add_numbers", "args": {"a": 1, "b": 2}}]]
+    with use_backend(FakeBackend(latency=args.latency, tool_script=script)):
+        cases = {
+            "ALLMChat": lambda: ALLMChat("张三，28岁，会Python和Go", "提取员工信息", Employee),
+            "AToolChat(2轮)": lambda: AToolChat("", "计算1+2", int),
+        }
+        print(f"\n{args.requests}个请求，并发{args.concurrency}，延迟 {args.latency}")
+        print(f"{'场景':<16}{'吞吐(次/秒)':>12}{'p50(ms)':>10}{'p99(ms)':>10}")
+        for name, factory in cases.items():
+            result = asyncio.run(run_async(args.requests, args.concurrency, factory))
+            print(f"{name:<16}{result['throughput']:>12.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
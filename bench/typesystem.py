@@ -0,0 +1,254 @@
+"""
+类型系统微基准 - describe / generate / schema示例 / 解析 / 校验，不需要网络
+
+    python bench/typesystem.py                   # 运行并与基线比较，退化超过阈值时退出码为1
+    python bench/typesystem.py --save-baseline   # 重新生成基线
+    python bench/typesystem.py --filter parse --threshold 0.5
+
+覆盖标量、List[T]和多层嵌套的Pydantic模型（Company -> Employee -> Contact -> Address），
+响应从几个字节到数MB。每个用例取多轮中最快一轮的单次耗时，并除以紧挨着测量的
+固定负载耗时得到相对值；基线比较的是相对值，减小不同机器和调度状态之间的差异
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, Field
+from llm.chat import create_typed_object, describe_type, generate_example, parse_to_type, schema_to_example
+from llm.spec import OutputSpec
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "typesystem_baseline.json")
+
+
+class Address(BaseModel):
+    street: str = Field(description="街道地址")
+    city: str = Field(description="城市")
+    country: str = Field(default="中国", description="国家")
+    zipcode: str = Field(description="邮编")
+
+
+class Contact(BaseModel):
+    phone: str = Field(description="电话号码")
+    email: str = Field(description="邮箱地址")
+    address: Address = Field(description="地址信息")
+
+
+class Department(BaseModel):
+    name: str = Field(description="部门名称")
+    floor: int = Field(description="楼层")
+    manager: str = Field(description="部门经理")
+
+
+class Employee(BaseModel):
+    name: str = Field(description="员工姓名")
+    age: int = Field(description="年龄")
+    position: str = Field(description="职位")
+    salary: float = Field(description="薪资")
+    contact: Contact = Field(description="联系方式")
+    department: Department = Field(description="所属部门")
+    skills: List[str] = Field(description="技能列表")
+
+
+class Company(BaseModel):
+    name: str = Field(description="公司名称")
+    founded_year: int = Field(description="成立年份")
+    headquarters: Address = Field(description="总部地址")
+    employees: List[Employee] = Field(description="员工列表")
+    departments: List[Department] = Field(description="部门列表")
+
+
+def _address(i: int) -> dict:
+    return {"street": f"建国路{i}号", "city": "北京", "country": "中国", "zipcode": f"{100000 + i}"}
+
+
+def _employee(i: int) -> dict:
+    return {
+        "name": f"员工{i}", "age": 20 + i % 40, "position": "工程师", "salary": 10000.0 + i,
+        "contact": {"phone": f"138{i:08d}", "email": f"user{i}@example.com", "address": _address(i)},
+        "department": {"name": "技术部", "floor": i % 20, "manager": "李经理"},
+        "skills": ["Python", "Go", "SQL"],
+    }
+
+
+def company_json(target_bytes: int) -> str:
+    """大约target_bytes字节的Company响应"""
+    unit = len(json.dumps(_employee(0), ensure_ascii=False).encode("utf-8"))
+    count = max(1, target_bytes // unit)
+    company = {
+        "name": "示例公司", "founded_year": 2000, "headquarters": _address(0),
+        "employees": [_employee(i) for i in range(count)],
+        "departments": [{"name": f"部门{i}", "floor": i, "manager": f"经理{i}"} for i in range(10)],
+    }
+    return json.dumps(company, ensure_ascii=False)
+
+
+def int_list_json(target_bytes: int) -> str:
+    # 7位整数加分隔符约9字节
+    return json.dumps(list(range(1000000, 1000000 + max(1, target_bytes // 9))))
+
+
+def _size_label(text: str) -> str:
+    size = len(text.encode("utf-8"))
+    if size < 1024:
+        return f"{size}B"
+    if size < 1024 * 1024:
+        return f"{size // 1024}KB"
+    return f"{size / 1024 / 1024:.1f}MB"
+
+
+def build_cases(quick: bool = False) -> List[Tuple[str, Callable[[], object]]]:
+    """(用例名, 无参函数)；quick=True时跳过MB级响应"""
+    sizes = [1024, 100 * 1024] if quick else [1024, 100 * 1024, 2 * 1024 * 1024]
+    types = {"int": int, "List[int]": List[int], "Employee": Employee, "Company": Company}
+    cases = []
+    for label, t in types.items():
+        cases.append((f"describe_type/{label}", lambda t=t: describe_type(t)))
+    for label, t in types.items():
+        cases.append((f"generate_example/{label}", lambda t=t: generate_example(t)))
+    for label, t in (("Employee", Employee), ("Company", Company)):
+        schema = t.model_json_schema()
+        cases.append((f"schema_to_example/{label}", lambda s=schema: schema_to_example(s)))
+
+    cases.append(("parse_to_type/int/2B", lambda: parse_to_type("42", int)))
+    for size in sizes:
+        text = int_list_json(size)
+        cases.append((f"parse_to_type/List[int]/{_size_label(text)}", lambda x=text: parse_to_type(x, List[int])))
+
+    spec = OutputSpec(Company)
+    for size in sizes:
+        text = company_json(size)
+        data = json.loads(text)
+        label = _size_label(text)
+        cases.append((f"parse_to_type/Company/{label}", lambda x=text: parse_to_type(x, Company)))
+        cases.append((f"create_typed_object/Company/{label}", lambda d=data: create_typed_object(d, Company)))
+        cases.append((f"spec.parse/Company/{label}", lambda x=text: spec.parse(x)))
+        cases.append((f"spec.parse_strict/Company/{label}", lambda x=text: spec.parse_strict(x)))
+    return cases
+
+
+def _timed(func: Callable[[], object], number: int) -> float:
+    # 与timeit一样计时期间关闭GC，避免回收时机造成的双峰分布
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure(func: Callable[[], object], min_time: float = 0.05, repeat: int = 5) -> float:
+    """单次耗时（秒）：自动确定每轮次数使一轮不短于min_time，取repeat轮中最快的一轮"""
+    number = 1
+    while True:
+        elapsed = _timed(func, number)
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        best = min(best, _timed(func, number) / number)
+    return best
+
+
+def _calibration_work(payload: str = json.dumps([{"id": i, "name": f"n{i}", "tags": ["a", "b"]} for i in range(200)])):
+    data = json.loads(payload)
+    return sum(len(item["name"]) for item in data if item["id"] % 3)
+
+
+def calibration() -> float:
+    """固定的纯Python+json负载的耗时，紧挨着每个用例测量，用于抵消机器和调度状态的差异"""
+    return measure(_calibration_work, min_time=0.02, repeat=5)
+
+
+def run_case(func: Callable[[], object], min_time: float = 0.05, repeat: int = 5) -> Dict[str, float]:
+    """{"seconds": 单次耗时, "relative": 相对校准负载的倍数}"""
+    calib = calibration()
+    seconds = measure(func, min_time=min_time, repeat=repeat)
+    calib = min(calib, calibration())
+    return {"seconds": seconds, "relative": seconds / calib}
+
+
+def load_baseline(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict, threshold: float) -> List[str]:
+    """返回相对耗时比基线高出threshold以上的用例名"""
+    base_results = baseline.get("results", {})
+    return [name for name, result in results.items()
+            if name in base_results and result["relative"] > base_results[name]["relative"] * (1 + threshold)]
+
+
+def _format_time(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写为基线")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的退化比例，默认0.25即慢25%%")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--quick", action="store_true", help="跳过MB级响应并缩短计时")
+    args = parser.parse_args()
+
+    min_time = 0.01 if args.quick else 0.05
+    baseline = {} if args.save_baseline else load_baseline(args.baseline)
+    base_results = baseline.get("results", {})
+
+    results: Dict[str, Dict] = {}
+    cases = {name: func for name, func in build_cases(args.quick) if args.filter in name}
+    print(f"{'用例':<44}{'耗时':>12}{'相对':>10}{'基线':>10}{'变化':>9}")
+    for name, func in cases.items():
+        result = results[name] = run_case(func, min_time=min_time)
+        line = f"{name:<44}{_format_time(result['seconds']):>12}{result['relative']:>10.3f}"
+        if name in base_results:
+            expected = base_results[name]["relative"]
+            print(f"{line}{expected:>10.3f}{(result['relative'] / expected - 1) * 100:>+8.0f}%")
+        else:
+            print(f"{line}{'-':>10}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已写入 {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    # 偶发的调度抖动很常见：超阈值的用例重测几次，取最好的一次再确认
+    for _ in range(3):
+        if not regressions:
+            break
+        for name in regressions:
+            retry = run_case(cases[name], min_time=min_time * 2, repeat=9)
+            if retry["relative"] < results[name]["relative"]:
+                results[name] = retry
+        regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} 个用例比基线慢{args.threshold:.0%}以上: {', '.join(regressions)}")
+        return 1
+    print("\n✅ 没有超过阈值的退化" if base_results else "\n没有基线，使用 --save-baseline 生成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
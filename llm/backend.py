@@ -0,0 +1,300 @@
+"""
+LLM后端 - LLMChat/ToolChat通过get_llm()拿到的对象只需满足LLMBackend协议
+默认是连接池中的ChatOpenAI；FakeBackend在进程内按返回类型生成合法响应，
+可脚本化工具调用并模拟延迟分布，用于离线压测和测量框架自身开销
+"""
+import asyncio
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Protocol, Sequence, Union, \
+    runtime_checkable
+from langchain_core.messages import AIMessage, AIMessageChunk
+from llm import client
+from llm.tokens import estimate_tokens
+
+
+@runtime_checkable
+class LLMBackend(Protocol):
+    """框架用到的LangChain聊天模型接口子集"""
+
+    def invoke(self, messages: Sequence[Any]) -> AIMessage: ...
+
+    async def ainvoke(self, messages: Sequence[Any]) -> AIMessage: ...
+
+    def stream(self, messages: Sequence[Any]) -> Iterator[AIMessageChunk]: ...
+
+    def astream(self, messages: Sequence[Any]) -> AsyncIterator[AIMessageChunk]: ...
+
+    def bind_tools(self, tools: List[Dict]) -> "LLMBackend": ...
+
+    def with_structured_output(self, schema: Any, method: str = None, include_raw: bool = False) -> Any: ...
+
+
+def set_backend(backend: Optional[LLMBackend]):
+    """替换全局后端；传None恢复默认的ChatOpenAI连接池"""
+    client.set_backend_override(backend)
+
+
+def get_backend() -> LLMBackend:
+    return client.get_llm()
+
+
+class use_backend:
+    """临时替换后端的上下文管理器：with use_backend(FakeBackend()): ..."""
+
+    def __init__(self, backend: LLMBackend):
+        self.backend = backend
+        self._previous = None
+
+    def __enter__(self) -> LLMBackend:
+        self._previous = client.get_backend_override()
+        set_backend(self.backend)
+        return self.backend
+
+    def __exit__(self, *exc):
+        set_backend(self._previous)
+
+
+class OpenAIBackend:
+    """OpenAI兼容接口的后端：每次调用从连接池取客户端，配置刷新后自动生效"""
+
+    def __init__(self, model: str = None, temperature: float = None, base_url: str = None, api_key: str = None):
+        self.options = (model, temperature, base_url, api_key)
+
+    def _client(self):
+        return client.client_pool.get(*self.options)
+
+    def invoke(self, messages):
+        return self._client().invoke(messages)
+
+    async def ainvoke(self, messages):
+        return await self._client().ainvoke(messages)
+
+    def stream(self, messages):
+        return self._client().stream(messages)
+
+    def astream(self, messages):
+        return self._client().astream(messages)
+
+    def bind_tools(self, tools):
+        return self._client().bind_tools(tools)
+
+    def with_structured_output(self, schema, method: str = None, include_raw: bool = False):
+        return self._client().with_structured_output(schema, method=method, include_raw=include_raw)
+
+
+LatencySpec = Union[None, float, str, Callable[[random.Random], float]]
+
+
+def make_latency(spec: LatencySpec) -> Callable[[random.Random], float]:
+    """
+    延迟分布（秒）：None/0为无延迟，数字为固定延迟，可调用对象接收Random返回延迟，
+    字符串写法 "uniform:0.1,0.5" / "normal:0.3,0.05" / "lognormal:-1.2,0.4" / "exponential:0.3"
+    """
+    if spec is None or spec == 0:
+        return lambda rng: 0.0
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    name, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if name == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if name == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    if name == "exponential":
+        return lambda rng: rng.expovariate(1 / values[0])
+    try:
+        return make_latency(float(spec))
+    except ValueError:
+        raise ValueError(f"不支持的延迟分布: {spec}") from None
+
+
+_FORMAT = re.compile(r"输出格式:\n(.*?)\n(?:\n重要:|字段说明:|只输出)", re.S)
+_STEP = re.compile(r"步骤(\d+)")
+_PACK_ITEM = re.compile(r"^\[(\d+)\] ", re.M)
+
+
+class FakeBackend:
+    """
+    进程内的确定性假后端
+
+    Args:
+        latency: 每次请求的延迟分布，见make_latency
+        tool_script: ToolChat每一轮要发出的工具调用，如 [[{"name": "add_numbers", "args": {"a": 1, "b": 2}}]]；
+            脚本用完后给出最终结果
+        final_message: 直接回复时的文本
+        seed: 延迟采样的随机种子
+        chunk_size: 流式输出时每个片段的字符数
+
+    提示词模式下返回提示词中“输出格式”示例对应的JSON（即目标类型的合法实例）；
+    轮次由上下文中已有的步骤数推断，因此同一个实例可以被并发的多个ToolChat共用
+    """
+
+    def __init__(self, latency: LatencySpec = None, tool_script: List[List[Dict]] = None,
+                 final_message: str = "任务完成", seed: int = 0, chunk_size: int = 8):
+        self.latency = make_latency(latency)
+        self.tool_script = tool_script or []
+        self.final_message = final_message
+        self.chunk_size = chunk_size
+        self.tools: List[Dict] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = {"calls": 0}
+
+    @property
+    def calls(self) -> int:
+        """收到的请求数（包括bind_tools/with_structured_output派生的调用）"""
+        return self._counter["calls"]
+
+    def _delay(self) -> float:
+        with self._lock:
+            self._counter["calls"] += 1
+            return self.latency(self._rng)
+
+    def bind_tools(self, tools: List[Dict]) -> "FakeBackend":
+        bound = copy.copy(self)
+        bound.tools = list(tools)
+        return bound
+
+    def with_structured_output(self, schema: Any, method: str = None, include_raw: bool = False):
+        return _FakeStructured(self, schema, include_raw)
+
+    def invoke(self, messages):
+        time.sleep(self._delay())
+        return self._respond(_prompt(messages))
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self._delay())
+        return self._respond(_prompt(messages))
+
+    def stream(self, messages):
+        time.sleep(self._delay())
+        yield from self._chunks(self._respond(_prompt(messages)))
+
+    async def astream(self, messages):
+        await asyncio.sleep(self._delay())
+        for chunk in self._chunks(self._respond(_prompt(messages))):
+            yield chunk
+
+    def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+        text = message.content
+        for i in range(0, len(text), self.chunk_size):
+            yield AIMessageChunk(content=text[i:i + self.chunk_size])
+
+    def _respond(self, prompt: str) -> AIMessage:
+        if self.tools:
+            return self._tool_message(prompt)
+        return _message(prompt, self._text(prompt))
+
+    def _turn_calls(self, prompt: str) -> Optional[List[Dict]]:
+        steps = [int(n) for n in _STEP.findall(prompt)]
+        turn = max(steps) if steps else 0
+        return self.tool_script[turn] if turn < len(self.tool_script) else None
+
+    def _tool_message(self, prompt: str) -> AIMessage:
+        """原生tool calling：按脚本发出工具调用，脚本用完后调用final_answer或直接回复"""
+        calls = self._turn_calls(prompt)
+        if calls is None:
+            final = next((tool for tool in self.tools if tool["function"]["name"] == "final_answer"), None)
+            if final is None:
+                return _message(prompt, self.final_message)
+            from llm.chat import schema_to_example
+            calls = [{"name": "final_answer", "args": schema_to_example(final["function"]["parameters"])}]
+        tool_calls = [{"name": call["name"], "args": call.get("args", {}), "id": f"call_{i}", "type": "tool_call"}
+                      for i, call in enumerate(calls)]
+        return AIMessage(content="", tool_calls=tool_calls,
+                         usage_metadata=_usage(prompt, json.dumps(tool_calls, ensure_ascii=False)))
+
+    def _text(self, prompt: str) -> str:
+        """提示词模式：返回示例对应的合法JSON"""
+        # 输入数据里也可能出现“输出格式”，取最后一处（提示词尾部）
+        formats = _FORMAT.findall(prompt)
+        if not formats:
+            return self.final_message
+        try:
+            example = json.loads(formats[-1])
+        except json.JSONDecodeError:
+            return self.final_message
+
+        if isinstance(example, dict) and "response_type" in example:
+            example = self._toolchat_reply(prompt, example)
+        elif isinstance(example, list) and example and isinstance(example[0], dict) and "index" in example[0]:
+            # 打包请求：每条输入一个元素
+            indices = [int(n) for n in _PACK_ITEM.findall(prompt)] or [0]
+            example = [{**example[0], "index": i} for i in indices]
+        if isinstance(example, str):
+            return example
+        return json.dumps(example, ensure_ascii=False)
+
+    def _toolchat_reply(self, prompt: str, example: Dict) -> Dict:
+        calls = self._turn_calls(prompt)
+        if calls is not None:
+            return {"response_type": "tool_call",
+                    "tool_calls": [{"name": call["name"], "parameters": call.get("args", {})} for call in calls]}
+        reply = {"response_type": "direct_reply", "message": self.final_message}
+        if example.get("result") is not None:
+            reply["result"] = example["result"]
+        return reply
+
+
+class _FakeStructured:
+    """with_structured_output的假实现：返回由Schema生成的合法对象"""
+
+    def __init__(self, backend: FakeBackend, schema: Any, include_raw: bool):
+        self.backend = backend
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _result(self, prompt: str):
+        from llm.chat import generate_example
+        data = generate_example(self.schema)
+        raw = _message(prompt, json.dumps(data, ensure_ascii=False))
+        try:
+            parsed, error = self.schema.model_validate(data), None
+        except Exception as e:
+            parsed, error = None, e
+        if self.include_raw:
+            return {"raw": raw, "parsed": parsed, "parsing_error": error}
+        if error is not None:
+            raise error
+        return parsed
+
+    def invoke(self, messages):
+        time.sleep(self.backend._delay())
+        return self._result(_prompt(messages))
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.backend._delay())
+        return self._result(_prompt(messages))
+
+
+def _prompt(messages: Sequence[Any]) -> str:
+    return "\n".join(str(getattr(message, "content", message)) for message in messages)
+
+
+def _usage(prompt: str, text: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(text)
+    return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _message(prompt: str, text: str) -> AIMessage:
+    return AIMessage(content=text, usage_metadata=_usage(prompt, text))
+
+
+def backend_from_settings(name: str) -> Optional[LLMBackend]:
+    """LLM_BACKEND环境变量对应的后端；openai返回None表示使用默认连接池"""
+    if name in ("", "openai"):
+        return None
+    if name == "fake":
+        return FakeBackend(latency=os.getenv("LLM_FAKE_LATENCY") or None)
+    raise ValueError(f"不支持的LLM_BACKEND: {name}")
@@ -0,0 +1,138 @@
+"""
+批量提取 - 同一个问题和返回类型作用于大量输入
+输出规格只编译一次，请求并发执行，结果按输入顺序（或完成顺序）流式返回
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
+from llm.chat import call_llm, acall_llm
+from llm.scheduler import in_lane
+from llm.spec import OutputSpec, compile_spec
+
+
+class BatchResult:
+    """单条输入的结果，失败时value为None、error为异常对象（不回退默认值）"""
+
+    __slots__ = ("index", "data", "value", "error")
+
+    def __init__(self, index: int, data: Any, value: Any = None, error: Optional[Exception] = None):
+        self.index = index
+        self.data = data
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return f"BatchResult({self.index}, value={self.value!r})"
+        return f"BatchResult({self.index}, error={self.error!r})"
+
+
+@in_lane("batch")
+def _extract(spec: OutputSpec, index: int, data: Any, question: str) -> BatchResult:
+    try:
+        text = call_llm(spec.build_prompt(data, question), spec.return_type)
+        return BatchResult(index, data, spec.parse_strict(text))
+    except Exception as e:
+        return BatchResult(index, data, error=e)
+
+
+def LLMBatch(inputs: Iterable[Any], question: str, return_type: Any = str,
+             max_workers: int = 8, ordered: bool = True) -> Iterator[BatchResult]:
+    """
+    批量版LLMChat（线程池）
+
+    Args:
+        inputs: 任意可迭代输入，按需读取，不会一次性载入内存
+        question: 处理要求
+        return_type: 返回类型
+        max_workers: 并发请求数
+        ordered: True按输入顺序返回，False按完成顺序返回
+
+    Yields:
+        BatchResult
+    """
+    spec = compile_spec(return_type)
+    window = max_workers * 2
+    source = enumerate(inputs)
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+
+    def fill():
+        while len(pending) < window:
+            try:
+                index, data = next(source)
+            except StopIteration:
+                return
+            pending.append(pool.submit(_extract, spec, index, data, question))
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+            fill()
+    finally:
+        # 调用方提前停止迭代时，丢弃尚未开始的请求
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def ALLMBatch(inputs: Iterable[Any], question: str, return_type: Any = str,
+                    concurrency: int = 32, ordered: bool = True) -> AsyncIterator[BatchResult]:
+    """
+    批量版ALLMChat（单事件循环）
+
+    Args:
+        concurrency: 同时在途的请求数
+        其余参数同LLMBatch
+    """
+    spec = compile_spec(return_type)
+    source = enumerate(inputs)
+    pending = {}
+    buffered = {}
+    next_index = 0
+
+    @in_lane("batch")
+    async def run(index: int, data: Any) -> BatchResult:
+        try:
+            text = await acall_llm(spec.build_prompt(data, question), spec.return_type)
+            return BatchResult(index, data, spec.parse_strict(text))
+        except Exception as e:
+            return BatchResult(index, data, error=e)
+
+    def fill():
+        # 按序输出时，已完成但未轮到的结果也计入窗口，避免慢请求导致缓冲无限增长
+        while len(pending) < concurrency and len(pending) + len(buffered) < concurrency * 2:
+            try:
+                index, data = next(source)
+            except StopIteration:
+                return
+            pending[asyncio.ensure_future(run(index, data))] = index
+
+    try:
+        fill()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del pending[task]
+                result = task.result()
+                if not ordered:
+                    yield result
+                else:
+                    buffered[result.index] = result
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                next_index += 1
+            fill()
+    finally:
+        for task in pending:
+            task.cancel()
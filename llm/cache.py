@@ -0,0 +1,194 @@
+"""
+LLM响应缓存 - 内存LRU + SQLite两级缓存（按需开启）
+缓存的是模型原始文本，解析逻辑变化不会让缓存失效
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from llm.config import get_settings
+
+
+class ResponseCache:
+    """
+    两级响应缓存
+
+    Args:
+        path: SQLite文件路径，为None时只使用内存层
+        max_size: 磁盘层最大条目数，超出后淘汰最久未访问的条目
+        memory_size: 内存LRU层最大条目数
+        ttl: 过期秒数，为None时永不过期
+        cache_nondeterministic: temperature>0时是否也缓存（默认跳过）
+    """
+
+    def __init__(self, path: str = None, max_size: int = 100000, memory_size: int = 1024,
+                 ttl: float = None, cache_nondeterministic: bool = False):
+        self.path = path
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.cache_nondeterministic = cache_nondeterministic
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0,
+                       "skipped": 0, "sets": 0, "evictions": 0}
+        self._db = None
+        self._disk_count = 0
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self._db.commit()
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def make_key(self, prompt: str, return_type: Any = None,
+                 model: str = None, temperature: float = None) -> Optional[str]:
+        """生成缓存键；temperature>0且未允许缓存时返回None"""
+        settings = get_settings()
+        model = model or settings.model
+        temperature = settings.temperature if temperature is None else temperature
+        if temperature > 0 and not self.cache_nondeterministic:
+            with self._lock:
+                self._stats["skipped"] += 1
+            return None
+
+        digest = hashlib.sha256()
+        for part in (model, repr(float(temperature)), repr(return_type), prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[0], row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """写入缓存"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["sets"] += 1
+            if self._db is None:
+                return
+
+            cursor = self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._disk_count += cursor.rowcount
+            if self._disk_count > self.max_size:
+                self._evict_disk()
+            self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _evict_disk(self):
+        """淘汰最久未访问的条目（一次多删10%，避免每次写入都触发淘汰）"""
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self._disk_count - int(self.max_size * 0.9)
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+            self._stats["evictions"] += excess
+            self._disk_count -= excess
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+                self._disk_count = 0
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中等计数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._memory)
+            stats["disk_size"] = self._disk_count
+            return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return self._disk_count if self._db is not None else len(self._memory)
+
+
+def _cache_from_env() -> Optional[ResponseCache]:
+    """设置LLM_CACHE_PATH（或LLM_CACHE=memory）时自动开启缓存"""
+    path = os.getenv("LLM_CACHE_PATH")
+    mode = os.getenv("LLM_CACHE", "").lower()
+    if not path and mode != "memory":
+        return None
+    ttl = os.getenv("LLM_CACHE_TTL")
+    return ResponseCache(
+        path=path or None,
+        max_size=int(os.getenv("LLM_CACHE_MAX_SIZE") or 100000),
+        ttl=float(ttl) if ttl else None,
+        cache_nondeterministic=os.getenv("LLM_CACHE_NONDETERMINISTIC", "false").lower() == "true",
+    )
+
+
+# 全局响应缓存（默认关闭）
+response_cache: Optional[ResponseCache] = _cache_from_env()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    return response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """开启（传入ResponseCache）或关闭（传入None）全局响应缓存"""
+    global response_cache
+    response_cache = cache
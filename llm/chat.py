@@ -2,18 +2,27 @@
 最通用的LLM类型系统 - 一切皆可描述，一切皆可示例
 核心思想：任何类型都可以用"自然语言描述+完美示例"来表达
 """
-import os
-import json
+import asyncio
 import re
-from typing import Any, get_origin, get_args
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+import time
+import types
+from typing import Any, Optional, Union, get_origin, get_args
 from langchain.schema import HumanMessage
+from llm.cache import get_response_cache
+from llm.client import get_llm
+from llm.config import get_settings
+from llm.flow import Call, Flow, run_async, run_sync
+from llm.jsonparse import OutputValidationError, is_model_type, loads, validate_json
+from llm.metrics import metrics, usage_tokens
+from llm.scheduler import get_scheduler
+from llm.tokens import estimate_tokens
 
-load_dotenv()
+# Optional[X] / X | None 的origin
+_UNION_ORIGINS = (Union, types.UnionType)
 
 
-def LLMChat(data: Any, question: str, return_type: Any = str) -> Any:
+def LLMChat(data: Any, question: str, return_type: Any = str, mode: str = None, strict: bool = False,
+            chunk: bool = None) -> Any:
     """
     最通用的LLM接口 - 一个函数处理任意类型
     
@@ -22,44 +31,224 @@ def LLMChat(data: Any, question: str, return_type: Any = str) -> Any:
     2. 生成该类型的完美示例
     3. 用统一的万能提示词
     4. 用统一的万能解析器
+
+    1、2步的产物按返回类型预编译并缓存（见llm.spec），每次调用只需填入数据和问题
+
+    mode="native"时改用服务商的原生结构化输出（见llm.native），
+    类型或后端不支持时自动回退到上面的提示词模式；默认取LLM_OUTPUT_MODE
+
+    chunk=True时把data分段并发提取再合并（见llm.chunking）；默认None时只在设置了LLM_CHUNK_THRESHOLD
+    且data超过该token数时分段，False时从不分段（如ToolChat的决策提示词不能被拆开）
+
+    输出无法解析为目标类型时返回默认值；strict=True时改为抛出OutputValidationError
+    分段提取有段失败时返回成功的段合并出的结果；strict=True时改为抛出llm.chunking.PartialResultError
     """
+    record = metrics.start("llm_chat", return_type=_type_label(return_type))
     try:
-        # 1. 通用类型描述器
-        description = describe_type(return_type)
-        example = generate_example(return_type)
-        
-        # 2. 万能提示词 - 真正通用版本
-        prompt = f"""从输入中提取信息并转换为JSON格式。
+        return run_sync(_chat_flow(data, question, return_type, mode, chunk, record))
+    except Exception as e:
+        return _chat_error(record, e, return_type, strict)
+    finally:
+        metrics.finish(record)
 
-输入: {str(data)}
-任务: {question}
 
-输出类型: {description}
-输出格式:
-{json.dumps(example, ensure_ascii=False, indent=2)}
+async def ALLMChat(data: Any, question: str, return_type: Any = str,
+                   limiter: asyncio.Semaphore = None, timeout: float = None, mode: str = None,
+                   strict: bool = False, chunk: bool = None) -> Any:
+    """
+    LLMChat的异步版本 - 与同步版本共用同一个流程（见_chat_flow）
 
-重要: 严格按照上述格式返回，所有嵌套对象都必须保持完整的对象结构。
+    Args:
+        limiter: 多个调用共享的并发限制器，为None时不限制
+        timeout: 整个调用（含排队等待）的超时秒数，超时返回默认值
+        strict: 输出无法解析为目标类型时抛出OutputValidationError，而不是返回默认值；
+            分段提取有段失败时抛出PartialResultError，而不是返回不完整的结果
+        chunk: 长输入分段，含义与LLMChat相同
 
-输出:"""
-        
-        # 3. LLM调用
-        llm = ChatOpenAI(
-            model=os.getenv("OPENAI_MODEL_ID", "gpt-3.5-turbo"),
-            temperature=float(os.getenv("OPENAI_LLM_TEMPERATURE", 0.1)),
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            openai_api_base=os.getenv("OPENAI_BASE_URL")
-        )
-        response = llm.invoke([HumanMessage(content=prompt)])
-
-        if os.getenv("DEBUG", "false").lower() == "true":
-            print(f"响应:\n{response.content}")
-        
-        # 4. 万能解析器
-        return parse_to_type(response.content.strip(), return_type)
-        
-    except Exception as e:
-        print(f"LLMChat错误: {e}")
+    任务被取消时CancelledError会正常向上传播
+    """
+    record = metrics.start("llm_chat", return_type=_type_label(return_type))
+
+    async def _run() -> Any:
+        return await run_async(_chat_flow(data, question, return_type, mode, chunk, record))
+
+    try:
+        call = _run() if limiter is None else _limited(limiter, _run)
+        if timeout is None:
+            return await call
+        return await asyncio.wait_for(call, timeout)
+
+    except asyncio.TimeoutError as e:
+        print(f"LLMChat超时: {timeout}秒")
+        _failed(record, e)
         return get_default_value(return_type)
+    except Exception as e:
+        return _chat_error(record, e, return_type, strict)
+    finally:
+        metrics.finish(record)
+
+
+def _chat_flow(data: Any, question: str, return_type: Any, mode: Optional[str], chunk: Optional[bool],
+               record: Optional[dict]) -> Flow:
+    """LLMChat / ALLMChat共用的流程：分段 -> 原生结构化输出 -> 提示词 + 请求 + 解析"""
+    # llm.spec / llm.native / llm.chunking依赖本模块，延迟导入避免循环引用
+    from llm.spec import compile_spec
+    from llm.native import NativeUnsupportedError, anative_chat, native_chat
+    from llm.chunking import amap_reduce_chat, map_reduce_chat, needs_chunking
+
+    if chunk or (chunk is None and needs_chunking(data)):
+        return (yield Call(map_reduce_chat, amap_reduce_chat, data, question, return_type))
+
+    if (mode or get_settings().output_mode) == "native":
+        try:
+            return (yield Call(native_chat, anative_chat, data, question, return_type))
+        except NativeUnsupportedError:
+            pass
+
+    # 1. 预编译的输出规格（类型描述 + 示例 + 校验器）
+    started = time.perf_counter()
+    spec = compile_spec(return_type)
+
+    # 2. 万能提示词 - 真正通用版本
+    prompt = spec.build_prompt(data, question)
+    _elapsed(record, "prompt_build_seconds", started)
+
+    # 3. LLM调用 + 4. 万能解析器
+    text = yield Call(call_llm, acall_llm, prompt, return_type)
+    started = time.perf_counter()
+    try:
+        return spec.parse(text)
+    finally:
+        _elapsed(record, "parse_seconds", started)
+
+
+def _chat_error(record: Optional[dict], error: Exception, return_type: Any, strict: bool) -> Any:
+    """记录失败并返回默认值；strict时解析错误和分段的部分失败继续抛出，否则部分失败返回不完整的结果"""
+    from llm.chunking import PartialResultError
+    if isinstance(error, PartialResultError) and not strict:
+        print(f"⚠️ {error}，只合并了成功的段")
+        return error.value
+    _failed(record, error)
+    if strict and isinstance(error, (OutputValidationError, PartialResultError)):
+        raise error
+    print(f"LLMChat错误: {error}")
+    return get_default_value(return_type)
+
+
+def _type_label(return_type: Any) -> str:
+    return getattr(return_type, "__name__", None) or str(return_type)
+
+
+def _elapsed(record: Optional[dict], key: str, started: float):
+    """指标开启时记录从started到现在的耗时"""
+    if record is not None:
+        record[key] = record.get(key, 0) + time.perf_counter() - started
+
+
+def _failed(record: Optional[dict], error: Exception):
+    if record is not None:
+        record["errors"] = 1
+        record["error"] = f"{type(error).__name__}: {error}"
+
+
+def _record_response(record: Optional[dict], prompt: str, response: Any, started: float):
+    """记录一次网络请求的延迟和token用量（服务商没有返回用量时按估算）"""
+    if record is None:
+        return
+    # 调度器中的排队和退避等待单独记录在scheduler_wait_seconds
+    record["latency_seconds"] = time.perf_counter() - started - record.get("scheduler_wait_seconds", 0)
+    usage = usage_tokens(response)
+    if usage is None:
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(response.content)}
+    record.update(usage)
+
+
+async def _limited(limiter: asyncio.Semaphore, func):
+    async with limiter:
+        return await func()
+
+
+def call_llm(prompt: str, return_type: Any = None) -> str:
+    """
+    发送提示词并返回原始文本（客户端来自进程级连接池）
+
+    开启响应缓存时（见llm.cache），相同的(提示词, 模型, 温度, 返回类型)直接返回缓存文本；
+    请求经过全局调度器（见llm.scheduler）做RPM/TPM限速，429时自动退避重试
+    """
+    record = metrics.start("llm_call")
+    try:
+        cache = get_response_cache()
+        key = cache.make_key(prompt, return_type) if cache is not None else None
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.add("cache_hits")
+                return cached
+
+        llm = get_llm()
+        messages = [HumanMessage(content=prompt)]
+        started = time.perf_counter()
+        response = get_scheduler().run(lambda: llm.invoke(messages), estimate_tokens(prompt))
+        _record_response(record, prompt, response, started)
+
+        if get_settings().debug:
+            print(f"响应:\n{response.content}")
+
+        text = response.content.strip()
+        if key is not None:
+            cache.set(key, text)
+        return text
+    except BaseException as e:
+        _failed(record, e)
+        raise
+    finally:
+        metrics.finish(record)
+
+
+async def acall_llm(prompt: str, return_type: Any = None,
+                    limiter: asyncio.Semaphore = None, timeout: float = None) -> str:
+    """call_llm的异步版本，支持共享并发限制与超时"""
+    record = metrics.start("llm_call")
+    cache = get_response_cache()
+    key = cache.make_key(prompt, return_type) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.add("cache_hits")
+            metrics.finish(record)
+            return cached
+
+    async def _call() -> str:
+        llm = get_llm()
+        messages = [HumanMessage(content=prompt)]
+        tokens = estimate_tokens(prompt)
+        if limiter is None:
+            started = time.perf_counter()
+            response = await get_scheduler().arun(lambda: llm.ainvoke(messages), tokens)
+        else:
+            async with limiter:
+                started = time.perf_counter()
+                response = await get_scheduler().arun(lambda: llm.ainvoke(messages), tokens)
+        _record_response(record, prompt, response, started)
+
+        if get_settings().debug:
+            print(f"响应:\n{response.content}")
+
+        return response.content.strip()
+
+    try:
+        if timeout is None:
+            text = await _call()
+        else:
+            text = await asyncio.wait_for(_call(), timeout)
+    except BaseException as e:
+        _failed(record, e)
+        raise
+    finally:
+        metrics.finish(record)
+    if key is not None:
+        cache.set(key, text)
+    return text
 
 
 def describe_type(t: Any) -> str:
@@ -88,6 +277,11 @@ def describe_type(t: Any) -> str:
         return "数组列表"
     elif origin is dict:
         return "字典对象"
+    elif origin in _UNION_ORIGINS:
+        options = [arg for arg in get_args(t) if arg is not type(None)]
+        if len(options) == 1:
+            return f"{describe_type(options[0])}(可为null)"
+        return "或".join(describe_type(arg) for arg in options)
     
     # Pydantic模型
     if hasattr(t, 'model_fields'):
@@ -136,6 +330,9 @@ def generate_example(t: Any) -> Any:
         return ["示例项目"]
     elif origin is dict:
         return {"键": "值"}
+    elif origin in _UNION_ORIGINS:
+        options = [arg for arg in get_args(t) if arg is not type(None)]
+        return generate_example(options[0]) if options else None
     
     # Pydantic模型 - 使用JSON Schema
     if hasattr(t, 'model_json_schema'):
@@ -169,6 +366,14 @@ def schema_to_example(schema: dict, definitions: dict = None) -> Any:
                 return schema_to_example(definitions[ref_name], definitions)
         return "引用对象"
     
+    # 处理Optional / Union：取第一个非null的分支
+    for key in ('anyOf', 'oneOf'):
+        if key in schema:
+            options = [option for option in schema[key] if option.get('type') != 'null']
+            if options:
+                return schema_to_example(options[0], definitions)
+            return None
+
     schema_type = schema.get('type')
     
     if schema_type == 'object':
@@ -194,22 +399,34 @@ def schema_to_example(schema: dict, definitions: dict = None) -> Any:
         return "示例值"
 
 
+_SCALAR_TYPES = (str, int, float, bool)
+_INT = re.compile(r'-?\d+')
+_FLOAT = re.compile(r'-?\d+\.?\d*')
+
+
 def parse_to_type(result: str, target_type: Any) -> Any:
-    """万能解析器 - 将字符串解析为任意类型"""
+    """
+    万能解析器 - 将字符串解析为任意类型
+
+    复杂类型先一次定位输出中的JSON（兼容```围栏和说明文字），无法解析时抛出OutputValidationError
+    """
     # 基础类型解析
     if target_type == str or target_type == "string":
         return result
     
     elif target_type == bool or target_type == "boolean":
-        return any(word in result.lower() for word in ["true", "是", "正确", "对", "yes", "1"])
+        lowered = result.strip().lower()
+        if lowered in ("true", "false"):
+            return lowered == "true"
+        return any(word in lowered for word in ["true", "是", "正确", "对", "yes", "1"])
     
     elif target_type == int or target_type == "number":
-        numbers = re.findall(r'-?\d+', result)
-        return int(numbers[0]) if numbers else 0
+        number = _INT.search(result)
+        return int(number.group()) if number else 0
     
     elif target_type == float:
-        numbers = re.findall(r'-?\d+\.?\d*', result)
-        return float(numbers[0]) if numbers else 0.0
+        number = _FLOAT.search(result)
+        return float(number.group()) if number else 0.0
     
     elif target_type == list or target_type == "list":
         return parse_list(result)
@@ -217,31 +434,31 @@ def parse_to_type(result: str, target_type: Any) -> Any:
     elif target_type == dict or target_type == "json":
         return parse_json(result)
     
-    # 复杂类型解析
-    try:
-        data = json.loads(result)
-        return create_typed_object(data, target_type)
-    except:
-        return result
+    # 复杂类型解析：模型直接按JSON校验，其余类型解码后逐项构造
+    if is_model_type(target_type):
+        return validate_json(result, target_type)
+    return create_typed_object(loads(result), target_type)
 
 
 def parse_list(text: str) -> list:
-    """解析列表"""
-    try:
-        if text.strip().startswith('['):
-            return json.loads(text)
-        # 按逗号分割
-        return [item.strip() for item in text.split(',') if item.strip()]
-    except:
-        return [text]
+    """解析列表：JSON数组，或按逗号分隔的文本"""
+    if "[" in text:
+        try:
+            data = loads(text)
+            if isinstance(data, list):
+                return data
+        except OutputValidationError:
+            pass
+    # 按逗号分割
+    return [item.strip() for item in text.split(',') if item.strip()]
 
 
 def parse_json(text: str) -> dict:
-    """解析JSON"""
-    try:
-        return json.loads(text)
-    except:
-        return {}
+    """解析JSON对象"""
+    data = loads(text)
+    if not isinstance(data, dict):
+        raise OutputValidationError("输出不是JSON对象", text, data)
+    return data
 
 
 def create_typed_object(data: Any, target_type: Any) -> Any:
@@ -253,6 +470,9 @@ def create_typed_object(data: Any, target_type: Any) -> Any:
             args = get_args(target_type)
             if args:
                 element_type = args[0]
+                if element_type in _SCALAR_TYPES:
+                    # 标量元素逐项处理也是原样返回，直接跳过
+                    return data
                 return [create_typed_object(item, element_type) for item in data]
         return data
     
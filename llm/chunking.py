@@ -0,0 +1,265 @@
+"""
+长输入分段 - LLMChat(chunk=True)或输入超过LLM_CHUNK_THRESHOLD个token（默认0即关闭）时，
+按段落/行/句子边界切成带重叠的若干段并发提取，再合并各段的结果：List[T]按顺序拼接并去重，其他类型（对象、字符串、标量）用一次归并请求合成
+"""
+import asyncio
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, get_origin
+from llm.chat import acall_llm, call_llm
+from llm.config import get_settings
+from llm.metrics import metrics
+from llm.tokens import estimate_tokens
+
+class PartialResultError(Exception):
+    """
+    分段提取中有请求失败，结果只由成功的段合并而来
+
+    Attributes:
+        value: 成功的段合并出的（不完整的）结果
+        errors: 失败请求（提取段或归并请求）的异常
+    """
+
+    def __init__(self, message: str, value: Any, errors: List[Exception]):
+        super().__init__(message)
+        self.value = value
+        self.errors = errors
+
+
+# 从粗到细的切分边界：段落 -> 行 -> 句子 -> 分句 -> 词
+SEPARATORS = ("\n\n", "\n", "。", "！", "？", ". ", "! ", "? ", "；", "; ", "，", ", ", " ")
+
+
+def needs_chunking(data: Any, threshold: int = None) -> bool:
+    """输入是否超过分段阈值（阈值为0时不分段）"""
+    threshold = get_settings().chunk_threshold if threshold is None else threshold
+    if threshold <= 0:
+        return False
+    text = str(data)
+    # 每个token至少一个字符，短输入不必估算
+    return len(text) > threshold and estimate_tokens(text) > threshold
+
+
+def _pieces(text: str, budget: int, separators: Sequence[str]) -> List[str]:
+    """把文本切成不超过budget个token的片段（保留分隔符，拼接后与原文一致）"""
+    if estimate_tokens(text) <= budget:
+        return [text]
+    for i, sep in enumerate(separators):
+        if sep not in text:
+            continue
+        parts = text.split(sep)
+        pieces = []
+        for part in [p + sep for p in parts[:-1]] + parts[-1:]:
+            if part:
+                pieces.extend(_pieces(part, budget, separators[i + 1:]))
+        return pieces
+    # 没有任何边界时按字符数硬切
+    step = max(1, len(text) * budget // estimate_tokens(text))
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def split_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    按边界把文本切成每段不超过chunk_tokens个token的若干段
+
+    相邻两段共享末尾不超过overlap_tokens个token的完整片段，避免跨段的信息被切断
+    """
+    if chunk_tokens <= 0:
+        raise ValueError("chunk_tokens必须大于0")
+    overlap_tokens = min(max(overlap_tokens, 0), chunk_tokens // 2)
+    pieces = _pieces(text, chunk_tokens, SEPARATORS)
+    costs = [estimate_tokens(piece) for piece in pieces]
+
+    chunks, start = [], 0
+    while start < len(pieces):
+        end, used = start, 0
+        while end < len(pieces) and (end == start or used + costs[end] <= chunk_tokens):
+            used += costs[end]
+            end += 1
+        chunks.append("".join(pieces[start:end]))
+        if end >= len(pieces):
+            break
+        # 下一段从末尾的重叠片段开始，但至少前进一个片段
+        back, kept = end, 0
+        while back - 1 > start and kept + costs[back - 1] <= overlap_tokens:
+            back -= 1
+            kept += costs[back]
+        start = back
+    return chunks
+
+
+def is_list_type(t: Any) -> bool:
+    return t is list or get_origin(t) in (list, List)
+
+
+def _dedupe_key(item: Any) -> str:
+    if hasattr(item, "model_dump_json"):
+        return item.model_dump_json()
+    try:
+        return json.dumps(item, ensure_ascii=False, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return repr(item)
+
+
+def merge_lists(results: Sequence[List[Any]]) -> List[Any]:
+    """按段的顺序拼接，去掉完全相同的元素（重叠部分常被两段各提取一次）"""
+    merged, seen = [], set()
+    for result in results:
+        for item in result or []:
+            key = _dedupe_key(item)
+            if key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+
+def _partial_json(item: Any) -> Any:
+    if hasattr(item, "model_dump"):
+        return item.model_dump(mode="json")
+    return item
+
+
+def reduce_prompt(partials: Sequence[Any], question: str, return_type: Any) -> str:
+    """归并请求：把各段的提取结果作为输入，要求合成一个完整结果"""
+    from llm.spec import compile_spec
+    data = "\n".join(f"[段{i + 1}] {json.dumps(_partial_json(p), ensure_ascii=False, default=str)}"
+                     for i, p in enumerate(partials))
+    task = f"{question}（以上是长输入各段分别提取的结果，请合并为一个完整结果：同一信息以更完整的为准，不要重复）"
+    return compile_spec(return_type).build_prompt(data, task)
+
+
+def _chunk_question(question: str, index: int, total: int) -> str:
+    return f"{question}（这是长输入的第{index + 1}/{total}段，只根据本段内容回答）"
+
+
+def _reduce_groups(partials: Sequence[Any], budget: int) -> List[List[Any]]:
+    """按token预算把部分结果分组，每组至少两个，保证每轮归并都在减少结果数"""
+    groups, current, used = [], [], 0
+    for partial in partials:
+        cost = estimate_tokens(json.dumps(_partial_json(partial), ensure_ascii=False, default=str))
+        if len(current) >= 2 and used + cost > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(partial)
+        used += cost
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])
+    elif current:
+        groups.append(current)
+    return groups
+
+
+class _Plan:
+    """一次分段调用的参数"""
+
+    def __init__(self, data: Any, question: str, return_type: Any, chunk_tokens: Optional[int],
+                 overlap: Optional[int], concurrency: Optional[int]):
+        settings = get_settings()
+        self.question = question
+        self.return_type = return_type
+        self.chunk_tokens = chunk_tokens or settings.chunk_tokens
+        self.concurrency = max(1, concurrency or settings.chunk_concurrency)
+        overlap = settings.chunk_overlap if overlap is None else overlap
+        self.chunks = split_text(str(data), self.chunk_tokens, overlap)
+        self.errors: List[Exception] = []
+
+    def map_prompt(self, index: int) -> str:
+        from llm.spec import compile_spec
+        question = _chunk_question(self.question, index, len(self.chunks))
+        return compile_spec(self.return_type).build_prompt(self.chunks[index], question)
+
+    def collect(self, outcomes: Sequence[Any]) -> List[Any]:
+        """去掉并记下失败的段；全部失败时抛出第一个错误"""
+        partials = [o for o in outcomes if not isinstance(o, Exception)]
+        if not partials:
+            raise outcomes[0]
+        self.errors.extend(o for o in outcomes if isinstance(o, Exception))
+        return partials
+
+    def result(self, value: Any) -> Any:
+        """有请求失败时抛出带合并结果的PartialResultError"""
+        if self.errors:
+            raise PartialResultError(f"长输入分段提取: {len(self.errors)}个请求失败，结果不完整", value, self.errors)
+        return value
+
+
+def _parse(prompt: str, return_type: Any) -> Any:
+    from llm.spec import compile_spec
+    return compile_spec(return_type).parse(call_llm(prompt, return_type))
+
+
+async def _aparse(prompt: str, return_type: Any) -> Any:
+    from llm.spec import compile_spec
+    return compile_spec(return_type).parse(await acall_llm(prompt, return_type))
+
+
+def map_reduce_chat(data: Any, question: str, return_type: Any = str, chunk_tokens: int = None,
+                    overlap: int = None, concurrency: int = None) -> Any:
+    """
+    分段版LLMChat：切段 -> 并发提取 -> 合并
+
+    Args:
+        chunk_tokens: 每段的token上限，默认读取LLM_CHUNK_TOKENS
+        overlap: 相邻段重叠的token数，默认读取LLM_CHUNK_OVERLAP
+        concurrency: 并发请求数，默认读取LLM_CHUNK_CONCURRENCY
+
+    分段请求固定使用提示词模式；全部失败时抛出第一个错误，
+    部分失败时抛出PartialResultError，其value是成功的段合并出的结果
+    """
+    plan = _Plan(data, question, return_type, chunk_tokens, overlap, concurrency)
+    record = metrics.start("llm_map_reduce", chunks=len(plan.chunks))
+    try:
+        def run(func, *args):
+            try:
+                return func(*args)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=plan.concurrency) as pool:
+            # 每个任务在调用方上下文的副本中执行，继承优先级通道和指标的父事件
+            def submit(func, *args):
+                return pool.submit(contextvars.copy_context().run, run, func, *args)
+
+            futures = [submit(_parse, plan.map_prompt(i), return_type) for i in range(len(plan.chunks))]
+            partials = plan.collect([future.result() for future in futures])
+            if is_list_type(return_type):
+                return plan.result(merge_lists(partials))
+
+            while len(partials) > 1:
+                groups = _reduce_groups(partials, plan.chunk_tokens)
+                futures = [submit(_parse, reduce_prompt(group, question, return_type), return_type)
+                           for group in groups]
+                partials = plan.collect([future.result() for future in futures])
+            return plan.result(partials[0])
+    finally:
+        metrics.finish(record, failed_chunks=len(plan.errors))
+
+
+async def amap_reduce_chat(data: Any, question: str, return_type: Any = str, chunk_tokens: int = None,
+                           overlap: int = None, concurrency: int = None) -> Any:
+    """map_reduce_chat的异步版本，用信号量限制并发"""
+    plan = _Plan(data, question, return_type, chunk_tokens, overlap, concurrency)
+    record = metrics.start("llm_map_reduce", chunks=len(plan.chunks))
+    semaphore = asyncio.Semaphore(plan.concurrency)
+
+    async def run(prompt: str) -> Any:
+        async with semaphore:
+            try:
+                return await _aparse(prompt, return_type)
+            except Exception as e:
+                return e
+
+    try:
+        outcomes = await asyncio.gather(*(run(plan.map_prompt(i)) for i in range(len(plan.chunks))))
+        partials = plan.collect(outcomes)
+        if is_list_type(return_type):
+            return plan.result(merge_lists(partials))
+
+        while len(partials) > 1:
+            groups = _reduce_groups(partials, plan.chunk_tokens)
+            outcomes = await asyncio.gather(*(run(reduce_prompt(group, question, return_type)) for group in groups))
+            partials = plan.collect(outcomes)
+        return plan.result(partials[0])
+    finally:
+        metrics.finish(record, failed_chunks=len(plan.errors))
@@ -0,0 +1,201 @@
+"""
+LLM客户端池 - 进程级复用ChatOpenAI实例与HTTP长连接
+同一组(model, temperature, base_url, api_key)只创建一次客户端，避免每次调用重新握手
+"""
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional, Set, Tuple
+import httpx
+from langchain_openai import ChatOpenAI
+from llm.config import get_settings, reload_settings
+
+ClientKey = Tuple[str, float, Optional[str], Optional[str]]
+
+# 事件循环中进行中的异步关闭任务；事件循环只弱引用任务，不保留引用可能在完成前被回收
+_closing_tasks: Set[asyncio.Task] = set()
+
+
+class ClientPool:
+    """
+    线程安全的ChatOpenAI客户端池
+    超出容量时按LRU淘汰最久未用的客户端；被淘汰的客户端在不再被引用（没有进行中的请求）后关闭HTTP连接，
+    不打断其他线程上正在进行的请求
+    """
+
+    def __init__(self, max_size: int = None, max_connections: int = None, keepalive_expiry: float = None):
+        settings = get_settings()
+        self.max_size = max_size or settings.pool_size
+        self.max_connections = max_connections or settings.max_connections
+        self.keepalive_expiry = keepalive_expiry or settings.keepalive_expiry
+        self._clients: "OrderedDict[ClientKey, ChatOpenAI]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, model: str = None, temperature: float = None,
+                 base_url: str = None, api_key: str = None) -> ClientKey:
+        """补全缺省参数，生成池的键"""
+        settings = get_settings()
+        return (
+            model or settings.model,
+            settings.temperature if temperature is None else float(temperature),
+            base_url or settings.base_url,
+            api_key or settings.api_key,
+        )
+
+    def get(self, model: str = None, temperature: float = None,
+            base_url: str = None, api_key: str = None) -> ChatOpenAI:
+        """获取（或创建）客户端"""
+        key = self.make_key(model, temperature, base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            client = self._create(key)
+            self._clients[key] = client
+            self._evict()
+            return client
+
+    def _evict(self):
+        """持有锁时调用：淘汰超出容量的最久未用客户端"""
+        while len(self._clients) > self.max_size:
+            _, client = self._clients.popitem(last=False)
+            _retire(client)
+
+    def _create(self, key: ClientKey) -> ChatOpenAI:
+        model, temperature, base_url, api_key = key
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            openai_api_key=api_key,
+            openai_api_base=base_url,
+            # 429等重试由全局调度器统一处理（共享退避、降低速率），SDK内部不再各自重试
+            max_retries=0,
+            http_client=httpx.Client(limits=limits),
+            http_async_client=httpx.AsyncClient(limits=limits),
+        )
+
+    def close(self, model: str = None, temperature: float = None,
+              base_url: str = None, api_key: str = None) -> bool:
+        """关闭并移除单个客户端，返回是否存在"""
+        key = self.make_key(model, temperature, base_url, api_key)
+        with self._lock:
+            client = self._clients.pop(key, None)
+        if client is None:
+            return False
+        _close_client(client)
+        return True
+
+    def close_all(self):
+        """关闭所有客户端（进程退出或切换配置时调用）"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            _close_client(client)
+
+    def refresh(self):
+        """丢弃所有客户端，下次调用时按当前配置重建（如轮换API Key后）"""
+        self.close_all()
+
+    def resize(self, max_size: int):
+        """调整池容量，多余的客户端直接淘汰"""
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+def _close_client(client: ChatOpenAI):
+    """关闭客户端持有的HTTP连接"""
+    _close_http(client.http_client, client.http_async_client)
+
+
+def _retire(client: ChatOpenAI):
+    """被淘汰的客户端可能仍在其他线程上使用，等它被回收时再关闭连接"""
+    weakref.finalize(client, _close_http, client.http_client, client.http_async_client)
+
+
+def _close_http(http_client: Optional[httpx.Client], async_client: Optional[httpx.AsyncClient]):
+    try:
+        if http_client is not None:
+            http_client.close()
+    except Exception as e:
+        print(f"关闭HTTP客户端失败: {e}")
+
+    if async_client is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    try:
+        if loop is not None:
+            task = loop.create_task(async_client.aclose())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+        else:
+            asyncio.run(async_client.aclose())
+    except Exception as e:
+        print(f"关闭异步HTTP客户端失败: {e}")
+
+
+# 全局客户端池
+client_pool = ClientPool()
+
+# 替换默认客户端的后端（见llm.backend.set_backend），以及LLM_BACKEND配置的后端实例
+_backend_override = None
+_configured_backend: Tuple[Optional[str], object] = (None, None)
+_backend_lock = threading.Lock()
+
+
+def set_backend_override(backend):
+    global _backend_override
+    _backend_override = backend
+
+
+def get_backend_override():
+    return _backend_override
+
+
+def _settings_backend(name: str):
+    global _configured_backend
+    with _backend_lock:
+        if _configured_backend[0] != name:
+            from llm.backend import backend_from_settings
+            _configured_backend = (name, backend_from_settings(name))
+        return _configured_backend[1]
+
+
+def get_llm(model: str = None, temperature: float = None,
+            base_url: str = None, api_key: str = None) -> ChatOpenAI:
+    """
+    获取当前LLM后端：默认从全局池获取ChatOpenAI客户端；
+    用llm.backend.set_backend替换或设置LLM_BACKEND=fake时返回对应的后端（满足LLMBackend协议）
+    """
+    if _backend_override is not None:
+        return _backend_override
+    name = get_settings().backend
+    if name != "openai":
+        return _settings_backend(name)
+    return client_pool.get(model, temperature, base_url, api_key)
+
+
+def close_clients():
+    """关闭全局池中的所有客户端"""
+    client_pool.close_all()
+
+
+def refresh_clients():
+    """重新读取配置并重建客户端"""
+    reload_settings()
+    client_pool.refresh()
@@ -0,0 +1,76 @@
+"""
+LLM配置 - 环境变量只在启动时读取一次，避免每次调用重复解析
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+@dataclass(frozen=True)
+class Settings:
+    """运行时配置快照"""
+    model: str
+    temperature: float
+    api_key: Optional[str]
+    base_url: Optional[str]
+    debug: bool
+    pool_size: int
+    max_connections: int
+    keepalive_expiry: float
+    output_mode: str
+    prompt_style: str
+    native_method: str
+    backend: str
+    rpm: int
+    tpm: int
+    max_retries: int
+    chunk_threshold: int
+    chunk_tokens: int
+    chunk_overlap: int
+    chunk_concurrency: int
+
+
+def load_settings() -> Settings:
+    """从环境变量读取配置"""
+    return Settings(
+        model=os.getenv("OPENAI_MODEL_ID") or "gpt-3.5-turbo",
+        temperature=float(os.getenv("OPENAI_LLM_TEMPERATURE") or 0.1),
+        api_key=os.getenv("OPENAI_API_KEY") or None,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        debug=_env_bool("DEBUG"),
+        pool_size=int(os.getenv("LLM_CLIENT_POOL_SIZE") or 8),
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS") or 100),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY") or 60),
+        output_mode=(os.getenv("LLM_OUTPUT_MODE") or "prompt").lower(),
+        prompt_style=(os.getenv("LLM_PROMPT_STYLE") or "full").lower(),
+        native_method=os.getenv("LLM_NATIVE_METHOD") or "function_calling",
+        backend=(os.getenv("LLM_BACKEND") or "openai").lower(),
+        rpm=int(os.getenv("LLM_RPM") or 0),
+        tpm=int(os.getenv("LLM_TPM") or 0),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES") or 3),
+        chunk_threshold=int(os.getenv("LLM_CHUNK_THRESHOLD") or 0),
+        chunk_tokens=int(os.getenv("LLM_CHUNK_TOKENS") or 4000),
+        chunk_overlap=int(os.getenv("LLM_CHUNK_OVERLAP") or 200),
+        chunk_concurrency=int(os.getenv("LLM_CHUNK_CONCURRENCY") or 4),
+    )
+
+
+settings = load_settings()
+
+
+def get_settings() -> Settings:
+    return settings
+
+
+def reload_settings() -> Settings:
+    """重新读取环境变量（修改os.environ后调用）"""
+    global settings
+    settings = load_settings()
+    return settings
@@ -0,0 +1,175 @@
+"""
+ToolChat执行上下文 - 结构化的步骤日志，按token预算渲染
+过大的原始数据和工具结果截断并用句柄引用，较早的步骤压缩为一行，每轮记录发送的token数
+"""
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from llm.tokens import estimate_tokens
+from tools.base import ai_tool
+
+
+class ResultStore:
+    """被截断的完整工具结果，按句柄存取（有界LRU）"""
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> str:
+        with self._lock:
+            handle = f"r{next(self._counter)}"
+            self._items[handle] = text
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+            return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        with self._lock:
+            return self._items.get(handle)
+
+
+result_store = ResultStore()
+
+
+@ai_tool(description="读取之前被截断的工具结果（按句柄分段读取）", pinned=True)
+def read_tool_result(handle: str, offset: int = 0, length: int = 2000) -> str:
+    """读取被截断的工具结果"""
+    text = result_store.get(handle)
+    if text is None:
+        return f"句柄 {handle} 不存在或已过期"
+    piece = text[offset:offset + length]
+    rest = len(text) - offset - len(piece)
+    if rest > 0:
+        return f"{piece}\n...[还有{rest}字符，offset={offset + len(piece)}继续读取]"
+    return piece
+
+
+class Step:
+    """一步执行记录"""
+
+    __slots__ = ("number", "kind", "tool_name", "parameters", "result", "handle")
+
+    def __init__(self, number: int, kind: str, tool_name: str = "", parameters: Dict = None,
+                 result: str = "", handle: str = None):
+        self.number = number
+        self.kind = kind  # tool / error / note
+        self.tool_name = tool_name
+        self.parameters = parameters or {}
+        self.result = result
+        self.handle = handle
+
+    def render(self) -> str:
+        if self.kind == "tool":
+            return f"步骤{self.number}: 调用 {self.tool_name}({self.parameters}) -> {self.result}"
+        if self.kind == "error":
+            return f"步骤{self.number}: 调用 {self.tool_name} 失败: {self.result}"
+        return f"步骤{self.number}: {self.result}"
+
+    def render_compact(self) -> str:
+        if self.kind == "tool":
+            ref = f"，完整结果句柄{self.handle}" if self.handle else ""
+            summary = self.result if len(self.result) <= 60 else self.result[:60] + "…"
+            return f"步骤{self.number}: {self.tool_name} -> {summary}{ref}"
+        return self.render()[:80]
+
+
+class ExecutionContext:
+    """
+    ToolChat的执行上下文
+
+    Args:
+        token_budget: 渲染后上下文的token上限
+        max_result_tokens: 单个工具结果保留的token上限，超出部分存入result_store
+        keep_recent: 最近几步完整保留，更早的步骤压缩为一行
+
+    原始数据最多占预算的一半，超出部分同样存入result_store，保证执行步骤总有预算可用
+    """
+
+    def __init__(self, token_budget: int = None, max_result_tokens: int = None, keep_recent: int = 3):
+        self.token_budget = token_budget or int(os.getenv("TOOLCHAT_CONTEXT_BUDGET") or 4000)
+        self.max_result_tokens = max_result_tokens or int(os.getenv("TOOLCHAT_MAX_RESULT_TOKENS") or 500)
+        self.keep_recent = keep_recent
+        self.header = ""
+        self.data_handle: Optional[str] = None
+        self.question = ""
+        self.steps: List[Step] = []
+        self.iteration_tokens: List[int] = []
+
+    def start(self, data: Any, question: str):
+        text = str(data)
+        self.data_handle = None
+        limit = self.token_budget // 2
+        if estimate_tokens(text) > limit:
+            self.data_handle = result_store.put(text)
+            text = self._truncate(text, self.data_handle, limit)
+        self.header = f"原始数据: {text}\n用户要求: {question}\n\n执行过程:\n"
+        self.question = question
+        self.steps = []
+        self.iteration_tokens = []
+
+    def add_tool_result(self, iteration: int, tool_name: str, parameters: Dict, result: Any):
+        text = str(result)
+        handle = None
+        if estimate_tokens(text) > self.max_result_tokens:
+            handle = result_store.put(text)
+            text = self._truncate(text, handle, self.max_result_tokens)
+        self.steps.append(Step(iteration + 1, "tool", tool_name, parameters, text, handle))
+
+    def add_error(self, iteration: int, tool_name: str, error: Exception):
+        self.steps.append(Step(iteration + 1, "error", tool_name, result=str(error)))
+
+    def add_note(self, iteration: int, note: str):
+        self.steps.append(Step(iteration + 1, "note", result=note))
+
+    def _truncate(self, text: str, handle: str, max_tokens: int) -> str:
+        # 按估算比例截取开头部分
+        keep = max(1, len(text) * max_tokens // max(estimate_tokens(text), 1))
+        return (f"{text[:keep]}\n...[结果已截断，共{len(text)}字符，"
+                f"可调用read_tool_result(handle=\"{handle}\", offset={keep})继续读取]")
+
+    def render(self) -> str:
+        """在预算内渲染上下文：先压缩早期步骤，仍超出则省略最早的步骤"""
+        recent = max(len(self.steps) - self.keep_recent, 0)
+        lines = [s.render_compact() if i < recent else s.render() for i, s in enumerate(self.steps)]
+        budget = self.token_budget - estimate_tokens(self.header)
+        costs = [estimate_tokens(line) + 1 for line in lines]
+
+        # 从旧到新继续压缩，直到进入预算
+        i = recent
+        while sum(costs) > budget and i < len(lines):
+            lines[i] = self.steps[i].render_compact()
+            costs[i] = estimate_tokens(lines[i]) + 1
+            i += 1
+
+        dropped = 0
+        while sum(costs) > budget and len(lines) > 1:
+            lines.pop(0)
+            costs.pop(0)
+            dropped += 1
+        if dropped:
+            lines.insert(0, f"（省略了前{dropped}个步骤）")
+        return self.header + "".join(line + "\n" for line in lines)
+
+    def query_text(self, recent: int = 2) -> str:
+        """用于挑选工具的检索文本：用户要求 + 最近几步"""
+        return "\n".join([self.question] + [s.render_compact() for s in self.steps[-recent:]])
+
+    def record_prompt(self, prompt: str) -> int:
+        """记录本轮发送的提示词token数"""
+        tokens = estimate_tokens(prompt)
+        self.iteration_tokens.append(tokens)
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "iterations": len(self.iteration_tokens),
+            "iteration_tokens": list(self.iteration_tokens),
+            "total_tokens": sum(self.iteration_tokens),
+            "truncated_results": sum(1 for s in self.steps if s.handle),
+            "truncated_data": self.data_handle is not None,
+        }
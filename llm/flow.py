@@ -0,0 +1,64 @@
+"""
+同步/异步共用流程 - 调用流程写成一个生成器，每个需要等待的步骤产出一个Call，
+由run_sync直接调用同步函数、由run_async await异步函数，再把结果（或异常）送回生成器
+这样LLMChat/ALLMChat、ToolChat/AToolChat只维护一份流程
+"""
+from typing import Any, Callable, Dict, Generator
+
+Flow = Generator["Call", Any, Any]
+
+
+class Call:
+    """
+    流程中的一步
+
+    Args:
+        func: 同步版本
+        afunc: 异步版本（返回可等待对象）
+        aextra: 只传给异步版本的关键字参数（如limiter、timeout）
+    """
+
+    __slots__ = ("func", "afunc", "args", "kwargs", "aextra")
+
+    def __init__(self, func: Callable, afunc: Callable, *args, aextra: Dict[str, Any] = None, **kwargs):
+        self.func = func
+        self.afunc = afunc
+        self.args = args
+        self.kwargs = kwargs
+        self.aextra = aextra or {}
+
+
+def run_sync(flow: Flow) -> Any:
+    """同步执行流程，返回生成器的返回值"""
+    try:
+        call = next(flow)
+        while True:
+            try:
+                result = call.func(*call.args, **call.kwargs)
+            except Exception as e:
+                call = flow.throw(e)
+            else:
+                call = flow.send(result)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        # 中途退出（如取消）时让生成器里的finally（结束指标事件等）立即执行
+        flow.close()
+
+
+async def run_async(flow: Flow) -> Any:
+    """异步执行流程；取消和超时（CancelledError）不送回生成器，直接向上传播"""
+    try:
+        call = next(flow)
+        while True:
+            try:
+                result = await call.afunc(*call.args, **call.kwargs, **call.aextra)
+            except Exception as e:
+                call = flow.throw(e)
+            else:
+                call = flow.send(result)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        # 中途退出（如取消）时让生成器里的finally（结束指标事件等）立即执行
+        flow.close()
@@ -0,0 +1,167 @@
+"""
+JSON提取与校验 - 在LLM输出中一次定位最外层的JSON值（兼容```json围栏和前后的说明文字），
+模型类型直接交给Pydantic的validate_json，不经过中间的Python对象
+安装了orjson时自动用它解码其余JSON
+"""
+import json
+from functools import lru_cache
+from typing import Any, Optional, Tuple, get_args, get_origin
+from pydantic import TypeAdapter, ValidationError
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+
+
+class OutputValidationError(ValueError):
+    """
+    LLM输出无法解析为目标类型
+
+    Attributes:
+        text: 模型的原始输出
+        data: JSON合法但不符合目标类型时，解码出的原始数据；不是合法JSON时为None
+    """
+
+    def __init__(self, message: str, text: str = "", data: Any = None):
+        super().__init__(message)
+        self.text = text
+        self.data = data
+
+
+class JSONExtractionError(OutputValidationError):
+    """输出中没有合法的JSON"""
+
+
+def json_backend() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def extract_json(text: str) -> str:
+    """
+    返回最外层JSON值的文本片段
+
+    整段就是对象/数组，或```围栏内就是对象/数组时直接返回（不解码，大响应只在校验时解析一次）；
+    否则从每个{或[起按JSON语法（括号配对、字符串与转义）扫描，返回第一个完整合法的值；
+    都没有时返回去掉空白和围栏后的文本（可能是标量），由解码器判断是否合法
+    """
+    stripped = _unfenced(text)
+    if _looks_whole(stripped):
+        return stripped
+    found = scan_json(stripped)
+    return found[0] if found is not None else stripped
+
+
+def _unfenced(text: str) -> str:
+    stripped = text.strip()
+    if _looks_whole(stripped):
+        return stripped
+    fence = stripped.find("```")
+    if fence >= 0:
+        body_start = stripped.find("\n", fence)
+        body_end = stripped.find("```", fence + 3)
+        if 0 <= body_start < body_end:
+            return stripped[body_start + 1:body_end].strip()
+    return stripped
+
+
+def _looks_whole(text: str) -> bool:
+    return text[:1] in _CLOSERS and text[-1:] == _CLOSERS[text[0]]
+
+
+def scan_json(text: str) -> Optional[Tuple[str, Any]]:
+    """
+    从左到右找第一个完整合法的JSON对象/数组，返回(片段, 解码结果)，没有时返回None
+
+    像"注意[重要]: {...}"这样的说明文字中的括号会被跳过
+    """
+    position = 0
+    while True:
+        starts = [p for p in (text.find("{", position), text.find("[", position)) if p >= 0]
+        if not starts:
+            return None
+        start = min(starts)
+        try:
+            value, end = _DECODER.raw_decode(text, start)
+            return text[start:end], value
+        except json.JSONDecodeError as e:
+            # 解码到文本末尾仍不完整（如输出被截断）时，后面的起点也不会完整，避免重复扫描
+            if not text[e.pos:].strip():
+                return None
+        position = start + 1
+
+
+def _decode(fragment: str) -> Any:
+    return orjson.loads(fragment) if orjson is not None else json.loads(fragment)
+
+
+def loads(text: str) -> Any:
+    """提取并解码JSON，失败时抛出JSONExtractionError"""
+    fragment = extract_json(text)
+    try:
+        return _decode(fragment)
+    except ValueError as e:
+        error = e
+    # 整段看似是对象却不合法（如 '{"a": 1} 说明: {示例}'），改为逐个起点扫描
+    found = scan_json(fragment) if _looks_whole(fragment) else None
+    if found is not None:
+        return found[1]
+    raise JSONExtractionError(f"输出不是合法的JSON: {error}", text) from None
+
+
+def is_model_type(t: Any) -> bool:
+    """是否为Pydantic模型或其(嵌套)列表"""
+    if get_origin(t) is list:
+        args = get_args(t)
+        return bool(args) and is_model_type(args[0])
+    return isinstance(t, type) and hasattr(t, "model_validate")
+
+
+@lru_cache(maxsize=256)
+def _cached_adapter(t: Any) -> Optional[TypeAdapter]:
+    try:
+        return TypeAdapter(t)
+    except Exception:
+        return None
+
+
+def model_adapter(t: Any) -> Optional[TypeAdapter]:
+    """模型类型的校验器（按类型缓存），其他类型返回None"""
+    if not is_model_type(t):
+        return None
+    try:
+        return _cached_adapter(t)
+    except TypeError:
+        return _cached_adapter.__wrapped__(t)
+
+
+def validate_json(text: str, target_type: Any, adapter: TypeAdapter = None) -> Any:
+    """
+    从LLM输出中提取JSON并直接校验为模型类型
+
+    Raises:
+        JSONExtractionError: 输出中没有合法的JSON
+        OutputValidationError: JSON不符合目标类型（data中是解码出的原始数据）
+    """
+    adapter = adapter or model_adapter(target_type)
+    fragment = extract_json(text)
+    try:
+        return adapter.validate_json(fragment)
+    except ValidationError as e:
+        error = e
+    if any(detail["type"] == "json_invalid" for detail in error.errors()):
+        # 整段看似是对象却不合法（如 '{"a": 1} 说明: {示例}'），改为逐个起点扫描
+        found = scan_json(fragment) if _looks_whole(fragment) else None
+        if found is None:
+            raise JSONExtractionError(f"输出不是合法的JSON: {error.errors()[0]['msg']}", text) from None
+        fragment = found[0]
+        try:
+            return adapter.validate_json(fragment)
+        except ValidationError as e:
+            error = e
+    # 失败路径才解码一次，供调用方保留工具调用等能通过校验的部分
+    label = getattr(target_type, "__name__", str(target_type))
+    raise OutputValidationError(f"输出不符合{label}: {error}", text, loads(fragment)) from error
@@ -0,0 +1,161 @@
+"""
+调用指标 - LLMChat、每次网络请求和ToolChat每一轮的耗时、token数与失败次数
+关闭时（默认）每个埋点只多一次属性判断；开启后可注册钩子、导出JSONL或Prometheus文本
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# 当前正在记录的事件（嵌套时子事件的数值累加到父事件，errors除外）
+_current: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("llm_metrics_record", default=None)
+
+# 导出时作为Prometheus计数器的数值字段
+NUMERIC_FIELDS = (
+    "duration_seconds", "latency_seconds", "prompt_build_seconds", "parse_seconds", "tool_seconds",
+    "prompt_tokens", "completion_tokens", "validation_failures", "errors", "cache_hits",
+    "tool_calls", "iterations", "retries", "scheduler_wait_seconds", "chunks", "failed_chunks",
+)
+# 不累加到父事件的字段：每层只记自己的失败（请求失败后回退或重试成功时，父事件不算失败）
+_OWN_FIELDS = ("duration_seconds", "errors")
+
+
+class Metrics:
+    """
+    指标收集器
+
+    Args:
+        enabled: 是否记录，默认读取LLM_METRICS
+        jsonl_path: 每个事件结束时追加写入的JSONL文件，默认读取LLM_METRICS_JSONL
+        max_events: 内存中保留的最近事件数
+    """
+
+    def __init__(self, enabled: bool = None, jsonl_path: str = None, max_events: int = 10000):
+        if enabled is None:
+            enabled = os.getenv("LLM_METRICS", "false").lower() == "true"
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path or os.getenv("LLM_METRICS_JSONL") or None
+        self.events: Deque[Dict] = deque(maxlen=max_events)
+        self._hooks: List[Callable[[Dict], None]] = []
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, jsonl_path: str = None):
+        if jsonl_path:
+            self.jsonl_path = jsonl_path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_hook(self, hook: Callable[[Dict], None]):
+        """注册钩子，每个事件结束时以事件字典调用"""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[Dict], None]):
+        self._hooks.remove(hook)
+
+    def start(self, kind: str, **fields) -> Optional[Dict]:
+        """开始一个事件；关闭时返回None，之后的finish/add都是空操作"""
+        if not self.enabled:
+            return None
+        record = {"kind": kind, "timestamp": time.time(), **fields}
+        record["_parent"] = _current.get()
+        record["_token"] = _current.set(record)
+        record["_start"] = time.perf_counter()
+        return record
+
+    def finish(self, record: Optional[Dict], **fields):
+        """结束事件：计算总耗时、把数值累加到父事件，然后分发给钩子和导出"""
+        if record is None:
+            return
+        record["duration_seconds"] = time.perf_counter() - record.pop("_start")
+        record.update(fields)
+        token = record.pop("_token")
+        try:
+            _current.reset(token)
+        except ValueError:
+            # 在其他上下文中结束（如线程切换）时无法还原，直接清空
+            _current.set(record["_parent"])
+        parent = record.pop("_parent")
+        if parent is not None:
+            for key in NUMERIC_FIELDS:
+                if key not in _OWN_FIELDS and key in record:
+                    parent[key] = parent.get(key, 0) + record[key]
+        self._emit(record)
+
+    def add(self, key: str, value: float = 1):
+        """给当前事件的数值字段累加（没有正在记录的事件时忽略）"""
+        if not self.enabled:
+            return
+        record = _current.get()
+        if record is not None:
+            record[key] = record.get(key, 0) + value
+
+    def _emit(self, record: Dict):
+        with self._lock:
+            self.events.append(record)
+            totals = self._totals.setdefault(record["kind"], {"count": 0})
+            totals["count"] += 1
+            for key in NUMERIC_FIELDS:
+                value = record.get(key)
+                if value:
+                    totals[key] = totals.get(key, 0) + value
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                except OSError as e:
+                    print(f"指标写入失败: {e}")
+        for hook in list(self._hooks):
+            try:
+                hook(record)
+            except Exception as e:
+                print(f"指标钩子错误: {e}")
+
+    def export_jsonl(self, path: str) -> int:
+        """把内存中的最近事件写入JSONL文件，返回条数"""
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        return len(events)
+
+    def prometheus(self, prefix: str = "opensoul") -> str:
+        """Prometheus文本格式：每种事件的次数和各数值字段的累计值"""
+        with self._lock:
+            totals = {kind: dict(values) for kind, values in self._totals.items()}
+        lines = [f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{kind="{kind}"}} {values["count"]}' for kind, values in totals.items()]
+        for key in NUMERIC_FIELDS:
+            rows = [(kind, values[key]) for kind, values in totals.items() if key in values]
+            if rows:
+                lines.append(f"# TYPE {prefix}_{key}_total counter")
+                lines += [f'{prefix}_{key}_total{{kind="{kind}"}} {value:g}' for kind, value in rows]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """每种事件的累计值"""
+        with self._lock:
+            return {kind: dict(values) for kind, values in self._totals.items()}
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self._totals.clear()
+
+
+# 全局指标收集器
+metrics = Metrics()
+
+
+def usage_tokens(message: Any) -> Optional[Dict[str, int]]:
+    """从LangChain消息的usage_metadata读取token用量"""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return None
+    return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
@@ -0,0 +1,222 @@
+"""
+原生结构化输出 - 通过服务商的function calling / structured output接口传递Schema
+不再需要类型描述、示例和正则解析；服务商不支持时由调用方回退到提示词模式
+"""
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import openai
+from langchain.schema import HumanMessage
+from pydantic import BaseModel, Field, create_model
+from llm.client import get_llm
+from llm.config import get_settings
+from llm.metrics import metrics, usage_tokens
+from llm.scheduler import get_scheduler
+from llm.spec import OutputValidationError
+from llm.tokens import estimate_tokens
+
+# 已确认不支持原生接口的(model, base_url)，之后直接走提示词模式
+_unsupported: set = set()
+_unsupported_lock = threading.Lock()
+
+
+class NativeUnsupportedError(Exception):
+    """当前后端不支持原生function calling / structured output"""
+
+
+def _backend_key() -> Tuple[str, Optional[str]]:
+    settings = get_settings()
+    return settings.model, settings.base_url
+
+
+def native_available() -> bool:
+    """当前后端是否可以尝试原生模式"""
+    return _backend_key() not in _unsupported
+
+
+def _mark_unsupported(error: Exception):
+    with _unsupported_lock:
+        _unsupported.add(_backend_key())
+    print(f"原生结构化输出不可用，回退到提示词模式: {error}")
+
+
+_UNSUPPORTED_HINTS = ("tool", "function", "response_format", "json_schema", "structured")
+
+
+def _is_unsupported_error(error: Exception) -> bool:
+    """服务商拒绝tools/response_format参数时的错误（其他400错误如上下文超长不算）"""
+    if isinstance(error, NotImplementedError):
+        return True
+    if isinstance(error, (openai.BadRequestError, openai.UnprocessableEntityError)):
+        message = str(error).lower()
+        return any(hint in message for hint in _UNSUPPORTED_HINTS)
+    return False
+
+
+@lru_cache(maxsize=256)
+def output_model(return_type: Any) -> Optional[type]:
+    """
+    原生模式使用的输出模型：Pydantic模型直接使用，其余类型包装为{value: T}
+    无法表示为Schema的类型（如"json"等字符串写法）返回None
+    """
+    if isinstance(return_type, str) or return_type is str:
+        return None
+    if isinstance(return_type, type) and issubclass(return_type, BaseModel):
+        return return_type
+    try:
+        return create_model("Output", value=(return_type, Field(description="结果")))
+    except Exception:
+        return None
+
+
+def native_prompt(data: Any, question: str) -> str:
+    return f"从输入中提取信息。\n\n输入: {str(data)}\n任务: {question}"
+
+
+def _prepare_structured(return_type: Any):
+    model = output_model(return_type)
+    if model is None or not native_available():
+        raise NativeUnsupportedError(f"{return_type}不支持原生模式")
+    try:
+        runnable = get_llm().with_structured_output(model, method=get_settings().native_method, include_raw=True)
+    except Exception as e:
+        _handle_error(e)
+    return model, runnable
+
+
+def _unwrap_structured(model: type, return_type: Any, result: Dict) -> Any:
+    if result.get("parsing_error") is not None or result.get("parsed") is None:
+        metrics.add("validation_failures")
+        raise OutputValidationError(f"原生结构化输出解析失败: {result.get('parsing_error')}",
+                                    str(result.get("raw")))
+    parsed = result["parsed"]
+    return parsed if model is return_type else parsed.value
+
+
+def _finish_call(record: Optional[Dict], message: Any, started: float, error: Exception = None):
+    """记录一次原生请求的延迟、token用量和错误"""
+    if record is None:
+        return
+    record["latency_seconds"] = time.perf_counter() - started - record.get("scheduler_wait_seconds", 0)
+    if message is not None:
+        record.update(usage_tokens(message) or {})
+    if error is not None:
+        record["errors"] = 1
+        record["error"] = f"{type(error).__name__}: {error}"
+    metrics.finish(record)
+
+
+def _handle_error(error: Exception):
+    if _is_unsupported_error(error):
+        _mark_unsupported(error)
+        raise NativeUnsupportedError(str(error)) from error
+    raise error
+
+
+def native_chat(data: Any, question: str, return_type: Any) -> Any:
+    """
+    原生结构化输出版LLMChat
+
+    Raises:
+        NativeUnsupportedError: 类型或后端不支持原生模式，调用方应回退到提示词模式
+        OutputValidationError: 模型返回的参数不符合Schema
+    """
+    model, runnable = _prepare_structured(return_type)
+    record, started = metrics.start("llm_call", mode="native"), time.perf_counter()
+    try:
+        prompt = native_prompt(data, question)
+        result = get_scheduler().run(lambda: runnable.invoke([HumanMessage(content=prompt)]), estimate_tokens(prompt))
+    except Exception as e:
+        _finish_call(record, None, started, e)
+        _handle_error(e)
+    _finish_call(record, result.get("raw"), started)
+    return _unwrap_structured(model, return_type, result)
+
+
+async def anative_chat(data: Any, question: str, return_type: Any) -> Any:
+    """native_chat的异步版本"""
+    model, runnable = _prepare_structured(return_type)
+    record, started = metrics.start("llm_call", mode="native"), time.perf_counter()
+    try:
+        prompt = native_prompt(data, question)
+        result = await get_scheduler().arun(lambda: runnable.ainvoke([HumanMessage(content=prompt)]),
+                                            estimate_tokens(prompt))
+    except Exception as e:
+        _finish_call(record, None, started, e)
+        _handle_error(e)
+    _finish_call(record, result.get("raw"), started)
+    return _unwrap_structured(model, return_type, result)
+
+
+FINAL_ANSWER_TOOL = "final_answer"
+
+
+def final_answer_tool(return_type: Any) -> Optional[Dict]:
+    """ToolChat原生模式下提交最终结果的工具，参数即返回类型的Schema"""
+    model = output_model(return_type)
+    if model is None:
+        return None
+    return {
+        "type": "function",
+        "function": {
+            "name": FINAL_ANSWER_TOOL,
+            "description": "任务完成时调用，提交符合返回类型要求的最终结果",
+            "parameters": model.model_json_schema(),
+        },
+    }
+
+
+def parse_final_answer(args: Dict, return_type: Any) -> Any:
+    """校验final_answer的参数并还原为返回类型，失败时抛出ValidationError"""
+    model = output_model(return_type)
+    parsed = model.model_validate(args)
+    return parsed if model is return_type else parsed.value
+
+
+def _prepare_tools(tools: List[Dict]):
+    if not native_available():
+        raise NativeUnsupportedError("后端不支持原生tool calling")
+    try:
+        return get_llm().bind_tools(tools) if tools else get_llm()
+    except Exception as e:
+        _handle_error(e)
+
+
+def _tool_calls(message) -> Tuple[List[Dict], str]:
+    calls = [{"name": call["name"], "args": call.get("args") or {}} for call in (message.tool_calls or [])]
+    return calls, (message.content or "").strip()
+
+
+def native_tool_turn(prompt: str, tools: List[Dict]) -> Tuple[List[Dict], str]:
+    """
+    用原生tool calling进行一轮决策
+
+    Returns:
+        (工具调用列表[{name, args}], 直接回复文本)
+    Raises:
+        NativeUnsupportedError: 后端不支持tool calling
+    """
+    llm = _prepare_tools(tools)
+    record, started = metrics.start("llm_call", mode="native"), time.perf_counter()
+    try:
+        message = get_scheduler().run(lambda: llm.invoke([HumanMessage(content=prompt)]), estimate_tokens(prompt))
+    except Exception as e:
+        _finish_call(record, None, started, e)
+        _handle_error(e)
+    _finish_call(record, message, started)
+    return _tool_calls(message)
+
+
+async def anative_tool_turn(prompt: str, tools: List[Dict]) -> Tuple[List[Dict], str]:
+    """native_tool_turn的异步版本"""
+    llm = _prepare_tools(tools)
+    record, started = metrics.start("llm_call", mode="native"), time.perf_counter()
+    try:
+        message = await get_scheduler().arun(lambda: llm.ainvoke([HumanMessage(content=prompt)]),
+                                             estimate_tokens(prompt))
+    except Exception as e:
+        _finish_call(record, None, started, e)
+        _handle_error(e)
+    _finish_call(record, message, started)
+    return _tool_calls(message)
@@ -0,0 +1,150 @@
+"""
+多条打包 - 把很多条短输入放进一次请求，要求模型返回带编号的List[T]，再拆回各条结果
+固定提示词和网络往返的开销由整组输入分摊
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence
+from pydantic import Field, ValidationError, create_model
+from llm.batch import BatchResult
+from llm.chat import call_llm
+from llm.jsonparse import OutputValidationError, loads
+from llm.scheduler import in_lane
+from llm.spec import compile_spec
+from llm.tokens import estimate_tokens
+
+
+@lru_cache(maxsize=128)
+def packed_item_model(item_type: Any):
+    """为条目类型生成带编号的包装模型: {index, result}"""
+    name = getattr(item_type, "__name__", "Item")
+    return create_model(
+        f"Packed{name}",
+        index=(int, Field(description="输入编号")),
+        result=(item_type, Field(description="该条输入的提取结果")),
+    )
+
+
+def build_pack_prompt(items: Sequence[Any], question: str, item_type: Any) -> str:
+    """生成一组输入的打包提示词"""
+    spec = compile_spec(List[packed_item_model(item_type)])
+    lines = "\n".join(f"[{i}] {str(data)}" for i, data in enumerate(items))
+    return f"""从下面每条输入中分别提取信息并转换为JSON格式。
+
+输入:
+{lines}
+任务: {question}（对每条输入分别处理）
+
+输出类型: {spec.description}
+输出格式:
+{spec.example_json}
+
+重要: 每条输入对应数组中的一个元素，index与输入编号一致，不要遗漏、合并或新增元素。
+
+输出:"""
+
+
+def parse_pack_response(text: str, count: int, item_type: Any) -> Dict[int, Any]:
+    """解析打包响应，返回 编号->结果；编号重复或越界的条目视为无效"""
+    model = packed_item_model(item_type)
+    data = loads(text)
+    if not isinstance(data, list):
+        raise OutputValidationError("打包响应不是JSON数组", text, data)
+
+    results: Dict[int, Any] = {}
+    duplicated = set()
+    for element in data:
+        try:
+            item = model.model_validate(element)
+        except ValidationError:
+            continue
+        if not 0 <= item.index < count:
+            continue
+        if item.index in results:
+            duplicated.add(item.index)
+        results[item.index] = item.result
+    for index in duplicated:
+        del results[index]
+    return results
+
+
+def plan_packs(inputs: Sequence[Any], item_type: Any, token_budget: int, max_items: int) -> List[List[int]]:
+    """按token预算把输入切成若干组（每组至少一条）"""
+    spec = compile_spec(item_type)
+    # 每条输出大约是一个示例的大小，外加编号包装
+    per_output = estimate_tokens(spec.example_json) + 8
+    packs, current, used = [], [], 0
+    for i, data in enumerate(inputs):
+        cost = estimate_tokens(str(data)) + per_output + 4
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+@in_lane("batch")
+def _run_pack(inputs: Sequence[Any], indices: List[int], question: str, item_type: Any,
+              results: List[BatchResult]):
+    """执行一组请求；模型遗漏或合并条目时对失败子集二分重试"""
+    items = [inputs[i] for i in indices]
+    try:
+        text = call_llm(build_pack_prompt(items, question, item_type), List[packed_item_model(item_type)])
+        parsed = parse_pack_response(text, len(items), item_type)
+    except Exception as e:
+        if len(indices) == 1:
+            results[indices[0]] = BatchResult(indices[0], items[0], error=e)
+            return
+        parsed = {}
+
+    missing = []
+    for local, index in enumerate(indices):
+        if local in parsed:
+            results[index] = BatchResult(index, inputs[index], parsed[local])
+        else:
+            missing.append(index)
+
+    if not missing:
+        return
+    if len(indices) == 1:
+        results[indices[0]] = BatchResult(indices[0], items[0],
+                                          error=OutputValidationError("模型没有返回该条输入的结果"))
+        return
+
+    # 整组失败时二分，部分遗漏时只重试遗漏的子集
+    if len(missing) == len(indices):
+        middle = len(missing) // 2
+        _run_pack(inputs, missing[:middle], question, item_type, results)
+        _run_pack(inputs, missing[middle:], question, item_type, results)
+    else:
+        _run_pack(inputs, missing, question, item_type, results)
+
+
+def LLMPack(inputs: Sequence[Any], question: str, item_type: Any = str,
+            token_budget: int = 2000, max_items: int = 50, max_workers: int = 4) -> List[BatchResult]:
+    """
+    打包版LLMChat - 适合大量短输入（如一行商品名 -> 小模型）
+
+    Args:
+        inputs: 输入列表
+        question: 对每条输入的处理要求
+        item_type: 每条输入的返回类型
+        token_budget: 每组请求的输入+输出估算token上限，决定每组条数
+        max_items: 每组最多条数
+        max_workers: 并发请求的组数
+
+    Returns:
+        与inputs一一对应的BatchResult列表
+    """
+    inputs = list(inputs)
+    results: List[BatchResult] = [None] * len(inputs)
+    packs = plan_packs(inputs, item_type, token_budget, max_items)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_run_pack, inputs, pack, question, item_type, results) for pack in packs]
+        for future in futures:
+            future.result()
+    return results
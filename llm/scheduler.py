@@ -0,0 +1,355 @@
+"""
+请求调度器 - 所有LLM请求发出前经过同一个调度器
+用令牌桶限制每分钟请求数(RPM)和token数(TPM)：发送前按预估的提示词token扣减，返回后按实际用量修正；
+遇到429时按Retry-After或指数退避暂停所有请求并降低补充速率，成功后逐步恢复；
+等待中的请求按优先级通道出队，交互式的ToolChat优先于批量提取
+"""
+import asyncio
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import openai
+from llm.config import get_settings
+from llm.metrics import metrics, usage_tokens
+from llm.tokens import estimate_tokens
+
+# 优先级通道，数字越小越先出队
+LANES = {"interactive": 0, "normal": 1, "batch": 2}
+
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority_lane", default="normal")
+
+# 速率因子的下限与每次成功后的恢复量（加性增、乘性减）
+MIN_RATE_FACTOR = 0.1
+RATE_RECOVERY = 0.05
+
+
+class priority_lane:
+    """
+    在当前上下文中设置请求的优先级通道：with priority_lane("batch"): ...
+
+    线程池中的任务不会继承调用方的上下文，需要在任务内部设置
+    """
+
+    def __init__(self, lane: str):
+        if lane not in LANES:
+            raise ValueError(f"不支持的优先级通道: {lane}，可选 {', '.join(LANES)}")
+        self.lane = lane
+        self._token = None
+
+    def __enter__(self) -> str:
+        self._token = _lane.set(self.lane)
+        return self.lane
+
+    def __exit__(self, *exc):
+        _lane.reset(self._token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def in_lane(lane: str):
+    """装饰器：函数（同步或异步）执行期间发出的请求走指定通道"""
+    priority_lane(lane)  # 定义时就校验通道名
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with priority_lane(lane):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with priority_lane(lane):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class TokenBucket:
+    """
+    每分钟per_minute个令牌的令牌桶，容量为一分钟的额度
+
+    余额可以为负：实际用量超过预估时记为欠账，由之后的请求等待补足
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, factor: float = 1.0):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def delay(self, amount: float, factor: float = 1.0) -> float:
+        """还需等待多少秒才够amount个令牌（超过容量的请求等到桶满即可）"""
+        needed = min(amount, self.capacity) - self.level
+        return 0.0 if needed <= 0 else needed / (self.rate * factor)
+
+    def consume(self, amount: float):
+        self.level -= amount
+
+
+class Ticket:
+    """一次获准发送的请求：预扣的token数与排队等待时间"""
+
+    __slots__ = ("tokens", "lane", "wait")
+
+    def __init__(self, tokens: int, lane: str, wait: float):
+        self.tokens = tokens
+        self.lane = lane
+        self.wait = wait
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """服务商返回的限流错误（HTTP 429）"""
+    if isinstance(error, openai.RateLimitError):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """响应头中的Retry-After秒数"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def used_tokens(response: Any, estimated: int) -> int:
+    """一次请求实际消耗的token：优先用服务商返回的用量，没有时按预估+回复长度估算"""
+    message = response.get("raw") if isinstance(response, dict) else response
+    usage = usage_tokens(message)
+    if usage is not None:
+        return usage["prompt_tokens"] + usage["completion_tokens"]
+    return estimated + estimate_tokens(str(getattr(message, "content", "") or ""))
+
+
+class RequestScheduler:
+    """
+    RPM/TPM预算 + 429自适应退避 + 优先级通道
+
+    Args:
+        rpm: 每分钟请求数上限，0为不限，默认读取LLM_RPM
+        tpm: 每分钟token数上限，0为不限，默认读取LLM_TPM
+        max_retries: 遇到429时的最大重试次数，默认读取LLM_MAX_RETRIES
+        backoff_base: 没有Retry-After时第一次退避的秒数，之后每次翻倍
+        backoff_max: 单次退避的上限秒数
+    """
+
+    def __init__(self, rpm: int = None, tpm: int = None, max_retries: int = None,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0):
+        settings = get_settings()
+        rpm = settings.rpm if rpm is None else rpm
+        tpm = settings.tpm if tpm is None else tpm
+        self.max_retries = settings.max_retries if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._cond = threading.Condition()
+        self._waiting: List[List] = []
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+        self._streak = 0
+        self._factor = 1.0
+        self._stats = {"requests": 0, "rate_limited": 0, "retries": 0, "wait_seconds": 0.0,
+                       "backoff_seconds": 0.0}
+
+    # ---- 出队 ----
+
+    def _delay(self, tokens: int, now: float) -> float:
+        delay = max(self._blocked_until - now, 0.0)
+        if self.requests is not None:
+            self.requests.refill(now, self._factor)
+            delay = max(delay, self.requests.delay(1, self._factor))
+        if self.tokens is not None:
+            self.tokens.refill(now, self._factor)
+            delay = max(delay, self.tokens.delay(tokens, self._factor))
+        return delay
+
+    def _try_acquire(self, entry: List) -> float:
+        """持有锁时调用：轮到entry且预算足够时扣减并出队返回0，否则返回建议的等待秒数"""
+        head = self._waiting[0]
+        delay = self._delay(head[2], time.monotonic())
+        if head is not entry:
+            # 前面还有更高优先级或更早的请求，等它出队后再检查
+            return max(delay, 0.005)
+        if delay > 0:
+            return delay
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(entry[2])
+        heapq.heappop(self._waiting)
+        return 0.0
+
+    def _enqueue(self, tokens: int) -> List:
+        entry = [LANES[current_lane()], next(self._sequence), tokens]
+        heapq.heappush(self._waiting, entry)
+        return entry
+
+    def _dequeue(self, entry: List):
+        """等待被取消时移出队列"""
+        if entry in self._waiting:
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    def _ticket(self, tokens: int, started: float) -> Ticket:
+        wait = time.monotonic() - started
+        self._stats["requests"] += 1
+        self._stats["wait_seconds"] += wait
+        self._cond.notify_all()
+        if wait > 0:
+            metrics.add("scheduler_wait_seconds", wait)
+        return Ticket(tokens, current_lane(), wait)
+
+    def acquire(self, tokens: int = 0) -> Ticket:
+        """阻塞直到可以发送一个预估tokens个token的请求"""
+        started = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(tokens)
+            try:
+                while True:
+                    delay = self._try_acquire(entry)
+                    if delay <= 0:
+                        return self._ticket(tokens, started)
+                    self._cond.wait(delay)
+            except BaseException:
+                self._dequeue(entry)
+                raise
+
+    async def aacquire(self, tokens: int = 0) -> Ticket:
+        """acquire的异步版本，等待期间不阻塞事件循环"""
+        started = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(tokens)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_acquire(entry)
+                    if delay <= 0:
+                        return self._ticket(tokens, started)
+                await asyncio.sleep(delay)
+        except BaseException:
+            with self._cond:
+                self._dequeue(entry)
+            raise
+
+    # ---- 结果反馈 ----
+
+    def complete(self, ticket: Ticket, tokens: Optional[int] = None):
+        """请求成功：按实际用量修正TPM预扣，并逐步恢复补充速率"""
+        with self._cond:
+            if self.tokens is not None and tokens is not None:
+                self.tokens.consume(tokens - ticket.tokens)
+            self._streak = 0
+            self._factor = min(1.0, self._factor + RATE_RECOVERY)
+
+    def rate_limited(self, error: BaseException = None) -> float:
+        """收到429：暂停所有请求一段时间并把补充速率减半，返回暂停秒数"""
+        with self._cond:
+            backoff = retry_after(error) if error is not None else None
+            if backoff is None:
+                backoff = min(self.backoff_max, self.backoff_base * 2 ** self._streak)
+                backoff *= 0.5 + random.random() / 2
+            self._streak += 1
+            self._factor = max(MIN_RATE_FACTOR, self._factor / 2)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + backoff)
+            self._stats["rate_limited"] += 1
+            self._stats["backoff_seconds"] += backoff
+            self._cond.notify_all()
+        return backoff
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if not is_rate_limited(error):
+            return False
+        backoff = self.rate_limited(error)
+        if attempt >= self.max_retries:
+            return False
+        print(f"⚠️ LLM请求被限流，{backoff:.1f}秒后重试（第{attempt + 1}次）")
+        with self._cond:
+            self._stats["retries"] += 1
+        metrics.add("retries")
+        return True
+
+    # ---- 调用 ----
+
+    def run(self, func: Callable[[], Any], tokens: int = 0) -> Any:
+        """
+        经过调度发送请求：func发起一次请求并返回响应，429时退避后重试
+
+        Raises:
+            func抛出的异常；重试次数用完后抛出最后一次的限流错误
+        """
+        attempt = 0
+        while True:
+            ticket = self.acquire(tokens)
+            try:
+                response = func()
+            except Exception as e:
+                if self._should_retry(e, attempt):
+                    attempt += 1
+                    continue
+                raise
+            self.complete(ticket, used_tokens(response, tokens))
+            return response
+
+    async def arun(self, func: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """run的异步版本，func返回可等待对象"""
+        attempt = 0
+        while True:
+            ticket = await self.aacquire(tokens)
+            try:
+                response = await func()
+            except Exception as e:
+                if self._should_retry(e, attempt):
+                    attempt += 1
+                    continue
+                raise
+            self.complete(ticket, used_tokens(response, tokens))
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["rate_factor"] = self._factor
+            stats["waiting"] = len(self._waiting)
+            stats["blocked_for"] = max(self._blocked_until - time.monotonic(), 0.0)
+        return stats
+
+
+# 全局调度器
+scheduler = RequestScheduler()
+
+
+def get_scheduler() -> RequestScheduler:
+    return scheduler
+
+
+def set_scheduler(new_scheduler: RequestScheduler):
+    """替换全局调度器（如修改LLM_RPM/LLM_TPM后重新创建）"""
+    global scheduler
+    scheduler = new_scheduler
@@ -0,0 +1,179 @@
+"""
+输出规格编译器 - 每个返回类型只生成一次描述、示例和校验器
+LLMChat热路径上只需要把数据和问题填进预编译好的提示词
+
+提示词有两种风格（LLM_PROMPT_STYLE）：full为类型的自然语言描述+缩进示例；
+compact为压缩示例，模型类型不再重复描述结构，只附上有信息量的字段说明
+"""
+import enum
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, get_args, get_origin
+from llm.chat import _UNION_ORIGINS, describe_type, generate_example, parse_to_type
+from llm.config import get_settings
+from llm.jsonparse import OutputValidationError, model_adapter, validate_json
+from llm.metrics import metrics
+
+SPEC_CACHE_SIZE = 256
+
+PROMPT_HEAD = "从输入中提取信息并转换为JSON格式。\n\n"
+COMPACT_HEAD = "从输入中提取信息并转换为JSON格式。\n"
+
+PROMPT_STYLES = ("full", "compact")
+
+
+class OutputSpec:
+    """某个返回类型的预编译产物：类型描述、序列化示例、提示词尾部和校验器"""
+
+    __slots__ = ("return_type", "style", "description", "example", "example_json", "prompt_tail", "adapter")
+
+    def __init__(self, return_type: Any, style: str = "full"):
+        if style not in PROMPT_STYLES:
+            raise ValueError(f"不支持的提示词风格: {style}，可选 {', '.join(PROMPT_STYLES)}")
+        self.return_type = return_type
+        self.style = style
+        self.description = describe_type(return_type)
+        self.example = generate_example(return_type)
+        # 只为Pydantic模型类型预编译校验器，其余类型沿用parse_to_type
+        self.adapter = model_adapter(return_type)
+        if style == "compact":
+            self.example_json = json.dumps(self.example, ensure_ascii=False, separators=(",", ":"))
+            self.prompt_tail = self._compact_tail()
+            return
+        self.example_json = json.dumps(self.example, ensure_ascii=False, indent=2)
+        self.prompt_tail = f"""输出类型: {self.description}
+输出格式:
+{self.example_json}
+
+重要: 严格按照上述格式返回，所有嵌套对象都必须保持完整的对象结构。
+
+输出:"""
+
+    def _compact_tail(self) -> str:
+        """模型的结构已经体现在示例中，只补充字段说明；其他类型保留简短的类型描述"""
+        lines = [] if self.adapter is not None else [f"输出类型: {self.description}"]
+        lines += ["输出格式:", self.example_json]
+        notes = field_notes(self.return_type)
+        if notes:
+            lines += ["字段说明:", *notes]
+        lines.append("只输出JSON，结构与示例一致。" if self.adapter is not None else "只输出结果，格式与示例一致。")
+        lines.append("输出:")
+        return "\n".join(lines)
+
+    def build_prompt(self, data: Any, question: str) -> str:
+        """生成完整提示词"""
+        if self.style == "compact":
+            return f"{COMPACT_HEAD}输入: {str(data)}\n任务: {question}\n{self.prompt_tail}"
+        return f"{PROMPT_HEAD}输入: {str(data)}\n任务: {question}\n\n{self.prompt_tail}"
+
+    def parse(self, text: str) -> Any:
+        """
+        解析LLM输出，结果与parse_to_type一致
+
+        Raises:
+            OutputValidationError: 输出中没有合法JSON或不符合目标类型
+        """
+        try:
+            if self.adapter is None:
+                return parse_to_type(text, self.return_type)
+            return validate_json(text, self.return_type, self.adapter)
+        except OutputValidationError:
+            metrics.add("validation_failures")
+            raise
+
+    def parse_strict(self, text: str) -> Any:
+        """严格解析：在parse的基础上，数字类型的输出中没有数字时也抛出OutputValidationError"""
+        if self.return_type in (int, float, "number") and not re.search(r'\d', text):
+            raise OutputValidationError(f"输出中没有{self.description}", text)
+        return self.parse(text)
+
+    def __repr__(self):
+        return f"OutputSpec({self.description})"
+
+
+def _informative(name: str, description: str) -> bool:
+    """字段说明只是重复字段名时没有信息量"""
+    if not description:
+        return False
+    normalized = re.sub(r"[\s_\-]", "", description).lower()
+    return normalized != re.sub(r"[\s_\-]", "", name).lower()
+
+
+def _choices(annotation: Any) -> List[Any]:
+    """Literal/Enum字段的可选值（示例里只能体现其中一个）"""
+    if get_origin(annotation) is Literal:
+        return list(get_args(annotation))
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return [member.value for member in annotation]
+    return []
+
+
+def field_notes(t: Any) -> List[str]:
+    """
+    模型字段中有信息量的说明，每个模型只列一次：
+    "- headquarters、employees[].contact.address: street=街道地址, city=城市"
+    """
+    groups: Dict[type, List] = {}
+
+    def visit(t: Any, path: str):
+        origin = get_origin(t)
+        if origin is list:
+            for arg in get_args(t):
+                visit(arg, f"{path}[]")
+            return
+        if origin in _UNION_ORIGINS:
+            for arg in get_args(t):
+                visit(arg, path)
+            return
+        if not (isinstance(t, type) and hasattr(t, "model_fields")):
+            return
+        if t in groups:
+            groups[t][0].append(path)
+            return
+        notes = []
+        groups[t] = [[path], notes]
+        for name, field in t.model_fields.items():
+            parts = [field.description] if _informative(name, field.description) else []
+            choices = _choices(field.annotation)
+            if choices:
+                parts.append(f"取值{'/'.join(str(choice) for choice in choices)}")
+            if parts:
+                notes.append(f"{name}={' '.join(parts)}")
+            visit(field.annotation, f"{path}.{name}" if path else name)
+
+    visit(t, "")
+    labels = {"": "顶层", "[]": "数组元素"}
+    return [f"- {'、'.join(labels.get(path, path) for path in paths)}: {', '.join(notes)}"
+            for paths, notes in groups.values() if notes]
+
+
+@lru_cache(maxsize=SPEC_CACHE_SIZE)
+def _compile_cached(return_type: Any, style: str) -> OutputSpec:
+    return OutputSpec(return_type, style)
+
+
+def compile_spec(return_type: Any, style: str = None) -> OutputSpec:
+    """
+    获取返回类型的输出规格（LRU缓存）
+
+    style为提示词风格（full / compact），默认取LLM_PROMPT_STYLE。
+    缓存以类型对象本身为键：重新定义的模型类是新的对象，会重新编译，
+    不会拿到旧定义的产物。不可哈希的类型每次现编译。
+    """
+    style = style or get_settings().prompt_style
+    try:
+        hash(return_type)
+    except TypeError:
+        return OutputSpec(return_type, style)
+    return _compile_cached(return_type, style)
+
+
+def clear_spec_cache():
+    """清空输出规格缓存"""
+    _compile_cached.cache_clear()
+
+
+def spec_cache_info():
+    """缓存命中统计"""
+    return _compile_cached.cache_info()
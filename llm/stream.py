@@ -0,0 +1,260 @@
+"""
+流式LLMChat - 边接收token边增量解析JSON
+List[T]每闭合一个元素就校验并产出，对象类型产出逐步补全的部分对象
+"""
+import json
+from typing import Any, AsyncIterator, Iterator, List, Optional, get_args, get_origin
+from langchain.schema import HumanMessage
+from pydantic import TypeAdapter
+from llm.client import get_llm
+from llm.scheduler import get_scheduler
+from llm.spec import OutputSpec, compile_spec
+from llm.tokens import estimate_tokens
+
+
+class IncrementalJSONParser:
+    """
+    增量JSON扫描器
+
+    feed()喂入文本片段，跳过JSON之前的说明文字或```围栏，找到最外层值，
+    并在最外层是数组时返回每个刚闭合元素的完整文本；
+    说明文字中的括号（如"结果[共2条]:"）闭合后不是合法JSON，或其中出现```时，丢弃并继续向后找；
+    partial()把目前为止不完整的JSON补齐后解析，用于预览部分对象
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.end = -1
+        self._skip_line = False
+        self._reset()
+
+    def _reset(self):
+        """放弃当前的最外层候选，从下一个字符起重新寻找"""
+        self.start = -1
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._element_start = -1
+
+    @property
+    def done(self) -> bool:
+        return self.end >= 0
+
+    def feed(self, chunk: str) -> List[str]:
+        """喂入片段，返回本次新闭合的最外层数组元素文本"""
+        offset = len(self.text)
+        self.text += chunk
+        closed = []
+        for i in range(offset, len(self.text)):
+            if self.end >= 0:
+                break
+            ch = self.text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._at_root_array() and self._element_start >= 0:
+                        closed.append(self.text[self._element_start:i + 1])
+                        self._element_start = -1
+                continue
+
+            if self.start < 0:
+                if self._skip_line:
+                    self._skip_line = ch != "\n"
+                elif ch == "`" and self.text.endswith("```", 0, i + 1):
+                    # ```json围栏行，从下一行开始找
+                    self._skip_line = True
+                elif ch in "[{":
+                    self.start = i
+                    self._stack.append(ch)
+                continue
+
+            if ch == "`":
+                # JSON字符串外不会出现反引号，当前候选是说明文字
+                self._reset()
+                continue
+
+            if self._at_root_array() and self._element_start < 0 and not ch.isspace() and ch not in ",]":
+                self._element_start = i
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._stack.append(ch)
+            elif ch in "]}":
+                if len(self._stack) == 1:
+                    if not _is_json(self.text[self.start:i + 1]):
+                        self._reset()
+                        continue
+                    # 最外层闭合：数组最后一个标量元素在这里结束
+                    if self._at_root_array() and self._element_start >= 0:
+                        closed.append(self.text[self._element_start:i].strip())
+                        self._element_start = -1
+                    self._stack.pop()
+                    self.end = i
+                else:
+                    self._stack.pop()
+                    if self._at_root_array() and self._element_start >= 0:
+                        closed.append(self.text[self._element_start:i + 1])
+                        self._element_start = -1
+            elif ch == "," and self._at_root_array() and self._element_start >= 0:
+                closed.append(self.text[self._element_start:i].strip())
+                self._element_start = -1
+        return closed
+
+    def _at_root_array(self) -> bool:
+        return len(self._stack) == 1 and self._stack[0] == "["
+
+    def complete_text(self) -> Optional[str]:
+        """最外层值已闭合时返回其完整文本"""
+        if self.end < 0:
+            return None
+        return self.text[self.start:self.end + 1]
+
+    def partial(self) -> Any:
+        """把不完整的JSON补齐后解析；无法补齐（如数字写到一半）时返回None"""
+        if self.start < 0:
+            return None
+        if self.end >= 0:
+            return json.loads(self.complete_text())
+
+        text = self.text[self.start:]
+        if self._in_string:
+            if self._escape:
+                text = text[:-1]
+            text += '"'
+        text = text.rstrip()
+        closing = "".join("]" if ch == "[" else "}" for ch in reversed(self._stack))
+
+        candidates = [text]
+        trimmed = text
+        while trimmed and trimmed[-1] in ",:":
+            trimmed = trimmed[:-1].rstrip()
+            candidates.append(trimmed)
+        candidates.append(_drop_dangling_key(trimmed))
+        for candidate in candidates:
+            try:
+                return json.loads(candidate + closing)
+            except json.JSONDecodeError:
+                continue
+        return None
+
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def _drop_dangling_key(text: str) -> str:
+    """去掉对象末尾只有键没有值的部分，如 {"a": 1, "b" -> {"a": 1"""
+    if not text.endswith('"'):
+        return text
+    quote = text.rfind('"', 0, len(text) - 1)
+    if quote < 0:
+        return text
+    before = text[:quote].rstrip()
+    if before.endswith(","):
+        return before[:-1]
+    if before.endswith("{"):
+        return before
+    return text
+
+
+def _element_type(return_type: Any) -> Any:
+    if get_origin(return_type) is list:
+        args = get_args(return_type)
+        return args[0] if args else Any
+    return None
+
+
+class _StreamHandler:
+    """把文本片段转换为要产出的值，同步与异步版本共用"""
+
+    def __init__(self, spec: OutputSpec):
+        self.spec = spec
+        self.parser = IncrementalJSONParser()
+        self.element_type = _element_type(spec.return_type)
+        self.adapter = TypeAdapter(self.element_type) if self.element_type is not None else None
+        self.structured = (self.element_type is not None or spec.adapter is not None
+                           or spec.return_type in (dict, "json", list, "list"))
+        self.last_partial = None
+
+    def on_chunk(self, chunk: str) -> List[Any]:
+        if not chunk:
+            return []
+        if not self.structured:
+            self.parser.text += chunk
+            return []
+
+        closed = self.parser.feed(chunk)
+        if self.element_type is not None:
+            values = []
+            for text in closed:
+                try:
+                    values.append(self.adapter.validate_json(text))
+                except Exception:
+                    # 不合法的元素跳过，不影响后续元素
+                    continue
+            return values
+
+        partial = self.parser.partial()
+        if isinstance(partial, dict) and partial != self.last_partial:
+            self.last_partial = partial
+            return [partial]
+        return []
+
+    def finish(self) -> List[Any]:
+        if self.element_type is not None:
+            return []
+        text = self.parser.complete_text() or self.parser.text.strip()
+        return [self.spec.parse(text)]
+
+
+def LLMStream(data: Any, question: str, return_type: Any = str) -> Iterator[Any]:
+    """
+    流式版LLMChat
+
+    - List[T]: 每个元素闭合并通过校验后立即产出T（校验失败的元素跳过）
+    - 对象/字典: 每收到新字段产出一次补齐后的部分字典，最后产出完整解析后的值
+    - 其他类型: 接收完毕后产出一次解析后的值，无法解析时抛出OutputValidationError
+
+    调用方提前break时关闭底层流，不再接收剩余token
+    请求前同样经过调度器的RPM/TPM限速（流式请求不做429重试）
+    """
+    spec = compile_spec(return_type)
+    handler = _StreamHandler(spec)
+    prompt = spec.build_prompt(data, question)
+    ticket = get_scheduler().acquire(estimate_tokens(prompt))
+    stream = get_llm().stream([HumanMessage(content=prompt)])
+    try:
+        for chunk in stream:
+            yield from handler.on_chunk(chunk.content)
+    finally:
+        stream.close()
+        get_scheduler().complete(ticket, ticket.tokens + estimate_tokens(handler.parser.text))
+    yield from handler.finish()
+
+
+async def ALLMStream(data: Any, question: str, return_type: Any = str) -> AsyncIterator[Any]:
+    """LLMStream的异步版本"""
+    spec = compile_spec(return_type)
+    handler = _StreamHandler(spec)
+    prompt = spec.build_prompt(data, question)
+    ticket = await get_scheduler().aacquire(estimate_tokens(prompt))
+    stream = get_llm().astream([HumanMessage(content=prompt)])
+    try:
+        async for chunk in stream:
+            for value in handler.on_chunk(chunk.content):
+                yield value
+    finally:
+        await stream.aclose()
+        get_scheduler().complete(ticket, ticket.tokens + estimate_tokens(handler.parser.text))
+    for value in handler.finish():
+        yield value
@@ -0,0 +1,15 @@
+"""
+Token估算 - 不依赖分词器的快速估算，用于预算控制（打包、上下文裁剪、限流）
+"""
+import re
+
+# 中日韩字符大约各占一个token，其余字符大约4个占一个token
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数（偏保守）"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -1,87 +1,306 @@
 """
 带工具的LLM聊天系统 - 与LLMChat相同的接口，但能调用工具
 """
-from tools.base import AIToolRegistry, registry, ToolCall, AIResponse
-from llm.chat import LLMChat
-from typing import Any
+import asyncio
+import json
+import os
+import time
+from tools.base import AIToolRegistry, registry, ToolCall, AIResponse, typed_response_model
+from llm.chat import LLMChat, ALLMChat
+from llm.config import get_settings
+from llm.context import ExecutionContext
+from llm.flow import Call, Flow, run_async, run_sync
+from llm.jsonparse import OutputValidationError
+from llm.metrics import metrics
+from llm.scheduler import in_lane
+from llm.native import (FINAL_ANSWER_TOOL, NativeUnsupportedError, final_answer_tool, parse_final_answer,
+                        native_tool_turn, anative_tool_turn)
+from typing import Any, List, Optional, Tuple
 
+# 最终结果未通过类型校验，需要额外一次转换请求
+_NEEDS_CONVERSION = object()
 
-def ToolChat(data: Any, question: str, return_type: Any = str, max_iterations: int = 5) -> Any:
+
+@in_lane("interactive")
+def ToolChat(data: Any, question: str, return_type: Any = str, max_iterations: int = 5,
+             context: ExecutionContext = None, max_parallel_tools: int = 4, mode: str = None,
+             top_k_tools: int = None) -> Any:
     """
-    递归式工具调用LLM - 每次只调用一个工具，根据结果决定下一步
+    递归式工具调用LLM - 每轮调用一个或多个互不依赖的工具，根据结果决定下一步
 
     Args:
         data: 输入数据
         question: 处理要求
         return_type: 返回类型
         max_iterations: 最大工具调用轮次
+        context: 执行上下文（token预算、结果截断），调用结束后可读取context.stats()
+        max_parallel_tools: 每轮并行执行的工具数上限
+        mode: "native"时通过原生tool calling传递工具定义，后端不支持时回退到提示词模式
+        top_k_tools: 每轮只发送与问题和最近步骤最相关的k个工具（外加pinned工具），0表示全部发送
 
     Returns:
         指定类型的结果
+
+    其中的LLM请求走调度器的interactive通道，优先于批量提取
+    """
+    context = context or ExecutionContext()
+    return run_sync(_toolchat_flow(data, question, return_type, max_iterations, context, max_parallel_tools,
+                                   mode, top_k_tools, {}))
+
+
+@in_lane("interactive")
+async def AToolChat(data: Any, question: str, return_type: Any = str, max_iterations: int = 5,
+                    limiter: asyncio.Semaphore = None, timeout: float = None,
+                    context: ExecutionContext = None, max_parallel_tools: int = 4, mode: str = None,
+                    top_k_tools: int = None) -> Any:
+    """
+    ToolChat的异步版本 - 与同步版本共用同一个流程（见_toolchat_flow）
+
+    Args:
+        limiter: 共享的并发限制器，作用于每一次LLM请求
+        timeout: 单次LLM请求的超时秒数
+
+    工具本身是同步函数，放到线程中执行以免阻塞事件循环
+    """
+    context = context or ExecutionContext()
+    return await run_async(_toolchat_flow(data, question, return_type, max_iterations, context,
+                                          max_parallel_tools, mode, top_k_tools,
+                                          {"limiter": limiter, "timeout": timeout}))
+
+
+def _toolchat_flow(data: Any, question: str, return_type: Any, max_iterations: int, context: ExecutionContext,
+                   max_parallel_tools: int, mode: Optional[str], top_k_tools: Optional[int],
+                   options: dict) -> Flow:
+    """
+    ToolChat / AToolChat共用的流程
+
+    options只传给异步版本的LLM请求（limiter、timeout）
     """
     # 初始化上下文
-    context = f"原始数据: {str(data)}\n用户要求: {question}\n\n执行过程:\n"
+    context.start(data, question)
+    native = (mode or get_settings().output_mode) == "native"
+    response_model = typed_response_model(return_type)
+    top_k = _top_k(top_k_tools)
+    run = metrics.start("toolchat", return_type=_type_name(return_type))
 
-    for iteration in range(max_iterations):
-        # 构建提示词
-        tools_desc = registry.get_tools_description()
+    try:
+        for iteration in range(max_iterations):
+            step = metrics.start("toolchat_iteration", iteration=iteration + 1)
+            try:
+                # 本轮发送的工具：只挑与问题和最近步骤相关的
+                tool_names = registry.select_tools(context.query_text(), top_k)
 
-        prompt = f"""你是一个智能助手，可以使用工具来完成任务。
+                # 获取AI响应（直接回复时result字段已按目标类型校验）
+                ai_response, raw_result = None, None
+                if native:
+                    try:
+                        ai_response, raw_result = yield from _native_turn(context, return_type, tool_names, options)
+                    except NativeUnsupportedError:
+                        native = False
+                if not native:
+                    prompt = _build_prompt(context.render(), response_model is not AIResponse, tool_names)
+                    context.record_prompt(prompt)
+                    try:
+                        # 决策提示词包含工具说明和执行历史，不能分段
+                        response = yield Call(LLMChat, ALLMChat, prompt, "分析当前情况并决定下一步", response_model,
+                                              mode="prompt", strict=True, chunk=False, aextra=options)
+                    except OutputValidationError as e:
+                        response = _invalid_response(e)
+                    ai_response, raw_result = _recover_response(response)
 
-可用工具:
-{tools_desc}
+                # 检查响应类型
+                if isinstance(ai_response, AIResponse) and ai_response.is_tool_call():
+                    # 并行调用本轮的工具，结果按调用顺序写回上下文
+                    tool_calls = ai_response.all_tool_calls()
+                    started = time.perf_counter()
+                    results = yield Call(registry.call_tools, registry.acall_tools, tool_calls, max_parallel_tools)
+                    _record_tools(step, tool_calls, results, started)
+                    _record_results(context, iteration, tool_calls, results)
+                    # 继续下一轮
+                    continue
+
+                elif isinstance(ai_response, AIResponse) and _has_answer(ai_response, raw_result):
+                    # 任务完成，返回最终结果
+                    final_result = _final_result(ai_response, return_type)
+                    if final_result is not _NEEDS_CONVERSION:
+                        return final_result
+
+                    # 结果没有通过类型校验时，才额外请求一次转换为目标类型
+                    source = _conversion_source(ai_response, raw_result)
+                    return (yield Call(LLMChat, ALLMChat, source, f"转换为{_type_name(return_type)}", return_type,
+                                       chunk=False, aextra=options))
+                else:
+                    # 异常情况
+                    context.add_note(iteration, f"AI响应异常: {ai_response}")
+                    continue
+            finally:
+                metrics.finish(step, iterations=1)
+
+        # 达到最大轮次，强制结束
+        return (yield Call(LLMChat, ALLMChat, _final_prompt(context.render(), question, return_type), "总结最终结果",
+                           return_type, chunk=False, aextra=options))
+    finally:
+        metrics.finish(run)
+
+
+def _record_tools(step: Optional[dict], tool_calls: List[ToolCall], results: List[Any], started: float):
+    """指标开启时记录本轮的工具调用数、失败数和执行耗时"""
+    if step is None:
+        return
+    step["tool_seconds"] = time.perf_counter() - started
+    step["tool_calls"] = len(tool_calls)
+    step["tools"] = [call.name for call in tool_calls]
+    failures = sum(1 for result in results if isinstance(result, Exception))
+    if failures:
+        step["errors"] = step.get("errors", 0) + failures
+
+
+def _type_name(return_type: Any) -> str:
+    return return_type.__name__ if hasattr(return_type, '__name__') else str(return_type)
+
+
+def _record_results(context: ExecutionContext, iteration: int, tool_calls: List[ToolCall], results: List[Any]):
+    for tool_call, result in zip(tool_calls, results):
+        if isinstance(result, Exception):
+            context.add_error(iteration, tool_call.name, result)
+        else:
+            context.add_tool_result(iteration, tool_call.name, tool_call.parameters, result)
+
+
+def _invalid_response(error: OutputValidationError) -> Any:
+    """校验失败时解码出的原始字典；输出根本不是JSON时保留原文，作为异常响应记入上下文"""
+    return error.data if error.data is not None else error.text
+
+
+def _recover_response(response: Any) -> Tuple[Any, Any]:
+    """
+    整体校验失败（通常是result不符合目标类型）时拿到的是原始字典；
+    这里去掉result重新校验，保住工具调用或回复信息，并保留原始result供转换使用
+    """
+    if isinstance(response, dict):
+        raw_result = response.get("result")
+        try:
+            return AIResponse.model_validate({k: v for k, v in response.items() if k != "result"}), raw_result
+        except Exception:
+            return response, raw_result
+    return response, None
+
+
+def _has_answer(ai_response: AIResponse, raw_result: Any) -> bool:
+    return bool(ai_response.message) or getattr(ai_response, "result", None) is not None or raw_result is not None
+
+
+def _final_result(ai_response: AIResponse, return_type: Any) -> Any:
+    """直接回复中已通过校验的最终结果；没有时返回_NEEDS_CONVERSION"""
+    if return_type == str:
+        return ai_response.message if ai_response.message else _NEEDS_CONVERSION
+    result = getattr(ai_response, "result", None)
+    return result if result is not None else _NEEDS_CONVERSION
+
+
+def _conversion_source(ai_response: AIResponse, raw_result: Any) -> str:
+    if raw_result is not None:
+        return json.dumps(raw_result, ensure_ascii=False, default=str)
+    return ai_response.message
+
+
+def _to_response(calls: List[dict], content: str, return_type: Any) -> Tuple[AIResponse, Any]:
+    """把原生tool calling的结果转换为AIResponse，final_answer的参数按目标类型校验"""
+    response_model = typed_response_model(return_type)
+    for call in calls:
+        if call["name"] == FINAL_ANSWER_TOOL:
+            try:
+                result = parse_final_answer(call["args"], return_type)
+                return response_model(response_type="direct_reply", result=result), None
+            except Exception:
+                return AIResponse(response_type="direct_reply"), call["args"]
+    if calls:
+        return AIResponse(response_type="tool_call",
+                          tool_calls=[ToolCall(name=call["name"], parameters=call["args"]) for call in calls]), None
+    return AIResponse(response_type="direct_reply", message=content), None
+
+
+def _top_k(top_k_tools: int) -> int:
+    if top_k_tools is not None:
+        return top_k_tools
+    return int(os.getenv("TOOLCHAT_TOP_K_TOOLS") or 0)
+
+
+def _native_tools(return_type: Any, tool_names: List[str]) -> Tuple[List[dict], bool]:
+    """本轮选中的工具 + （非str返回类型时）提交最终结果的final_answer工具"""
+    tools = registry.get_openai_tools(tool_names)
+    final_tool = final_answer_tool(return_type)
+    if final_tool is None:
+        return tools, False
+    return tools + [final_tool], True
+
+
+def _native_turn(context: ExecutionContext, return_type: Any, tool_names: List[str], options: dict) -> Flow:
+    tools, typed = _native_tools(return_type, tool_names)
+    prompt = _build_native_prompt(context.render(), typed)
+    context.record_prompt(prompt)
+    try:
+        return _to_response(*(yield Call(native_tool_turn, _anative_tool_turn, prompt, tools, aextra=options)),
+                            return_type)
+    except NativeUnsupportedError:
+        raise
+    except Exception as e:
+        print(f"ToolChat错误: {e}")
+        return None, None
+
+
+async def _anative_tool_turn(prompt: str, tools: List[dict], limiter: asyncio.Semaphore = None,
+                             timeout: float = None) -> Tuple[List[dict], str]:
+    call = anative_tool_turn(prompt, tools)
+    if limiter is None:
+        return await asyncio.wait_for(call, timeout)
+    async with limiter:
+        return await asyncio.wait_for(call, timeout)
+
+
+def _build_native_prompt(context: str, typed: bool = False) -> str:
+    """原生模式的决策提示词：工具定义通过接口传递，不再写进提示词"""
+    finish = "调用final_answer提交最终结果" if typed else "直接回复最终结果"
+    return f"""你是一个智能助手，可以使用工具来完成任务。
 
 当前上下文:
 {context}
 
-请分析当前情况：
-1. 如果还需要调用工具来完成任务，返回AIResponse，response_type="tool_call"，包含下一个要调用的工具
-2. 如果任务已完成，返回AIResponse，response_type="direct_reply"，包含最终结果
+如果还需要工具来完成任务，请调用工具（互不依赖的调用可以一次给出多个）；
+如果任务已完成，{finish}。"""
 
-注意：每次只能调用一个工具，根据工具结果再决定下一步。
 
-回复:"""
+def _build_prompt(context: str, typed: bool = False, tool_names: List[str] = None) -> str:
+    """构建每一轮的决策提示词；typed时要求把最终结果按目标类型放进result"""
+    if tool_names is not None and len(tool_names) == len(registry.tools):
+        tool_names = None  # 全部工具时使用缓存的完整描述
+    tools_desc = registry.get_tools_description(tool_names)
+    answer = "在result中给出符合返回类型的最终结果" if typed else "包含最终结果"
 
-        # 获取AI响应
-        ai_response = LLMChat(prompt, "分析当前情况并决定下一步", AIResponse)
+    return f"""你是一个智能助手，可以使用工具来完成任务。
 
-        # 检查响应类型
-        if isinstance(ai_response, AIResponse) and ai_response.is_tool_call():
-            # 调用单个工具
-            tool_call = ai_response.tool_call
-            try:
-                tool_result = registry.call_tool(tool_call.name, **tool_call.parameters)
-                context += f"步骤{iteration+1}: 调用 {tool_call.name}({tool_call.parameters}) -> {tool_result}\n"
+可用工具:
+{tools_desc}
+
+当前上下文:
+{context}
 
-                # 继续下一轮
-                continue
+请分析当前情况：
+1. 如果还需要调用工具来完成任务，返回AIResponse，response_type="tool_call"，在tool_calls中列出本轮要调用的工具
+2. 如果任务已完成，返回AIResponse，response_type="direct_reply"，{answer}
 
-            except Exception as e:
-                context += f"步骤{iteration+1}: 调用 {tool_call.name} 失败: {e}\n"
-                continue
+注意：互不依赖的工具调用可以在同一轮一起给出，它们会并行执行；依赖前一个工具结果的调用请放到下一轮。
 
-        elif isinstance(ai_response, AIResponse) and ai_response.message:
-            # 任务完成，返回最终结果
-            final_result = ai_response.message
+回复:"""
 
-            # 转换为目标类型
-            if return_type == str:
-                return final_result
-            else:
-                return LLMChat(final_result, f"转换为{return_type.__name__ if hasattr(return_type, '__name__') else str(return_type)}", return_type)
-        else:
-            # 异常情况
-            context += f"步骤{iteration+1}: AI响应异常: {ai_response}\n"
-            continue
 
-    # 达到最大轮次，强制结束
-    final_prompt = f"""基于以下执行过程，给出最终结果：
+def _final_prompt(context: str, question: str, return_type: Any) -> str:
+    """达到最大轮次后的总结提示词"""
+    return f"""基于以下执行过程，给出最终结果：
 
 {context}
 
 用户原始要求: {question}
-要求返回类型: {return_type.__name__ if hasattr(return_type, '__name__') else str(return_type)}
+要求返回类型: {_type_name(return_type)}
 
 请总结执行结果并给出最终答案:"""
-
-    return LLMChat(final_prompt, "总结最终结果", return_type)
\ No newline at end of file
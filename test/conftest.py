@@ -0,0 +1,59 @@
+"""
+测试共用的假后端 - 按提示词计算回复文本，通过llm.backend.set_backend安装，测试结束后恢复
+"""
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Union
+import pytest
+from langchain_core.messages import AIMessage
+from llm.backend import FakeBackend, set_backend
+from llm.client import get_backend_override
+
+Reply = Union[Callable[[str], str], Sequence[str]]
+
+
+class ReplyBackend(FakeBackend):
+    """
+    回复由测试决定的假后端
+
+    Args:
+        reply: 以提示词计算回复文本的函数（抛出异常即模拟请求失败），或依次返回的文本列表
+        usage: 固定的token用量；None时按文本估算，False时不返回用量
+        其余参数同FakeBackend（latency、chunk_size等）
+
+    收到的提示词按顺序记录在prompts中
+    """
+
+    def __init__(self, reply: Reply, usage: Union[None, bool, Dict[str, int]] = None, **kwargs):
+        super().__init__(**kwargs)
+        if not callable(reply):
+            responses = list(reply)
+            reply = lambda prompt: responses.pop(0)  # noqa: E731
+        self.reply = reply
+        self.usage = usage
+        self.prompts: List[str] = []
+        self._prompts_lock = threading.Lock()
+
+    def _text(self, prompt: str) -> str:
+        with self._prompts_lock:
+            self.prompts.append(prompt)
+        return self.reply(prompt)
+
+    def _respond(self, prompt: str) -> AIMessage:
+        message = super()._respond(prompt)
+        if self.usage is not None:
+            message.usage_metadata = self.usage or None
+        return message
+
+
+@pytest.fixture
+def fake_llm():
+    """fake_llm(reply, **kwargs)安装一个ReplyBackend并返回它"""
+    previous = get_backend_override()
+
+    def install(reply: Reply, usage: Optional[Union[bool, Dict[str, int]]] = None, **kwargs) -> ReplyBackend:
+        backend = ReplyBackend(reply, usage=usage, **kwargs)
+        set_backend(backend)
+        return backend
+
+    yield install
+    set_backend(previous)
@@ -0,0 +1,69 @@
+"""
+异步接口测试 - 共享并发限制、超时、取消传播，以及与同步版本结果一致（假后端，无需网络）
+"""
+import asyncio
+import time
+import pytest
+from pydantic import BaseModel
+import tools  # noqa: F401  自动注册示例工具
+from llm.backend import FakeBackend, use_backend
+from llm.chat import ALLMChat, LLMChat
+from llm.toolchat import AToolChat, ToolChat
+
+
+class City(BaseModel):
+    name: str
+    population: int
+
+
+def test_limiter_bounds_concurrency():
+    async def main():
+        limiter = asyncio.Semaphore(2)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(ALLMChat("北京", "提取城市", City, limiter=limiter) for _ in range(6)))
+        return results, time.perf_counter() - started
+
+    with use_backend(FakeBackend(latency=0.1)) as fake:
+        results, elapsed = asyncio.run(main())
+    assert all(isinstance(r, City) for r in results)
+    assert fake.calls == 6
+    # 6个请求、并发2，至少要3轮
+    assert elapsed >= 0.3
+
+
+def test_timeout_returns_default():
+    with use_backend(FakeBackend(latency=1.0)):
+        started = time.perf_counter()
+        assert asyncio.run(ALLMChat("北京", "提取城市", City, timeout=0.05)) is None
+        assert asyncio.run(AToolChat("", "加法", int, timeout=0.05, max_iterations=1)) == 0
+    assert time.perf_counter() - started < 1.0
+
+
+@pytest.mark.parametrize("call", [
+    lambda: ALLMChat("北京", "提取城市", City),
+    lambda: AToolChat("", "加法", int),
+])
+def test_cancellation_propagates(call):
+    async def main():
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+
+    with use_backend(FakeBackend(latency=1.0)):
+        started = time.perf_counter()
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(main())
+    assert time.perf_counter() - started < 0.5
+
+
+def test_async_matches_sync():
+    script = [[{"name": "add_numbers", "args": {"a": 1, "b": 2}}]]
+    with use_backend(FakeBackend()):
+        assert asyncio.run(ALLMChat("北京", "提取城市", City)) == LLMChat("北京", "提取城市", City)
+
+    with use_backend(FakeBackend(tool_script=script)) as sync_fake:
+        sync_result = ToolChat("", "计算 1 + 2", int)
+    with use_backend(FakeBackend(tool_script=script)) as async_fake:
+        assert asyncio.run(AToolChat("", "计算 1 + 2", int)) == sync_result
+    assert async_fake.calls == sync_fake.calls == 2
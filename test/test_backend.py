@@ -0,0 +1,71 @@
+"""
+LLM后端测试 - FakeBackend的合法响应、脚本化工具调用与延迟分布（无需网络）
+"""
+import asyncio
+import random
+import time
+from typing import List
+from pydantic import BaseModel
+import tools  # noqa: F401  自动注册示例工具
+from llm.backend import FakeBackend, LLMBackend, OpenAIBackend, make_latency, use_backend
+from llm.chat import ALLMChat, LLMChat
+from llm.client import get_backend_override, get_llm
+from llm.context import ExecutionContext
+from llm.packing import LLMPack
+from llm.toolchat import ToolChat
+
+
+class City(BaseModel):
+    name: str
+    population: int
+
+
+def test_backends_satisfy_protocol():
+    assert isinstance(FakeBackend(), LLMBackend)
+    assert isinstance(OpenAIBackend(), LLMBackend)
+    fake = FakeBackend()
+    with use_backend(fake):
+        assert get_llm() is fake
+    assert get_backend_override() is None
+
+
+def test_fake_returns_schema_valid_values():
+    with use_backend(FakeBackend()):
+        assert isinstance(LLMChat("东京", "提取城市", City), City)
+        assert all(isinstance(c, City) for c in LLMChat("东京", "提取城市", List[City]))
+        assert isinstance(LLMChat("", "数字", int), int)
+        assert isinstance(LLMChat("东京", "提取城市", City, mode="native"), City)
+        assert [r.value for r in LLMPack(["1", "2", "3"], "提取数字", int)] == [123, 123, 123]
+
+
+def test_scripted_tool_calls():
+    fake = FakeBackend(tool_script=[
+        [{"name": "add_numbers", "args": {"a": 1, "b": 2}}, {"name": "add_numbers", "args": {"a": 3, "b": 4}}],
+        [{"name": "add_numbers", "args": {"a": 3, "b": 7}}],
+    ])
+    with use_backend(fake):
+        for mode in ("prompt", "native"):
+            context = ExecutionContext()
+            assert isinstance(ToolChat("", "计算", int, context=context, mode=mode), int)
+            results = [step.result for step in context.steps]
+            assert results == ["3", "7", "10"]
+
+
+def test_latency_distributions():
+    rng = random.Random(1)
+    assert make_latency(None)(rng) == 0
+    assert make_latency(0.5)(rng) == 0.5
+    assert all(0.1 <= make_latency("uniform:0.1,0.2")(rng) <= 0.2 for _ in range(50))
+    assert make_latency("normal:0.3,0.05")(rng) >= 0
+
+    fake = FakeBackend(latency=0.05)
+
+    async def run():
+        with use_backend(fake):
+            return await asyncio.gather(*(ALLMChat("", "数字", int) for _ in range(20)))
+
+    started = time.perf_counter()
+    assert asyncio.run(run()) == [123] * 20
+    # 并发请求的延迟互相重叠
+    assert time.perf_counter() - started < 0.5
+    assert fake.calls == 20
@@ -0,0 +1,39 @@
+"""
+批量提取测试 - 用本地假后端替换网络调用
+"""
+import asyncio
+import pytest
+from llm.batch import LLMBatch, ALLMBatch
+
+
+def _echo(prompt: str) -> str:
+    """把输入数字原样返回，输入3时返回无法解析的文本"""
+    number = prompt.split("输入: ")[1].split("\n")[0]
+    return "无" if number == "3" else number
+
+
+@pytest.fixture(autouse=True)
+def _backend(fake_llm):
+    fake_llm(_echo, latency="uniform:0,0.005")
+
+
+def test_batch_ordered_with_failures():
+    results = list(LLMBatch(range(10), "原样返回", int, max_workers=4))
+    assert [r.index for r in results] == list(range(10))
+    assert [r.value for r in results if r.ok] == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    assert not results[3].ok and results[3].value is None
+
+
+def test_batch_unordered():
+    results = list(LLMBatch(range(10), "原样返回", int, max_workers=4, ordered=False))
+    assert sorted(r.index for r in results) == list(range(10))
+
+
+def test_async_batch_ordered():
+
+    async def collect():
+        return [r async for r in ALLMBatch(range(50), "原样返回", int, concurrency=5)]
+
+    results = asyncio.run(collect())
+    assert [r.index for r in results] == list(range(50))
+    assert sum(not r.ok for r in results) == 1
@@ -0,0 +1,55 @@
+"""
+响应缓存测试 - 内存层、SQLite层、TTL与淘汰（无需网络）
+"""
+import time
+from llm.cache import ResponseCache, set_response_cache
+from llm.chat import LLMChat
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path, memory_size=1)
+    key = cache.make_key("提示词", int, model="m", temperature=0)
+    assert cache.get(key) is None
+    cache.set(key, "42")
+    assert cache.get(key) == "42"
+    cache.close()
+
+    # 新实例只能从磁盘层读到
+    reopened = ResponseCache(path=path)
+    assert reopened.get(key) == "42"
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 0
+    assert reopened.get(key) == "42"
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_key_depends_on_return_type_and_skips_nondeterministic():
+    cache = ResponseCache()
+    assert cache.make_key("p", int, "m", 0) != cache.make_key("p", float, "m", 0)
+    assert cache.make_key("p", int, "m", 0.7) is None
+    assert ResponseCache(cache_nondeterministic=True).make_key("p", int, "m", 0.7) is not None
+
+
+def test_ttl_and_eviction(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), max_size=10, ttl=0.05)
+    for i in range(20):
+        cache.set(f"k{i}", str(i))
+    assert len(cache) <= 10
+    assert cache.stats()["evictions"] > 0
+    time.sleep(0.1)
+    assert cache.get("k19") is None
+
+
+def test_llmchat_uses_cache(fake_llm):
+    fake = fake_llm(lambda prompt: "7")
+    cache = ResponseCache(cache_nondeterministic=True)
+    set_response_cache(cache)
+    try:
+        assert LLMChat("数据", "提取数字", int) == 7
+        assert LLMChat("数据", "提取数字", float) == 7.0
+        assert LLMChat("数据", "提取数字", int) == 7
+    finally:
+        set_response_cache(None)
+    assert fake.calls == 2
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,161 @@
+"""
+长输入分段测试 - 切分边界与重叠、List[T]拼接去重、对象的归并请求
+"""
+import asyncio
+import dataclasses
+import json
+import re
+from typing import List
+import pytest
+from pydantic import BaseModel
+import llm.chat
+import llm.config
+import tools  # noqa: F401  自动注册示例工具
+from llm.backend import FakeBackend, use_backend
+from llm.chat import ALLMChat, LLMChat
+from llm.chunking import PartialResultError, merge_lists, split_text
+from llm.metrics import Metrics
+from llm.toolchat import ToolChat
+from llm.tokens import estimate_tokens
+
+
+class Person(BaseModel):
+    name: str
+
+
+class Summary(BaseModel):
+    title: str
+    count: int
+
+
+def _reply(prompt: str) -> str:
+    """提取段中出现的"人物N"；归并请求把各段的count相加"""
+    if "[段1]" in prompt:
+        partials = [json.loads(p) for p in re.findall(r"\[段\d+\] (.*)", prompt)]
+        return json.dumps({"title": "合并", "count": sum(p["count"] for p in partials)}, ensure_ascii=False)
+    data = prompt.split("任务:")[0]
+    names = sorted(set(re.findall(r"人物\d+", data)), key=data.index)
+    if "Summary" in prompt or "count" in prompt:
+        return json.dumps({"title": "段", "count": len(names)}, ensure_ascii=False)
+    return json.dumps([{"name": n} for n in names], ensure_ascii=False)
+
+
+def _document(count: int) -> str:
+    return "\n\n".join(f"第{i}段。人物{i}出现在这里，做了一些事情。" for i in range(count))
+
+
+def _small_chunks(monkeypatch, **overrides):
+    values = {"chunk_threshold": 100, "chunk_tokens": 60, "chunk_overlap": 20, "chunk_concurrency": 3}
+    values.update(overrides)
+    monkeypatch.setattr(llm.config, "settings", dataclasses.replace(llm.config.settings, **values))
+
+
+def test_split_text_boundaries_and_overlap():
+    text = _document(20)
+    chunks = split_text(text, chunk_tokens=60, overlap_tokens=20)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 60 for c in chunks)
+    # 按段落边界切分，每段都以完整段落开头
+    assert all(c.startswith("第") for c in chunks)
+    # 相邻段有重叠，且所有内容都被覆盖
+    assert all(chunks[i][-10:] in chunks[i + 1] for i in range(len(chunks) - 1))
+    assert all(f"人物{i}" in "".join(chunks) for i in range(20))
+
+
+def test_split_text_without_boundaries():
+    chunks = split_text("字" * 1000, chunk_tokens=100)
+    assert "".join(chunks) == "字" * 1000
+    assert all(estimate_tokens(c) <= 100 for c in chunks)
+
+
+def test_merge_lists_dedupes_models():
+    merged = merge_lists([[Person(name="a"), Person(name="b")], [Person(name="b"), Person(name="c")]])
+    assert [p.name for p in merged] == ["a", "b", "c"]
+
+
+def test_list_result_concatenated_and_deduped(monkeypatch, fake_llm):
+    fake = fake_llm(_reply)
+    _small_chunks(monkeypatch)
+
+    people = LLMChat(_document(20), "提取所有人物", List[Person])
+
+    assert [p.name for p in people] == [f"人物{i}" for i in range(20)]
+    assert len(fake.prompts) > 1
+    assert "段，只根据本段内容回答" in fake.prompts[0]
+
+
+def test_object_result_reduced(monkeypatch, fake_llm):
+    fake = fake_llm(_reply)
+    _small_chunks(monkeypatch, chunk_overlap=0)
+
+    summary = LLMChat(_document(20), "统计人物数量", Summary)
+
+    assert summary.title == "合并"
+    assert summary.count == 20
+    assert any("[段1]" in p for p in fake.prompts)
+
+
+def test_small_input_not_chunked(monkeypatch, fake_llm):
+    fake = fake_llm(_reply)
+    _small_chunks(monkeypatch)
+
+    LLMChat(_document(2), "提取所有人物", List[Person])
+    assert len(fake.prompts) == 1
+
+
+def test_chunking_off_by_default_and_forced_per_call(monkeypatch, fake_llm):
+    fake = fake_llm(_reply)
+    _small_chunks(monkeypatch, chunk_threshold=0)
+
+    LLMChat(_document(20), "提取所有人物", List[Person])
+    assert len(fake.prompts) == 1
+
+    people = LLMChat(_document(20), "提取所有人物", List[Person], chunk=True)
+    assert len(fake.prompts) > 2
+    assert [p.name for p in people] == [f"人物{i}" for i in range(20)]
+
+
+def test_toolchat_prompts_never_chunked(monkeypatch):
+    _small_chunks(monkeypatch)
+    fake = FakeBackend(tool_script=[[{"name": "add_numbers", "args": {"a": 1, "b": 2}}]])
+    with use_backend(fake):
+        ToolChat("数据 " * 500, "加法", str)
+    # 一轮工具调用 + 一轮最终回复
+    assert fake.calls == 2
+
+
+def test_failed_chunk_reported(monkeypatch, fake_llm):
+    def reply(prompt):
+        if "人物5" in prompt.split("任务:")[0]:
+            raise RuntimeError("服务不可用")
+        return _reply(prompt)
+
+    fake_llm(reply)
+    _small_chunks(monkeypatch)
+    collector = Metrics(enabled=True)
+    monkeypatch.setattr("llm.chunking.metrics", collector)
+    monkeypatch.setattr(llm.chat, "metrics", collector)
+
+    # 默认返回成功的段合并出的结果
+    people = LLMChat(_document(20), "提取所有人物", List[Person])
+    assert "人物5" not in [p.name for p in people] and "人物19" in [p.name for p in people]
+
+    # strict时抛出，异常中带着不完整的结果
+    with pytest.raises(PartialResultError) as info:
+        LLMChat(_document(20), "提取所有人物", List[Person], strict=True)
+    assert [p.name for p in info.value.value] == [p.name for p in people]
+    assert len(info.value.errors) >= 1
+
+    events = [e for e in collector.events if e["kind"] == "llm_map_reduce"]
+    assert len(events) == 2 and all(e["failed_chunks"] == len(info.value.errors) for e in events)
+    chats = [e for e in collector.events if e["kind"] == "llm_chat"]
+    assert "errors" not in chats[0] and chats[1]["errors"] == 1
+
+
+def test_async_chunking(monkeypatch, fake_llm):
+    fake = fake_llm(_reply)
+    _small_chunks(monkeypatch)
+
+    people = asyncio.run(ALLMChat(_document(20), "提取所有人物", List[Person]))
+    assert [p.name for p in people] == [f"人物{i}" for i in range(20)]
@@ -0,0 +1,86 @@
+"""
+客户端池测试 - 键的缺省补全、复用、LRU淘汰与连接关闭（不发请求）
+"""
+import asyncio
+import dataclasses
+import gc
+import pytest
+import llm.client
+import llm.config
+from llm.client import ClientPool
+
+
+@pytest.fixture(autouse=True)
+def _settings(monkeypatch):
+    monkeypatch.setattr(llm.config, "settings", dataclasses.replace(
+        llm.config.settings, model="default-model", temperature=0.1, base_url=None, api_key="sk-test"))
+
+
+def test_make_key_fills_defaults():
+    pool = ClientPool(max_size=2)
+    assert pool.make_key() == ("default-model", 0.1, None, "sk-test")
+    assert pool.make_key("m", 0, "http://x", "k") == ("m", 0.0, "http://x", "k")
+    # 显式传入的0温度不会被当作缺省
+    assert pool.make_key(temperature=0)[1] == 0.0
+
+
+def test_get_reuses_client_for_same_key():
+    pool = ClientPool(max_size=2)
+    assert pool.get() is pool.get(model="default-model", api_key="sk-test")
+    assert pool.get(model="other") is not pool.get()
+    assert len(pool) == 2
+    pool.close_all()
+
+
+def test_lru_eviction_closes_unreferenced_clients():
+    pool = ClientPool(max_size=2)
+    first = pool.get(model="a")
+    http_client = first.http_client
+    pool.get(model="b")
+    pool.get(model="a")  # a最近使用过，淘汰b
+    pool.get(model="c")
+    assert len(pool) == 2
+    assert pool.get(model="a") is first
+
+    pool.get(model="d")
+    pool.get(model="e")  # a被淘汰，但仍被first引用（模拟进行中的请求），连接不能关闭
+    assert not http_client.is_closed
+    del first
+    gc.collect()
+    assert http_client.is_closed
+    pool.close_all()
+
+
+def test_close_refresh_and_resize():
+    pool = ClientPool(max_size=3)
+    clients = [pool.get(model=name) for name in "abc"]
+
+    assert pool.close(model="a")
+    assert not pool.close(model="a")
+    assert clients[0].http_client.is_closed
+    assert len(pool) == 2
+
+    pool.resize(1)
+    assert len(pool) == 1
+    assert pool.get(model="c") is clients[2]
+
+    pool.refresh()
+    assert len(pool) == 0
+    assert clients[2].http_client.is_closed
+    assert pool.get(model="c") is not clients[2]
+    pool.close_all()
+
+
+def test_async_close_task_kept_until_done():
+    async def main():
+        pool = ClientPool(max_size=2)
+        async_client = pool.get(model="a").http_async_client
+        assert pool.close(model="a")
+        # 关闭任务在完成前一直被引用，不会被回收
+        assert len(llm.client._closing_tasks) == 1
+        gc.collect()
+        await asyncio.gather(*llm.client._closing_tasks)
+        return async_client
+
+    assert asyncio.run(main()).is_closed
+    assert not llm.client._closing_tasks
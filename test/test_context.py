@@ -0,0 +1,47 @@
+"""
+ToolChat执行上下文测试 - 截断、句柄读取与预算内压缩（无需网络）
+"""
+from llm.context import ExecutionContext, read_tool_result
+from llm.tokens import estimate_tokens
+
+
+def test_large_result_is_truncated_with_handle():
+    context = ExecutionContext(token_budget=2000, max_result_tokens=50)
+    context.start("", "搜索日志")
+    big = "ERROR line\n" * 500
+    context.add_tool_result(0, "search_file", {"keyword": "ERROR"}, big)
+
+    step = context.steps[0]
+    assert step.handle is not None
+    assert len(step.result) < len(big)
+    assert read_tool_result(step.handle, 0, len(big)) == big
+
+
+def test_render_stays_within_budget():
+    context = ExecutionContext(token_budget=300, max_result_tokens=100, keep_recent=2)
+    context.start("数据", "问题")
+    for i in range(30):
+        context.add_tool_result(i, "add_numbers", {"a": i, "b": i}, "结果" * 80)
+
+    rendered = context.render()
+    assert estimate_tokens(rendered) <= 300 + 20
+    assert "步骤30" in rendered
+    assert "省略了" in rendered
+
+    context.record_prompt(rendered)
+    assert context.stats()["iteration_tokens"] == [estimate_tokens(rendered)]
+
+
+def test_large_data_counted_against_budget():
+    context = ExecutionContext(token_budget=300, max_result_tokens=50, keep_recent=2)
+    data = "原始数据" * 1000
+    context.start(data, "问题")
+    for i in range(5):
+        context.add_tool_result(i, "add_numbers", {"a": i, "b": i}, "结果")
+
+    rendered = context.render()
+    assert estimate_tokens(rendered) <= 300 + 20
+    # 数据截断后步骤仍然完整保留
+    assert "省略了" not in rendered and "步骤1" in rendered and "步骤5" in rendered
+    assert context.stats()["truncated_data"]
+    assert read_tool_result(context.data_handle, 0, len(data)) == data
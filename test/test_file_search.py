@@ -0,0 +1,58 @@
+"""
+文件搜索测试 - mmap分块扫描、行号/偏移、正则、多文件与提前停止（无需网络）
+"""
+import re
+from tools.files import compile_pattern, scan_file, search_files
+from tools.test import search_file
+
+
+def _write(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def test_line_numbers_and_offsets_across_chunks(tmp_path):
+    lines = [f"line {i} {'ERROR' if i % 7 == 0 else 'ok'} 数据" for i in range(1, 200)]
+    path = _write(tmp_path / "app.log", lines)
+    data = open(path, "rb").read()
+
+    # 很小的块，验证跨块时行号和偏移仍然正确
+    matches = list(scan_file(path, compile_pattern("ERROR"), chunk_size=64))
+    expected = [i for i in range(1, 200) if i % 7 == 0]
+    assert [m.line for m in matches] == expected
+    for m in matches:
+        assert data[m.offset:].split(b"\n", 1)[0].decode("utf-8") == lines[m.line - 1]
+
+
+def test_regex_directory_and_early_stop(tmp_path):
+    _write(tmp_path / "a.log", ["user=alice id=1", "user=bob id=22"])
+    (tmp_path / "sub").mkdir()
+    _write(tmp_path / "sub" / "b.log", ["USER=carol id=333"])
+    _write(tmp_path / "skip.txt", ["user=dave id=4"])
+
+    matches = search_files(str(tmp_path), r"user=\w+ id=\d{2,}", regex=True, ignore_case=True, include="*.log")
+    assert [(m.path.endswith("a.log"), m.line) for m in matches] == [(True, 2), (False, 1)]
+
+    assert len(search_files(str(tmp_path / "*.log"), "user")) == 2
+    assert len(search_files(str(tmp_path), "id=", max_matches=2)) == 2
+    assert search_files(str(tmp_path), "a.c", regex=False) == []
+
+
+def test_anchored_regex_matches_every_line(tmp_path):
+    lines = [f"{'ERROR' if i % 5 == 0 else 'INFO'} request {i} abc" for i in range(1, 60)]
+    path = _write(tmp_path / "app.log", lines)
+    expected = [i for i in range(1, 60) if i % 5 == 0]
+
+    assert [m.line for m in search_files(path, "^ERROR", regex=True, max_matches=100)] == expected
+    # 很小的块，每块包含多行，锚点仍按行匹配
+    assert [m.line for m in scan_file(path, compile_pattern("^ERROR", regex=True), chunk_size=64)] == expected
+    assert len(list(scan_file(path, compile_pattern("c$", regex=True), chunk_size=64))) == 59
+    assert search_files(path, "^request", regex=True) == []
+
+
+def test_search_file_tool_output(tmp_path):
+    path = _write(tmp_path / "notes.txt", ["hello", "keyword here", "bye", "keyword again"])
+    result = search_file(path, "keyword", max_matches=1)
+    assert result.startswith("找到 1 个匹配（已达上限")
+    assert re.search(r"第2行\(偏移6\): keyword here", result)
+    assert "未找到" in search_file(path, "missing")
@@ -0,0 +1,70 @@
+"""
+文件读写工具测试 - 按行/字节范围读取、追加、局部替换与原子写入（无需网络）
+"""
+import os
+from tools import files
+from tools.files import append_file, patch_file, read_bytes, read_lines, write_file
+from tools.test import create_file
+
+
+def test_read_lines_range_and_output_bound(tmp_path, monkeypatch):
+    path = tmp_path / "big.txt"
+    path.write_text("".join(f"row {i}\n" for i in range(1, 1001)), encoding="utf-8")
+
+    result = read_lines(str(path), start_line=500, max_lines=3)
+    assert result.splitlines() == ["500: row 500", "501: row 501", "502: row 502",
+                                   "...[未读完，从start_line=503继续读取]"]
+    assert read_lines(str(path), start_line=1000).startswith("1000: row 1000")
+    assert "没有第1001行" in read_lines(str(path), start_line=1001)
+
+    # 输出上限优先于max_lines
+    monkeypatch.setenv("TOOL_MAX_OUTPUT", "50")
+    bounded = read_lines(str(path), max_lines=1000)
+    assert len(bounded) < 120 and "从start_line=" in bounded
+
+
+def test_line_offset_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(files, "CHUNK_SIZE", 16)
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(f"{i}\n" for i in range(100)), encoding="utf-8")
+    assert read_lines(str(path), start_line=77, max_lines=1).startswith("77: 76")
+
+
+def test_read_bytes(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_bytes(b"0123456789" * 10)
+    result = read_bytes(str(path), offset=95, length=100)
+    assert result == "[字节 95-100]\n56789"
+    assert "offset=10" in read_bytes(str(path), offset=0, length=10)
+    assert "超出文件大小" in read_bytes(str(path), offset=500)
+
+
+def test_append_patch_and_atomic_write(tmp_path):
+    path = str(tmp_path / "config.ini")
+    assert "写入成功" in write_file(path, "name = old\nport = 80\n")
+    os.chmod(path, 0o640)
+    append_file(path, "debug = false\n")
+
+    assert "替换 1 处" in patch_file(path, "port = 80", "port = 8080")
+    assert "未找到" in patch_file(path, "missing", "x")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "name = old\nport = 8080\ndebug = false\n"
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    # 没有残留的临时文件
+    assert os.listdir(tmp_path) == ["config.ini"]
+
+    assert "创建成功" in create_file(path, "new")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "new"
+
+
+def test_atomic_write_new_file_mode_matches_open(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        files.atomic_write(str(tmp_path / "new.txt"), b"x")
+        with open(tmp_path / "plain.txt", "w") as f:
+            f.write("x")
+    finally:
+        os.umask(umask)
+    assert os.stat(tmp_path / "new.txt").st_mode == os.stat(tmp_path / "plain.txt").st_mode
+    assert os.stat(tmp_path / "new.txt").st_mode & 0o777 == 0o644
@@ -0,0 +1,72 @@
+"""
+JSON提取测试 - 围栏、说明文字、标量与类型化错误（无需网络）
+"""
+from typing import List, Optional
+import pytest
+from pydantic import BaseModel
+import llm.chat
+import llm.jsonparse
+from llm.chat import LLMChat, parse_to_type
+from llm.jsonparse import JSONExtractionError, OutputValidationError, extract_json, loads, validate_json
+
+
+class City(BaseModel):
+    name: str
+    population: int
+
+
+def test_extract_plain_fenced_and_prose():
+    assert extract_json('  {"a": 1}\n') == '{"a": 1}'
+    assert extract_json('```json\n{"a": [1, 2]}\n```') == '{"a": [1, 2]}'
+    assert extract_json('结果如下：\n```\n[1, 2]\n```\n以上。') == '[1, 2]'
+    assert extract_json('好的，结果是 {"a": "}"} 。') == '{"a": "}"}'
+    assert extract_json('42') == '42'
+
+
+def test_scan_skips_brackets_in_prose():
+    assert loads('注意[重要]: {"name": "a"}') == {"name": "a"}
+    assert loads('{"name": "a"} 说明: 这是{示例}') == {"name": "a"}
+    assert loads('结果如下 {"name":"a"}。另见 {"name":"b"}') == {"name": "a"}
+    assert extract_json('注意[重要]: {"a": "[x]"} 完') == '{"a": "[x]"}'
+    assert parse_to_type('{"name": "东京", "population": 1} 说明: {示例}', City) == City(name="东京", population=1)
+    assert llm.chat.parse_list("[1,2] and more [x]") == [1, 2]
+    with pytest.raises(JSONExtractionError):
+        loads('截断的输出 {"a": [1, 2')
+
+
+def test_parse_models_from_wrapped_output():
+    text = '这是提取结果：\n```json\n{"name": "东京", "population": 14000000}\n```'
+    assert parse_to_type(text, City) == City(name="东京", population=14000000)
+    cities = parse_to_type('[{"name": "北京", "population": 1}] 共1条', List[City])
+    assert cities == [City(name="北京", population=1)]
+    assert parse_to_type("```json\n42\n```", Optional[int]) == 42
+    assert parse_to_type("```\n{\"a\": 1}\n```", dict) == {"a": 1}
+
+
+def test_typed_errors():
+    with pytest.raises(JSONExtractionError) as invalid:
+        parse_to_type("抱歉，我无法回答", City)
+    assert invalid.value.data is None and invalid.value.text == "抱歉，我无法回答"
+
+    with pytest.raises(OutputValidationError) as mismatch:
+        validate_json('{"name": "东京", "population": "很多"}', City)
+    assert not isinstance(mismatch.value, JSONExtractionError)
+    assert mismatch.value.data == {"name": "东京", "population": "很多"}
+
+    with pytest.raises(OutputValidationError):
+        parse_to_type("[1, 2]", dict)
+
+
+def test_stdlib_backend_when_orjson_missing(monkeypatch):
+    monkeypatch.setattr(llm.jsonparse, "orjson", None)
+    assert llm.jsonparse.json_backend() == "json"
+    assert loads('说明 {"a": [1, {"b": null}]}') == {"a": [1, {"b": None}]}
+    with pytest.raises(JSONExtractionError):
+        loads("{不是JSON}")
+
+
+def test_llmchat_default_and_strict(fake_llm):
+    fake_llm(lambda prompt: "没有找到城市")
+    assert LLMChat("无", "提取城市", City) is None
+    with pytest.raises(JSONExtractionError):
+        LLMChat("无", "提取城市", City, strict=True)
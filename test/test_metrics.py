@@ -0,0 +1,108 @@
+"""
+调用指标测试 - LLMChat/ToolChat埋点、嵌套累加与导出（无需网络）
+"""
+import json
+from pydantic import BaseModel
+import tools  # noqa: F401  自动注册示例工具
+import llm.native
+from llm.backend import FakeBackend, use_backend
+from llm.chat import LLMChat
+from llm.metrics import Metrics
+from llm.toolchat import ToolChat
+
+
+class City(BaseModel):
+    name: str
+    population: int
+
+
+USAGE = {"input_tokens": 100, "output_tokens": 20, "total_tokens": 120}
+
+
+def _enabled(monkeypatch):
+    collector = Metrics(enabled=True)
+    for module in ("llm.chat", "llm.spec", "llm.native", "llm.toolchat"):
+        monkeypatch.setattr(f"{module}.metrics", collector)
+    return collector
+
+
+def test_disabled_collector_is_a_no_op():
+    collector = Metrics(enabled=False)
+    record = collector.start("llm_chat")
+    collector.add("errors")
+    collector.finish(record)
+    assert record is None and not collector.events
+
+
+def test_llmchat_records_breakdown(monkeypatch, fake_llm):
+    collector = _enabled(monkeypatch)
+    fake_llm(['{"name": "东京", "population": "多"}'], usage=False)
+
+    LLMChat("东京", "提取城市", City)
+    call, chat = collector.events
+    assert call["kind"] == "llm_call" and chat["kind"] == "llm_chat"
+    assert call["prompt_tokens"] > 0 and call["completion_tokens"] > 0
+    assert chat["latency_seconds"] == call["latency_seconds"]
+    assert chat["validation_failures"] == 1
+    assert {"prompt_build_seconds", "parse_seconds"} <= set(chat)
+
+
+def test_single_failure_counted_once(monkeypatch, fake_llm):
+    collector = _enabled(monkeypatch)
+
+    def fail(prompt):
+        raise RuntimeError("服务不可用")
+
+    fake_llm(fail)
+    assert LLMChat("东京", "提取城市", City) is None
+    call, chat = collector.events
+    assert call["errors"] == 1 and chat["errors"] == 1
+    assert 'opensoul_errors_total{kind="llm_chat"} 1' in collector.prometheus()
+
+
+class NativeRejected(FakeBackend):
+    """原生请求时报不支持，提示词模式正常"""
+
+    def with_structured_output(self, schema, method=None, include_raw=False):
+        return self
+
+    def invoke(self, messages):
+        if "输出格式" not in messages[0].content:
+            raise NotImplementedError("不支持结构化输出")
+        return super().invoke(messages)
+
+
+def test_native_fallback_not_counted_as_chat_error(monkeypatch):
+    collector = _enabled(monkeypatch)
+    monkeypatch.setattr(llm.native, "_unsupported", set())
+
+    with use_backend(NativeRejected()):
+        assert isinstance(LLMChat("东京", "提取城市", City, mode="native"), City)
+    native_call, prompt_call, chat = collector.events
+    assert native_call["errors"] == 1
+    assert "errors" not in prompt_call and "errors" not in chat
+
+
+def test_toolchat_iterations_and_export(monkeypatch, fake_llm, tmp_path):
+    collector = _enabled(monkeypatch)
+    seen = []
+    collector.add_hook(lambda event: seen.append(event["kind"]))
+    fake_llm([
+        json.dumps({"response_type": "tool_call", "tool_calls": [{"name": "add_numbers", "parameters": {"a": 1, "b": 2}}]}),
+        json.dumps({"response_type": "direct_reply", "message": "3"}),
+    ], usage=USAGE)
+
+    assert ToolChat("", "计算1+2", str) == "3"
+    run = collector.events[-1]
+    assert run["kind"] == "toolchat"
+    assert run["iterations"] == 2 and run["tool_calls"] == 1
+    assert run["prompt_tokens"] == 200 and run["completion_tokens"] == 40
+    assert seen.count("toolchat_iteration") == 2
+
+    path = tmp_path / "metrics.jsonl"
+    assert collector.export_jsonl(str(path)) == len(collector.events)
+    assert json.loads(path.read_text(encoding="utf-8").splitlines()[-1])["kind"] == "toolchat"
+
+    text = collector.prometheus()
+    assert 'opensoul_events_total{kind="toolchat_iteration"} 2' in text
+    assert 'opensoul_prompt_tokens_total{kind="llm_call"} 200' in text
@@ -0,0 +1,109 @@
+"""
+原生结构化输出测试 - 不支持的后端或服务商拒绝时回退到提示词模式（假后端，无需网络）
+"""
+import httpx
+import openai
+import pytest
+from pydantic import BaseModel
+import tools  # noqa: F401  自动注册示例工具
+import llm.native
+from llm.backend import FakeBackend, use_backend
+from llm.chat import LLMChat
+from llm.context import ExecutionContext
+from llm.native import NativeUnsupportedError, _is_unsupported_error, native_available, native_chat
+from llm.toolchat import ToolChat
+
+
+class City(BaseModel):
+    name: str
+    population: int
+
+
+def _bad_request(message: str) -> openai.BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "http://llm.test/v1/chat/completions"))
+    return openai.BadRequestError(message, response=response, body=None)
+
+
+class RejectingBackend(FakeBackend):
+    """前allowed次原生请求正常，之后with_structured_output / bind_tools抛出error"""
+
+    def __init__(self, error: Exception, allowed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.error = error
+        self.allowed = allowed
+        self.native_attempts = 0
+
+    def _native(self):
+        self.native_attempts += 1
+        if self.native_attempts > self.allowed:
+            raise self.error
+
+    def with_structured_output(self, schema, method=None, include_raw=False):
+        self._native()
+        return super().with_structured_output(schema, method, include_raw)
+
+    def bind_tools(self, tools):
+        self._native()
+        return super().bind_tools(tools)
+
+
+class RejectedAtInvoke(FakeBackend):
+    """接受tools参数，但请求时服务商返回400"""
+
+    def with_structured_output(self, schema, method=None, include_raw=False):
+        return self
+
+    def invoke(self, messages):
+        if len(messages) == 1 and "任务:" in messages[0].content and "输出格式" not in messages[0].content:
+            raise _bad_request("response_format json_schema is not supported by this model")
+        return super().invoke(messages)
+
+
+@pytest.fixture(autouse=True)
+def _reset_unsupported(monkeypatch):
+    monkeypatch.setattr(llm.native, "_unsupported", set())
+
+
+def test_unsupported_error_detection():
+    assert _is_unsupported_error(NotImplementedError())
+    assert _is_unsupported_error(_bad_request("'tools' is not supported"))
+    assert not _is_unsupported_error(_bad_request("maximum context length exceeded"))
+    assert not _is_unsupported_error(ValueError("tools"))
+
+
+def test_llmchat_falls_back_and_remembers_backend():
+    backend = RejectingBackend(NotImplementedError("no structured output"))
+    with use_backend(backend):
+        assert isinstance(LLMChat("北京", "提取城市", City, mode="native"), City)
+        assert not native_available()
+        # 已标记不支持，之后不再尝试原生接口
+        assert isinstance(LLMChat("上海", "提取城市", City, mode="native"), City)
+    assert backend.native_attempts == 1
+
+
+def test_provider_rejection_at_request_time_falls_back():
+    with use_backend(RejectedAtInvoke()):
+        with pytest.raises(NativeUnsupportedError):
+            native_chat("北京", "提取城市", City)
+        assert not native_available()
+        assert isinstance(LLMChat("北京", "提取城市", City, mode="native"), City)
+
+
+def test_other_errors_do_not_disable_native():
+    backend = RejectingBackend(_bad_request("maximum context length exceeded"))
+    with use_backend(backend):
+        assert LLMChat("北京", "提取城市", City, mode="native") is None
+    assert native_available()
+
+
+def test_toolchat_falls_back_mid_run():
+    backend = RejectingBackend(_bad_request("tools are not supported"), allowed=1,
+                               tool_script=[[{"name": "add_numbers", "args": {"a": 1, "b": 2}}]])
+    context = ExecutionContext()
+    with use_backend(backend):
+        # 第一轮原生tool calling执行了工具，第二轮服务商拒绝后在同一轮改用提示词模式完成
+        assert ToolChat("", "计算 1 + 2", str, mode="native", context=context) == "任务完成"
+    assert [(s.tool_name, s.result) for s in context.steps] == [("add_numbers", "3")]
+    assert backend.native_attempts == 2
+    assert not native_available()
+    assert backend.calls == 2
@@ -0,0 +1,41 @@
+"""
+多条打包测试 - 假客户端按编号回显输入，并模拟遗漏条目
+"""
+import json
+import re
+from pydantic import BaseModel
+from llm.packing import LLMPack, plan_packs
+
+
+class Product(BaseModel):
+    name: str
+
+
+def _echo_items(prompt: str) -> str:
+    """回显每条输入；包含"丢"的条目只有单独请求时才返回"""
+    items = re.findall(r"^\[(\d+)\] (.*)$", prompt, re.M)
+    output = [
+        {"index": int(i), "result": {"name": text}}
+        for i, text in items
+        if "丢" not in text or len(items) == 1
+    ]
+    return json.dumps(output, ensure_ascii=False)
+
+
+def test_pack_roundtrip_with_bisect(fake_llm):
+    fake = fake_llm(_echo_items)
+    inputs = [f"商品{i}" for i in range(9)] + ["丢失的商品"]
+    results = LLMPack(inputs, "提取商品名", Product, max_items=10)
+
+    assert [r.value.name for r in results] == inputs
+    assert all(r.ok for r in results)
+    # 一次整组请求 + 一次只针对遗漏条目的重试
+    assert len(fake.prompts) == 2
+
+
+def test_plan_packs_respects_budget():
+    inputs = ["短"] * 30
+    packs = plan_packs(inputs, Product, token_budget=100, max_items=50)
+    assert sum(len(p) for p in packs) == 30
+    assert len(packs) > 1
+    assert plan_packs(inputs, Product, token_budget=100000, max_items=7)[0] == list(range(7))
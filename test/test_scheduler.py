@@ -0,0 +1,159 @@
+"""
+请求调度器测试 - TPM预算、429退避重试、优先级通道（无需网络）
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from langchain_core.messages import AIMessage
+from llm.chat import call_llm
+from llm.metrics import Metrics
+from llm.scheduler import RequestScheduler, in_lane, is_rate_limited, priority_lane, retry_after, set_scheduler, \
+    get_scheduler
+
+
+class RateLimited(Exception):
+    def __init__(self, headers=None):
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers=headers or {})
+
+
+def test_detects_rate_limit_and_retry_after():
+    assert is_rate_limited(RateLimited())
+    assert not is_rate_limited(ValueError("400"))
+    assert retry_after(RateLimited({"retry-after": "2"})) == 2
+    assert retry_after(RateLimited({"retry-after-ms": "250"})) == 0.25
+    assert retry_after(RateLimited()) is None
+
+
+def test_tpm_budget_waits_and_corrects_with_actual_usage():
+    scheduler = RequestScheduler(tpm=600, max_retries=0)  # 每秒补充10个token
+    ticket = scheduler.acquire(600)
+    assert ticket.wait < 0.05
+
+    # 实际只用了300个token，退回的额度马上可用
+    scheduler.complete(ticket, 300)
+    assert scheduler.acquire(250).wait < 0.05
+
+    started = time.monotonic()
+    scheduler.acquire(55)
+    assert 0.3 < time.monotonic() - started < 2
+
+
+def test_backoff_and_retry_on_429():
+    scheduler = RequestScheduler(max_retries=2, backoff_base=0.05)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RateLimited()
+        return AIMessage(content="ok")
+
+    assert scheduler.run(flaky, 10).content == "ok"
+    assert len(attempts) == 3
+    assert attempts[2] - attempts[0] >= 0.05 * 0.5
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 2 and stats["retries"] == 2
+    assert stats["rate_factor"] < 1
+
+    with pytest.raises(RateLimited):
+        RequestScheduler(max_retries=0, backoff_base=0.01).run(lambda: (_ for _ in ()).throw(RateLimited()))
+    with pytest.raises(ValueError):
+        scheduler.run(lambda: (_ for _ in ()).throw(ValueError("不是限流")))
+
+
+def test_interactive_lane_goes_first():
+    scheduler = RequestScheduler(tpm=600, max_retries=0)
+    scheduler.acquire(600)
+    order = []
+
+    def worker(lane):
+        with priority_lane(lane):
+            scheduler.acquire(5)
+        order.append(lane)
+
+    batch = threading.Thread(target=worker, args=("batch",))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=worker, args=("interactive",))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_async_acquire_and_lane_decorator():
+    scheduler = RequestScheduler(rpm=600, max_retries=0)
+    seen = []
+
+    @in_lane("batch")
+    async def one():
+        ticket = await scheduler.aacquire(1)
+        seen.append(ticket.lane)
+
+    async def main():
+        await asyncio.gather(*(one() for _ in range(5)))
+
+    asyncio.run(main())
+    assert seen == ["batch"] * 5
+    assert scheduler.stats()["requests"] == 5
+    with pytest.raises(ValueError):
+        in_lane("urgent")
+
+
+def test_call_llm_retries_through_scheduler(monkeypatch, fake_llm):
+    collector = Metrics(enabled=True)
+    monkeypatch.setattr("llm.chat.metrics", collector)
+    monkeypatch.setattr("llm.scheduler.metrics", collector)
+
+    responses = [RateLimited({"retry-after-ms": "20"}), "42"]
+
+    def reply(prompt):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    fake_llm(reply)
+    previous = get_scheduler()
+    set_scheduler(RequestScheduler(max_retries=1))
+    try:
+        assert call_llm("问题", int) == "42"
+    finally:
+        set_scheduler(previous)
+    event = collector.events[-1]
+    assert event["kind"] == "llm_call" and event["retries"] == 1
+    assert event["scheduler_wait_seconds"] >= 0.015
+
+
+def test_client_429_reaches_scheduler_on_first_failure(monkeypatch):
+    import httpx
+    import llm.client
+    from llm.client import ClientPool
+
+    hits = []
+
+    def handler(request):
+        hits.append(request)
+        return httpx.Response(429, json={"error": {"message": "rate limited", "type": "rate_limit_error"}})
+
+    class MockClient(httpx.Client):
+        def __init__(self, **kwargs):
+            super().__init__(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(llm.client.httpx, "Client", MockClient)
+    client = ClientPool(max_size=1).get(model="m", api_key="sk-test", base_url="http://llm.test/v1")
+    scheduler = RequestScheduler(max_retries=1, backoff_base=0.01)
+    limited = []
+    original = scheduler.rate_limited
+    monkeypatch.setattr(scheduler, "rate_limited", lambda error=None: limited.append(len(hits)) or original(error))
+
+    with pytest.raises(Exception) as error:
+        scheduler.run(lambda: client.invoke("hi"))
+    assert is_rate_limited(error.value)
+    # 每次尝试只发一次HTTP请求，第一次429就交给调度器
+    assert limited == [1, 2]
+    assert len(hits) == 2
@@ -0,0 +1,89 @@
+"""
+输出规格缓存测试 - 验证预编译产物与原始类型函数一致（无需网络）
+"""
+import json
+from typing import List
+import pytest
+from pydantic import BaseModel
+from llm.chat import describe_type, generate_example, parse_to_type
+from llm.jsonparse import JSONExtractionError, OutputValidationError
+from llm.spec import compile_spec, clear_spec_cache, spec_cache_info
+from simple_test import Company, Employee
+
+
+def test_spec_matches_type_functions():
+    spec = compile_spec(Company)
+    assert spec.description == describe_type(Company)
+    assert spec.example == generate_example(Company)
+    assert spec.example_json in spec.build_prompt("数据", "问题")
+
+
+def test_spec_is_cached():
+    clear_spec_cache()
+    first = compile_spec(List[Employee])
+    second = compile_spec(List[Employee])
+    assert first is second
+    assert spec_cache_info().hits >= 1
+
+
+def test_spec_parse_matches_parse_to_type():
+    spec = compile_spec(List[Employee])
+    text = json.dumps([generate_example(Employee)], ensure_ascii=False)
+    result = spec.parse(text)
+    assert result == parse_to_type(text, List[Employee])
+    assert isinstance(result[0], Employee)
+
+    # 校验失败时抛出带原始数据的OutputValidationError，不再静默返回字典或原文
+    bad = '[{"name": "张三"}]'
+    with pytest.raises(OutputValidationError) as spec_error:
+        spec.parse(bad)
+    with pytest.raises(OutputValidationError) as parse_error:
+        parse_to_type(bad, List[Employee])
+    assert spec_error.value.data == parse_error.value.data == [{"name": "张三"}]
+    with pytest.raises(JSONExtractionError):
+        spec.parse("不是JSON")
+
+
+def test_redefined_model_gets_new_spec():
+    class Item(BaseModel):
+        name: str
+
+    old = compile_spec(Item)
+
+    class Item(BaseModel):
+        name: str
+        price: float
+
+    new = compile_spec(Item)
+    assert old is not new
+    assert "price" in new.example
+
+
+def test_compact_style_is_smaller_and_keeps_information():
+    from typing import Literal
+    from pydantic import Field
+    from llm.backend import FakeBackend, use_backend
+    from llm.chat import LLMChat
+    from llm.tokens import estimate_tokens
+
+    class Ticket(BaseModel):
+        title: str = Field(description="title")
+        level: Literal["低", "高"] = Field(description="紧急程度")
+        owner: Employee
+
+    full, compact = compile_spec(Company, "full"), compile_spec(Company, "compact")
+    assert compact is compile_spec(Company, "compact") and compact is not full
+    assert compact.example == full.example
+    assert "\n" not in compact.example_json and "输出类型" not in compact.prompt_tail
+    assert "公司名称" in compact.prompt_tail and compact.prompt_tail.count("邮编") == 1
+    assert estimate_tokens(compact.build_prompt("", "")) < estimate_tokens(full.build_prompt("", "")) * 0.7
+
+    tail = compile_spec(Ticket, "compact").prompt_tail
+    assert "title=" not in tail  # 与字段名相同的说明没有信息量
+    assert "level=紧急程度 取值低/高" in tail
+
+    with use_backend(FakeBackend()):
+        clear_spec_cache()
+        assert isinstance(LLMChat("数据", "提取公司", Company), Company)
+    with pytest.raises(ValueError):
+        compile_spec(Company, "tiny")
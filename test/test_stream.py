@@ -0,0 +1,87 @@
+"""
+流式解析测试 - 按字符喂入，验证元素及时产出与部分对象补全（无需网络）
+"""
+import json
+from typing import List
+from langchain_core.messages import AIMessageChunk
+import llm.stream
+from llm.chat import generate_example
+from llm.stream import IncrementalJSONParser, LLMStream
+from simple_test import Employee, Address
+
+
+def test_parser_yields_elements_as_they_close():
+    parser = IncrementalJSONParser()
+    text = '结果如下：\n```json\n[{"a": "x,]}"}, 2, "s", [1, 2]]\n```'
+    closed = []
+    for ch in text:
+        closed.extend(parser.feed(ch))
+    assert [json.loads(c) for c in closed] == [{"a": "x,]}"}, 2, "s", [1, 2]]
+    assert parser.done
+    assert json.loads(parser.complete_text()) == [{"a": "x,]}"}, 2, "s", [1, 2]]
+
+
+def test_parser_partial_object():
+    parser = IncrementalJSONParser()
+    parser.feed('{"street": "建国路", "city": "北')
+    assert parser.partial() == {"street": "建国路", "city": "北"}
+    parser.feed('京", "zip')
+    assert parser.partial() == {"street": "建国路", "city": "北京"}
+    parser.feed('code": ')
+    assert parser.partial() == {"street": "建国路", "city": "北京"}
+
+
+def test_parser_skips_prose_brackets_and_fence():
+    text = '结果如下[共2条]:\n```json\n[{"name":"a"},{"name":"b"}]\n```'
+    parser = IncrementalJSONParser()
+    closed = []
+    for ch in text:
+        closed.extend(parser.feed(ch))
+    assert [json.loads(c) for c in closed] == [{"name": "a"}, {"name": "b"}]
+    assert json.loads(parser.complete_text()) == [{"name": "a"}, {"name": "b"}]
+
+    # 说明文字的括号未闭合就遇到围栏
+    parser = IncrementalJSONParser()
+    parser.feed('见下方{注意:\n```json\n{"a": 1}\n```')
+    assert parser.partial() == {"a": 1}
+
+
+class FakeStreamLLM:
+    def __init__(self, text: str, size: int = 7):
+        self.text = text
+        self.size = size
+        self.sent = 0
+
+    def stream(self, messages):
+        for i in range(0, len(self.text), self.size):
+            self.sent += 1
+            yield AIMessageChunk(content=self.text[i:i + self.size])
+
+
+def test_llmstream_list_elements(monkeypatch):
+    employees = [generate_example(Employee) for _ in range(3)]
+    fake = FakeStreamLLM(json.dumps(employees, ensure_ascii=False))
+    monkeypatch.setattr(llm.stream, "get_llm", lambda: fake)
+
+    stream = LLMStream("数据", "提取员工", List[Employee])
+    first = next(stream)
+    assert isinstance(first, Employee)
+    # 第一个元素产出时，流还没有读完
+    assert fake.sent < len(fake.text) / fake.size
+    assert len([first] + list(stream)) == 3
+
+
+def test_llmstream_prose_before_fence(monkeypatch):
+    employees = [generate_example(Employee) for _ in range(2)]
+    text = f"结果如下[共2条]:\n```json\n{json.dumps(employees, ensure_ascii=False)}\n```"
+    monkeypatch.setattr(llm.stream, "get_llm", lambda: FakeStreamLLM(text, size=5))
+    assert [e.model_dump() for e in LLMStream("数据", "提取员工", List[Employee])] == \
+        [Employee.model_validate(e).model_dump() for e in employees]
+
+
+def test_llmstream_object_partials(monkeypatch):
+    text = json.dumps(generate_example(Address), ensure_ascii=False)
+    monkeypatch.setattr(llm.stream, "get_llm", lambda: FakeStreamLLM(text, size=3))
+    values = list(LLMStream("数据", "提取地址", Address))
+    assert all(isinstance(v, dict) for v in values[:-1])
+    assert isinstance(values[-1], Address)
@@ -0,0 +1,61 @@
+"""
+工具参数校验测试 - 类型转换、错误反馈与嵌套类型描述（无需网络）
+"""
+from typing import Dict, List, Optional
+import pytest
+from pydantic import BaseModel
+from tools.base import AIToolRegistry, ToolArgumentError, ToolCall
+
+
+class Point(BaseModel):
+    x: int
+    y: int
+
+
+def _registry() -> AIToolRegistry:
+    reg = AIToolRegistry()
+
+    def add_numbers(a: int, b: int) -> int:
+        return a + b
+
+    def farthest(points: List[Point], scale: Optional[float] = None) -> int:
+        return max(p.x * p.x + p.y * p.y for p in points) * (scale or 1)
+
+    def tag(name, **extra) -> str:
+        return f"{name}:{sorted(extra)}"
+
+    reg.register(add_numbers)
+    reg.register(farthest)
+    reg.register(tag)
+    return reg
+
+
+def test_arguments_are_coerced_before_dispatch():
+    reg = _registry()
+    assert reg.call_tool("add_numbers", a="3", b=4) == 7
+    assert reg.call_tool("farthest", points=[{"x": "1", "y": 2}, {"x": 3, "y": 4}]) == 25
+    assert reg.call_tool("tag", name=1, color="red") == "1:['color']"
+
+
+def test_validation_errors_are_reported():
+    reg = _registry()
+    with pytest.raises(ToolArgumentError) as info:
+        reg.call_tool("add_numbers", a="abc", c=1)
+    message = str(info.value)
+    assert "a:" in message and "'abc'" in message
+    assert "b: 缺少必需参数" in message
+    assert "c: 不存在的参数" in message
+
+    # 并行调用时错误作为该位置的结果返回，ToolChat会把它写回上下文
+    results = reg.call_tools([ToolCall(name="add_numbers", parameters={"a": 1}),
+                              ToolCall(name="add_numbers", parameters={"a": 1, "b": "2"})])
+    assert isinstance(results[0], ToolArgumentError)
+    assert results[1] == 3
+
+
+def test_nested_types_are_described():
+    reg = _registry()
+    description = reg.get_tools_description()
+    assert "points(列表[对象{x: 整数, y: 整数}], 必需)" in description
+    assert "scale(浮点数(可为空), 可选)" in description
+    assert reg._get_param_description(Dict[str, List[int]]) == "字典[字符串: 列表[整数]]"
@@ -0,0 +1,66 @@
+"""
+工具结果缓存测试 - 命中统计、TTL、自定义键与非纯函数工具（无需网络）
+"""
+import time
+from tools.base import AIToolRegistry
+from tools.cache import ToolCache
+
+
+def test_pure_tool_is_memoized():
+    reg = AIToolRegistry()
+    calls = []
+
+    def square(x: int) -> int:
+        calls.append(x)
+        return x * x
+
+    reg.register(square, cache=True)
+    assert reg.call_tool("square", x=3) == 9
+    assert reg.call_tool("square", x=3) == 9
+    assert reg.call_tool("square", x=4) == 16
+    assert calls == [3, 4]
+    stats = reg.cache_stats("square")["square"]
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+    reg.clear_cache()
+    reg.call_tool("square", x=3)
+    assert calls == [3, 4, 3]
+
+
+def test_ttl_and_custom_key():
+    reg = AIToolRegistry()
+    calls = []
+
+    def lookup(word: str) -> str:
+        calls.append(word)
+        return word.upper()
+
+    reg.register(lookup, cache=ToolCache(ttl=0.05, key=lambda word: word.lower()))
+    reg.call_tool("lookup", word="Apple")
+    reg.call_tool("lookup", word="APPLE")
+    assert len(calls) == 1
+    time.sleep(0.06)
+    reg.call_tool("lookup", word="apple")
+    assert len(calls) == 2
+
+
+def test_impure_and_failed_calls_are_not_cached():
+    reg = AIToolRegistry()
+    calls = []
+
+    def write(path: str) -> str:
+        calls.append(path)
+        return "ok"
+
+    def flaky(x: int) -> int:
+        calls.append(x)
+        raise RuntimeError("boom")
+
+    reg.register(write, cache=True, pure=False)
+    reg.register(flaky, cache=True)
+    reg.call_tool("write", path="a")
+    reg.call_tool("write", path="a")
+    assert reg.call_tool("flaky", x=1).startswith("工具调用失败")
+    reg.call_tool("flaky", x=1)
+    assert calls == ["a", "a", 1, 1]
+    assert "write" not in reg.cache_stats()
@@ -0,0 +1,47 @@
+"""
+工具发现测试 - 清单缓存与首次调用时懒加载（无需网络）
+"""
+import sys
+from tools import discovery
+from tools.base import registry
+
+PLUGIN = '''
+from tools.base import ai_tool
+
+@ai_tool(name="lazy_demo_echo", description="原样返回文本", cache=True)
+def echo(text: str) -> str:
+    return text
+'''
+
+
+def test_manifest_enables_lazy_import(tmp_path, monkeypatch):
+    module_file = tmp_path / "lazy_demo_tools.py"
+    module_file.write_text(PLUGIN, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("TOOL_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(discovery, "local_modules", lambda: {})
+    monkeypatch.setattr(discovery, "plugin_modules", lambda: {"lazy_demo_tools": str(module_file)})
+
+    try:
+        # 第一次：导入模块并写入清单
+        discovery.discover(registry)
+        description = registry.get_tools_description(["lazy_demo_echo"])
+        assert (tmp_path / "manifest.json").exists()
+
+        # 模拟新进程：清单没变时不导入模块，只登记占位工具
+        del registry.tools["lazy_demo_echo"]
+        del sys.modules["lazy_demo_tools"]
+        discovery.discover(registry)
+        assert "lazy_demo_tools" not in sys.modules
+        assert registry.tools["lazy_demo_echo"]["lazy"]
+        assert registry.get_tools_description(["lazy_demo_echo"]) == description
+        assert registry.get_openai_tools(["lazy_demo_echo"])[0]["function"]["parameters"]["required"] == ["text"]
+
+        # 第一次调用时导入，得到完整的注册信息
+        assert registry.call_tool("lazy_demo_echo", text="hi") == "hi"
+        assert "lazy_demo_tools" in sys.modules
+        assert registry.tools["lazy_demo_echo"]["cache"] is not None
+    finally:
+        registry.tools.pop("lazy_demo_echo", None)
+        registry._invalidate()
+        sys.modules.pop("lazy_demo_tools", None)
@@ -0,0 +1,65 @@
+"""
+工具执行策略测试 - 线程池超时、排队统计与进程池执行（无需网络）
+"""
+import time
+import pytest
+from tools.base import AIToolRegistry, ToolCall
+from tools.executor import ToolExecutor, ToolTimeoutError
+
+
+def cpu_sum(n: int) -> int:
+    return sum(range(n))
+
+
+def test_thread_tool_times_out():
+    reg = AIToolRegistry()
+
+    def hang(seconds: float) -> str:
+        time.sleep(seconds)
+        return "done"
+
+    reg.register(hang, timeout=0.05)
+    assert reg.tools["hang"]["execution"] == "thread"
+    with pytest.raises(ToolTimeoutError):
+        reg.call_tool("hang", seconds=0.5)
+    assert reg.call_tool("hang", seconds=0) == "done"
+
+    # ToolChat并行调用时超时作为该步骤的错误返回
+    results = reg.call_tools([ToolCall(name="hang", parameters={"seconds": 0.5}),
+                              ToolCall(name="hang", parameters={"seconds": 0})])
+    assert isinstance(results[0], ToolTimeoutError) and results[1] == "done"
+    assert reg.execution_stats("hang")["hang"]["timeouts"] == 2
+
+
+def test_bounded_queue_records_wait_time():
+    executor = ToolExecutor(thread_workers=1, queue_size=1)
+
+    def slow() -> int:
+        time.sleep(0.05)
+        return 1
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=3) as callers:
+        results = list(callers.map(lambda _: executor.run("slow", slow, {}, "thread"), range(3)))
+    assert results == [1, 1, 1]
+    stats = executor.stats("slow")["slow"]
+    assert stats["calls"] == 3 and stats["max_run_time"] >= 0.04
+
+    # 队列已满且等不到名额时按排队超时处理
+    def hang() -> None:
+        time.sleep(0.3)
+
+    blocker = ThreadPoolExecutor(max_workers=1).submit(executor.run, "hang", hang, {}, "thread")
+    time.sleep(0.05)
+    with pytest.raises(ToolTimeoutError) as info:
+        executor.run("slow", slow, {}, "thread", timeout=0.05)
+    assert info.value.stage == "排队"
+    blocker.result()
+    executor.shutdown()
+
+
+def test_process_tool():
+    reg = AIToolRegistry()
+    reg.register(cpu_sum, execution="process", timeout=30)
+    assert reg.call_tool("cpu_sum", n="1000") == sum(range(1000))
+    assert reg.execution_stats("cpu_sum")["cpu_sum"]["calls"] == 1
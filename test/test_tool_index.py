@@ -0,0 +1,71 @@
+"""
+工具检索测试 - BM25挑选、pinned工具与注册后缓存失效（无需网络）
+"""
+from tools.base import AIToolRegistry
+from tools.index import ToolIndex, tokenize
+
+
+def _registry() -> AIToolRegistry:
+    reg = AIToolRegistry()
+
+    def search_file(file_path: str, keyword: str) -> str:
+        return ""
+
+    def get_weather(city: str) -> str:
+        return ""
+
+    def add_numbers(a: int, b: int) -> int:
+        return a + b
+
+    def read_tool_result(handle: str) -> str:
+        return ""
+
+    reg.register(search_file, description="在文件中搜索关键词")
+    reg.register(get_weather, description="查询城市天气")
+    reg.register(add_numbers, description="计算两个数字的和")
+    reg.register(read_tool_result, description="读取被截断的结果", pinned=True)
+    return reg
+
+
+def test_tokenize_mixed_text():
+    tokens = tokenize("search_file 搜索文件")
+    assert "search" in tokens and "file" in tokens
+    assert "搜索" in tokens and "文件" in tokens
+
+
+def test_index_ranks_relevant_tool_first():
+    index = ToolIndex()
+    index.build({"weather": "查询城市天气", "add": "计算两个数字的和"})
+    assert index.search("北京天气怎么样", 1)[0][0] == "weather"
+    assert index.search("unrelated", 1) == []
+
+
+def test_select_tools_keeps_pinned():
+    reg = _registry()
+    selected = reg.select_tools("上海天气", 1)
+    assert selected == ["get_weather", "read_tool_result"]
+    assert reg.select_tools("上海天气", 0) == list(reg.tools)
+
+    description = reg.get_tools_description(selected)
+    assert "get_weather" in description and "add_numbers" not in description
+
+
+def test_register_invalidates_caches():
+    reg = _registry()
+    assert "translate" not in reg.get_tools_description()
+    reg.select_tools("天气", 1)
+
+    def translate(text: str) -> str:
+        return text
+
+    reg.register(translate, description="翻译文本")
+    assert "translate" in reg.get_tools_description()
+    assert len(reg.get_openai_tools()) == 5
+    assert reg.select_tools("翻译这段文本", 1)[0] == "translate"
+
+
+def test_select_tools_fills_up_to_k_without_hits():
+    reg = _registry()
+    assert reg.select_tools("hello there", 2) == ["search_file", "get_weather", "read_tool_result"]
+    # 只命中1个时，其余按注册顺序补足
+    assert reg.select_tools("上海天气", 2) == ["get_weather", "search_file", "read_tool_result"]
@@ -0,0 +1,74 @@
+"""
+ToolChat流程测试 - 假后端按脚本返回AIResponse（无需网络）
+"""
+import json
+import time
+import pytest
+import llm.toolchat
+import tools  # noqa: F401  自动注册示例工具
+from llm.context import ExecutionContext
+from llm.toolchat import ToolChat
+from tools.base import AIToolRegistry, ToolCall
+
+
+def _slow_double(x: int) -> int:
+    time.sleep(0.2)
+    return x * 2
+
+
+@pytest.fixture
+def local_registry():
+    """只含slow_double的独立注册表，不影响全局registry"""
+    registry = AIToolRegistry()
+    registry.register(_slow_double, "slow_double", "慢速翻倍")
+    return registry
+
+
+def test_call_tools_runs_in_parallel_and_keeps_order(local_registry):
+    registry = local_registry
+    calls = [ToolCall(name="slow_double", parameters={"x": i}) for i in range(4)]
+    started = time.time()
+    results = registry.call_tools(calls, max_concurrency=4)
+    assert results == [0, 2, 4, 6]
+    assert time.time() - started < 0.6
+
+    missing = registry.call_tools([ToolCall(name="不存在的工具")])
+    assert isinstance(missing[0], ValueError)
+
+
+def test_toolchat_parallel_turn(monkeypatch, fake_llm, local_registry):
+    monkeypatch.setattr(llm.toolchat, "registry", local_registry)
+    fake = fake_llm([
+        json.dumps({"response_type": "tool_call", "tool_calls": [
+            {"name": "slow_double", "parameters": {"x": 1}},
+            {"name": "slow_double", "parameters": {"x": 2}},
+        ]}),
+        json.dumps({"response_type": "direct_reply", "message": "结果是2和4"}),
+    ])
+
+    context = ExecutionContext()
+    assert ToolChat("", "把1和2翻倍", str, context=context) == "结果是2和4"
+    assert "slow_double({'x': 1}) -> 2" in fake.prompts[1]
+    assert "slow_double({'x': 2}) -> 4" in fake.prompts[1]
+    assert context.stats()["iterations"] == 2
+
+
+def test_typed_reply_needs_no_conversion_call(fake_llm):
+    fake = fake_llm([
+        json.dumps({"response_type": "tool_call", "tool_calls": [{"name": "add_numbers", "parameters": {"a": 15, "b": 27}}]}),
+        json.dumps({"response_type": "direct_reply", "message": "15+27=42", "result": 42}),
+    ])
+
+    assert ToolChat("", "计算 15 + 27", int) == 42
+    assert len(fake.prompts) == 2
+
+
+def test_invalid_typed_reply_falls_back_to_conversion(fake_llm):
+    fake = fake_llm([
+        json.dumps({"response_type": "direct_reply", "message": "答案是四十二", "result": "四十二"}),
+        "42",
+    ])
+
+    assert ToolChat("", "计算", int) == 42
+    assert len(fake.prompts) == 2
+    assert "四十二" in fake.prompts[1]
@@ -0,0 +1,40 @@
+"""
+类型系统基准测试 - 用例可运行、基线比较按阈值判断退化（不计时，只验证逻辑）
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+import typesystem  # noqa: E402
+
+
+def test_cases_cover_all_functions_and_run():
+    cases = typesystem.build_cases(quick=True)
+    names = [name for name, _ in cases]
+    for prefix in ("describe_type/", "generate_example/", "schema_to_example/", "parse_to_type/",
+                   "create_typed_object/", "spec.parse/", "spec.parse_strict/"):
+        assert any(name.startswith(prefix) for name in names), prefix
+    assert len(names) == len(set(names))
+    for name, func in cases:
+        assert func() is not None, name
+
+
+def test_company_payload_parses_to_model():
+    text = typesystem.company_json(10 * 1024)
+    assert 5 * 1024 < len(text.encode("utf-8")) < 15 * 1024
+    company = typesystem.parse_to_type(text, typesystem.Company)
+    assert isinstance(company, typesystem.Company)
+    assert company.employees[0].contact.address.city == "北京"
+
+
+def test_compare_uses_relative_time_and_threshold():
+    baseline = {"results": {"a": {"seconds": 1.0, "relative": 1.0}, "b": {"seconds": 1.0, "relative": 1.0}}}
+    results = {
+        "a": {"seconds": 5.0, "relative": 1.2},   # 绝对时间慢但相对值在阈值内
+        "b": {"seconds": 1.0, "relative": 1.3},
+        "new": {"seconds": 9.0, "relative": 9.0},  # 基线中没有的用例不参与比较
+    }
+    assert typesystem.compare(results, baseline, threshold=0.25) == ["b"]
+    assert typesystem.compare(results, baseline, threshold=0.5) == []
+    assert typesystem.compare(results, {}, threshold=0.25) == []
@@ -1,24 +1,15 @@
 """
 工具模块初始化 - 自动注册所有工具
+
+默认按工具清单懒加载：启动时只登记工具名、描述和参数，工具第一次被调用时才导入所在模块；
+设置 TOOL_DISCOVERY=eager 恢复启动时导入全部工具模块
 """
+import os
 
 # 导入base模块，确保注册表可用
 from .base import registry, ai_tool
+from .discovery import discover
 
-# 自动导入所有工具模块，触发装饰器注册
-import os
-import importlib
-
-# 获取当前目录下的所有.py文件
-current_dir = os.path.dirname(__file__)
-for filename in os.listdir(current_dir):
-    if filename.endswith('.py') and filename not in ['__init__.py', 'base.py']:
-        module_name = filename[:-3]  # 去掉.py后缀
-        try:
-            # 动态导入模块
-            importlib.import_module(f'tools.{module_name}')
-            print(f"✅ 自动注册工具模块: tools.{module_name}")
-        except Exception as e:
-            print(f"❌ 注册工具模块失败 {module_name}: {e}")
+discover(registry, lazy=os.getenv("TOOL_DISCOVERY", "lazy") != "eager")
 
 print(f"🎉 工具自动注册完成，共注册 {len(registry.tools)} 个工具")
@@ -2,12 +2,30 @@
 AI工具系统 - 让任何函数都能变成AI工具
 核心思想：装饰器 + 反射 + 自动调用
 """
+import asyncio
+import enum
+import importlib
 import inspect
 import json
-from typing import Any, Dict, List, Callable, get_type_hints, Optional, Union
-from functools import wraps
-from pydantic import BaseModel, Field
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Callable, Literal, get_args, get_origin, get_type_hints, Optional, Union
+from functools import lru_cache, wraps
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
 from llm.chat import LLMChat
+from tools.cache import MISS, make_tool_cache
+from tools.executor import EXECUTION_MODES, ToolTimeoutError, tool_executor
+from tools.index import ToolIndex
+
+
+class ToolArgumentError(ValueError):
+    """工具参数未通过校验，错误信息会原样反馈给模型"""
+
+    def __init__(self, tool_name: str, errors: List[str]):
+        self.tool_name = tool_name
+        self.errors = errors
+        super().__init__(f"工具 {tool_name} 参数校验失败: " + "; ".join(errors))
 
 
 class ToolCall(BaseModel):
@@ -25,9 +43,10 @@ class ToolCall(BaseModel):
 
 
 class AIResponse(BaseModel):
-    """AI响应类 - 简化版，只支持单个工具调用"""
+    """AI响应类 - 一轮可以返回多个互不依赖的工具调用"""
     response_type: str = Field(description="响应类型: 'tool_call' 或 'direct_reply'")
-    tool_call: Optional[ToolCall] = Field(default=None, description="单个工具调用信息")
+    tool_calls: List[ToolCall] = Field(default_factory=list, description="本轮要调用的工具列表，互不依赖的调用可以同时给出")
+    tool_call: Optional[ToolCall] = Field(default=None, description="单个工具调用信息（兼容旧格式）")
     message: Optional[str] = Field(default="", description="直接回复消息")
 
     def model_post_init(self, __context):
@@ -37,8 +56,33 @@ class AIResponse(BaseModel):
         if self.message == "":
             self.message = None
 
+    def all_tool_calls(self) -> List[ToolCall]:
+        """本轮全部工具调用（合并新旧两种格式）"""
+        if self.tool_calls:
+            return self.tool_calls
+        return [self.tool_call] if self.tool_call is not None else []
+
     def is_tool_call(self) -> bool:
-        return self.response_type == "tool_call" and self.tool_call is not None
+        return self.response_type == "tool_call" and bool(self.all_tool_calls())
+
+
+@lru_cache(maxsize=128)
+def typed_response_model(return_type: Any) -> type:
+    """
+    泛型版AIResponse：直接回复时在result中携带目标类型的最终结果
+    这样最后一轮就能直接校验出目标类型，不需要再额外请求一次做类型转换
+    """
+    if return_type is str or isinstance(return_type, str):
+        return AIResponse
+    try:
+        return create_model(
+            "AIResponse",
+            __base__=AIResponse,
+            result=(Optional[return_type], Field(default=None, description="任务完成时的最终结果，必须符合要求的返回类型")),
+        )
+    except Exception:
+        # 无法作为字段类型的返回类型，仍由最后的转换请求处理
+        return AIResponse
 
 
 class AIToolRegistry:
@@ -46,10 +90,28 @@ class AIToolRegistry:
 
     def __init__(self):
         self.tools: Dict[str, Dict] = {}
+        self._openai_tools: Optional[List[Dict]] = None
+        self._description: Optional[str] = None
+        self._index: Optional[ToolIndex] = None
+        self._load_lock = threading.Lock()
     
-    def register(self, func: Callable, name: str = None, description: str = None):
-        """注册一个函数为AI工具"""
+    def register(self, func: Callable, name: str = None, description: str = None, pinned: bool = False,
+                 cache: Any = None, pure: bool = True, execution: str = None, timeout: float = None):
+        """
+        注册一个函数为AI工具
+
+        pinned=True的工具在按相关性筛选时总是保留；
+        cache为缓存策略（True / LRU大小 / dict / ToolCache），相同参数的调用直接返回记忆的结果；
+        pure=False表示工具有副作用或结果随时间变化，永不缓存；
+        execution为执行策略："inline"（调用线程）、"thread"（共享线程池）、"process"（进程池，
+        适合CPU密集型工具，函数和参数需可pickle）；timeout为墙钟超时秒数，设置timeout时默认使用线程池
+        """
         tool_name = name or func.__name__
+        execution = execution or ("thread" if timeout is not None else "inline")
+        if execution not in EXECUTION_MODES:
+            raise ValueError(f"不支持的执行策略: {execution}，可选 {EXECUTION_MODES}")
+        if execution == "inline" and timeout is not None:
+            print(f"⚠️ 工具 {tool_name} 在调用线程内执行，timeout不生效")
         
         # 自动解析函数签名
         sig = inspect.signature(func)
@@ -61,10 +123,23 @@ class AIToolRegistry:
             "name": tool_name,
             "description": description or func.__doc__ or f"调用{tool_name}函数",
             "parameters": {},
-            "required": []
+            "required": [],
+            "pinned": pinned,
+            "pure": pure,
+            "cache": None,
+            "execution": execution,
+            "timeout": timeout,
+            "module": func.__module__,
+            "lazy": False
         }
+        if not pure and cache:
+            print(f"⚠️ 工具 {tool_name} 标记为非纯函数，忽略cache设置")
+        elif pure:
+            tool_info["cache"] = make_tool_cache(cache)
         
         # 解析参数
+        fields = {}
+        extra = "forbid"
         for param_name, param in sig.parameters.items():
             param_type = type_hints.get(param_name, str)
             param_desc = self._get_param_description(param_type)
@@ -77,12 +152,64 @@ class AIToolRegistry:
             # 判断是否必需参数
             if param.default == param.empty:
                 tool_info["required"].append(param_name)
+
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                if param.kind == param.VAR_KEYWORD:
+                    extra = "allow"
+                continue
+            default = ... if param.default == param.empty else param.default
+            # 没有类型注解的参数不做类型转换
+            field_type = type_hints.get(param_name, Any)
+            fields[param_name] = (field_type, Field(default=default, description=f"{param_name}参数"))
+
+        # 参数模型：注册时编译一次，调用前校验并转换参数，也用于生成原生function calling的JSON Schema
+        try:
+            tool_info["args_model"] = create_model(
+                f"{tool_name}_args", __config__=ConfigDict(arbitrary_types_allowed=True, extra=extra), **fields
+            )
+        except Exception as e:
+            print(f"⚠️ 工具 {tool_name} 的参数无法生成校验模型，跳过参数校验: {e}")
+            tool_info["args_model"] = None
         
+        tool_info["line"] = self._describe_tool(tool_info)
         self.tools[tool_name] = tool_info
+        self._invalidate()
         return func
+
+    def register_lazy(self, module: str, entry: Dict):
+        """
+        按工具清单登记一个尚未导入的工具：描述和Schema来自清单，
+        第一次调用时才导入所在模块，由模块里的装饰器替换为真正的注册信息
+        """
+        if entry["name"] in self.tools:
+            return
+        self.tools[entry["name"]] = {
+            **entry, "function": None, "module": module, "lazy": True, "args_model": None,
+            "cache": None, "pure": True, "execution": "inline", "timeout": None,
+        }
+        self._invalidate()
+
+    def _ensure_loaded(self, tool_name: str) -> Dict:
+        """懒加载的工具在第一次使用时导入所在模块"""
+        tool_info = self.tools[tool_name]
+        if not tool_info["lazy"]:
+            return tool_info
+        with self._load_lock:
+            if self.tools[tool_name]["lazy"]:
+                importlib.import_module(tool_info["module"])
+        tool_info = self.tools[tool_name]
+        if tool_info["lazy"]:
+            raise ValueError(f"工具 {tool_name} 在模块 {tool_info['module']} 中不存在，请删除工具清单后重试")
+        return tool_info
+
+    def _invalidate(self):
+        """工具变化后清空缓存的描述、function定义和检索索引"""
+        self._openai_tools = None
+        self._description = None
+        self._index = None
     
     def _get_param_description(self, param_type: Any) -> str:
-        """将Python类型转换为描述"""
+        """将Python类型转换为描述（包含嵌套的元素类型和对象字段）"""
         if param_type == str:
             return "字符串"
         elif param_type == int:
@@ -95,38 +222,200 @@ class AIToolRegistry:
             return "列表"
         elif param_type == dict:
             return "字典"
-        else:
-            return "任意类型"
+
+        origin = get_origin(param_type)
+        args = get_args(param_type)
+        if origin in (list, set, tuple) and args:
+            return f"列表[{self._get_param_description(args[0])}]"
+        if origin is dict and len(args) == 2:
+            return f"字典[{self._get_param_description(args[0])}: {self._get_param_description(args[1])}]"
+        if origin in (Union, types.UnionType):
+            options = [arg for arg in args if arg is not type(None)]
+            desc = "或".join(self._get_param_description(arg) for arg in options)
+            return f"{desc}(可为空)" if len(options) < len(args) else desc
+        if origin is Literal:
+            return "取值之一: " + "/".join(repr(arg) for arg in args)
+        if isinstance(param_type, type) and issubclass(param_type, enum.Enum):
+            return "取值之一: " + "/".join(repr(member.value) for member in param_type)
+        if isinstance(param_type, type) and issubclass(param_type, BaseModel):
+            fields = ", ".join(f"{name}: {self._get_param_description(field.annotation)}"
+                               for name, field in param_type.model_fields.items())
+            return f"对象{{{fields}}}"
+        return "任意类型"
     
-    def get_tools_description(self) -> str:
-        """获取所有工具的描述"""
+    def _describe_tool(self, tool_info: Dict) -> str:
+        """单个工具的描述行（注册时生成一次）"""
+        params = []
+        for param_name, param_info in tool_info["parameters"].items():
+            required = "必需" if param_name in tool_info["required"] else "可选"
+            params.append(f"{param_name}({param_info['type']}, {required})")
+
+        param_str = ", ".join(params) if params else "无参数"
+        return f"- {tool_info['name']}: {tool_info['description']} | 参数: {param_str}"
+
+    def get_tools_description(self, names: List[str] = None) -> str:
+        """获取工具描述；names为None时返回全部工具（结果缓存到下次注册）"""
         if not self.tools:
             return "没有可用的工具"
-        
-        descriptions = []
-        for tool_name, tool_info in self.tools.items():
-            params = []
-            for param_name, param_info in tool_info["parameters"].items():
-                required = "必需" if param_name in tool_info["required"] else "可选"
-                params.append(f"{param_name}({param_info['type']}, {required})")
-            
-            param_str = ", ".join(params) if params else "无参数"
-            descriptions.append(f"- {tool_name}: {tool_info['description']} | 参数: {param_str}")
-        
-        return "\n".join(descriptions)
-    
+
+        if names is not None:
+            return "\n".join(self.tools[name]["line"] for name in names if name in self.tools)
+
+        if self._description is None:
+            self._description = "\n".join(tool_info["line"] for tool_info in self.tools.values())
+        return self._description
+
+    def select_tools(self, query: str, k: int) -> List[str]:
+        """
+        按相关性挑选工具：BM25得分最高的k个 + 所有pinned工具
+        工具总数不超过k时直接返回全部；命中不足k个（如查询与所有工具都没有共同的词）时
+        按注册顺序补足k个，保证模型总有工具可用
+        """
+        if k <= 0 or len(self.tools) <= k:
+            return list(self.tools)
+
+        if self._index is None:
+            index = ToolIndex()
+            index.build({
+                name: " ".join([name, info["description"], " ".join(info["parameters"])])
+                for name, info in self.tools.items()
+            })
+            self._index = index
+
+        selected = [name for name, _ in self._index.search(query, k)]
+        if len(selected) < k:
+            chosen = set(selected)
+            selected += [name for name in self.tools if name not in chosen][:k - len(selected)]
+        pinned = [name for name, info in self.tools.items() if info["pinned"] and name not in selected]
+        return selected + pinned
+
+    def get_openai_tools(self, names: List[str] = None) -> List[Dict]:
+        """工具的OpenAI function calling格式定义（注册新工具后重新生成）；names指定时只返回这些工具"""
+        if names is not None:
+            wanted = set(names)
+            return [tool for tool in self.get_openai_tools() if tool["function"]["name"] in wanted]
+        if self._openai_tools is None:
+            self._openai_tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool_name,
+                        "description": tool_info["description"],
+                        "parameters": self._json_schema(tool_info),
+                    },
+                }
+                for tool_name, tool_info in self.tools.items()
+            ]
+        return self._openai_tools
+
+    def _json_schema(self, tool_info: Dict) -> Dict:
+        if tool_info["lazy"]:
+            return tool_info["schema"]
+        if tool_info["args_model"] is None:
+            return {"type": "object", "properties": {}}
+        try:
+            return tool_info["args_model"].model_json_schema()
+        except Exception:
+            # 参数里有无法生成Schema的自定义类型时，退化为不限定结构的对象
+            return {"type": "object", "properties": {}}
+
     def call_tool(self, tool_name: str, **kwargs) -> Any:
         """调用指定的工具"""
         if tool_name not in self.tools:
             raise ValueError(f"工具 {tool_name} 不存在")
         
-        tool_info = self.tools[tool_name]
+        tool_info = self._ensure_loaded(tool_name)
         func = tool_info["function"]
-        
+        kwargs = self.validate_arguments(tool_name, kwargs)
+        cache = tool_info["cache"]
+        key = cache.make_key(kwargs) if cache is not None else None
+        if key is not None:
+            result = cache.get(key)
+            if result is not MISS:
+                return result
+
         try:
-            return func(**kwargs)
+            result = tool_executor.run(tool_name, func, kwargs, tool_info["execution"], tool_info["timeout"])
+        except ToolTimeoutError:
+            raise
         except Exception as e:
             return f"工具调用失败: {e}"
+        # 只缓存成功的结果
+        if key is not None:
+            cache.set(key, result)
+        return result
+
+    def validate_arguments(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按注册时编译的参数模型校验并转换参数（如"3"转为3）
+
+        Raises:
+            ToolArgumentError: 缺少参数、类型不符或有多余参数，错误信息可直接反馈给模型
+        """
+        args_model = self._ensure_loaded(tool_name)["args_model"]
+        if args_model is None:
+            return arguments
+        try:
+            parsed = args_model.model_validate(arguments)
+        except ValidationError as e:
+            raise ToolArgumentError(tool_name, [self._format_error(error) for error in e.errors()]) from None
+        # 取属性而不是model_dump，保留嵌套的Pydantic对象
+        values = {name: getattr(parsed, name) for name in args_model.model_fields}
+        values.update(parsed.model_extra or {})
+        return values
+
+    def _format_error(self, error: Dict) -> str:
+        location = ".".join(str(part) for part in error["loc"]) or "参数"
+        if error["type"] == "missing":
+            return f"{location}: 缺少必需参数"
+        if error["type"] == "extra_forbidden":
+            return f"{location}: 不存在的参数"
+        return f"{location}: {error['msg']}（收到 {error['input']!r}）"
+
+    def execution_stats(self, tool_name: str = None) -> Dict[str, Dict]:
+        """工具执行统计：调用/出错/超时次数，平均与最大的排队等待和运行时间（秒）"""
+        return tool_executor.stats(tool_name)
+
+    def cache_stats(self, tool_name: str = None) -> Dict[str, Dict]:
+        """开启了缓存的工具的命中统计"""
+        names = [tool_name] if tool_name else list(self.tools)
+        return {name: self.tools[name]["cache"].stats() for name in names
+                if name in self.tools and self.tools[name]["cache"] is not None}
+
+    def clear_cache(self, tool_name: str = None):
+        """清空工具结果缓存；tool_name为None时清空全部"""
+        names = [tool_name] if tool_name else list(self.tools)
+        for name in names:
+            if name in self.tools and self.tools[name]["cache"] is not None:
+                self.tools[name]["cache"].clear()
+
+    def call_tools(self, calls: List[ToolCall], max_concurrency: int = 4) -> List[Any]:
+        """
+        并行调用多个互不依赖的工具
+
+        结果顺序与calls一致；单个调用抛出的异常作为该位置的结果返回，不影响其他调用
+        """
+        if len(calls) <= 1 or max_concurrency <= 1:
+            return [self._call_safely(call) for call in calls]
+
+        with ThreadPoolExecutor(max_workers=min(len(calls), max_concurrency)) as pool:
+            return list(pool.map(self._call_safely, calls))
+
+    async def acall_tools(self, calls: List[ToolCall], max_concurrency: int = 4) -> List[Any]:
+        """call_tools的异步版本，工具在线程中执行"""
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+        async def run(call: ToolCall):
+            async with semaphore:
+                return await asyncio.to_thread(self._call_safely, call)
+
+        return list(await asyncio.gather(*(run(call) for call in calls)))
+
+    def _call_safely(self, call: ToolCall) -> Any:
+        try:
+            return self.call_tool(call.name, **call.parameters)
+        except Exception as e:
+            return e
 
 
 # 全局工具注册中心
@@ -135,9 +424,11 @@ registry = AIToolRegistry()
 def get_registry():
     return registry
 
-def ai_tool(name: str = None, description: str = None):
+def ai_tool(name: str = None, description: str = None, pinned: bool = False,
+            cache: Any = None, pure: bool = True, execution: str = None, timeout: float = None):
     """装饰器：将函数注册为AI工具"""
     def decorator(func):
-        registry.register(func, name, description)
+        registry.register(func, name, description, pinned=pinned, cache=cache, pure=pure,
+                          execution=execution, timeout=timeout)
         return func
     return decorator
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+工具结果缓存 - 纯函数工具按参数记忆结果（LRU + TTL）
+通过 @ai_tool(cache=...) 开启；标记为 pure=False 的工具永不缓存
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# 未命中标记（工具可能合法地返回None）
+MISS = object()
+
+
+def default_key(**kwargs) -> str:
+    """默认缓存键：参数按键排序后的JSON"""
+    return json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+class ToolCache:
+    """
+    单个工具的结果缓存
+
+    Args:
+        max_size: 最多缓存的条目数，超出后淘汰最久未使用的条目
+        ttl: 过期秒数，为None时永不过期
+        key: 自定义缓存键函数，接收与工具相同的关键字参数，返回可哈希的值
+    """
+
+    def __init__(self, max_size: int = 128, ttl: float = None, key: Callable[..., Hashable] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.key = key or default_key
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def make_key(self, kwargs: Dict[str, Any]) -> Optional[Hashable]:
+        """生成缓存键；参数无法生成键时返回None（本次不缓存）"""
+        try:
+            key = self.key(**kwargs)
+            hash(key)
+            return key
+        except Exception:
+            return None
+
+    def get(self, key: Hashable) -> Any:
+        """读取缓存，未命中或已过期返回MISS"""
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                value, created = entry
+                if self.ttl is None or now - created <= self.ttl:
+                    self._items.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._items[key]
+            self._stats["misses"] += 1
+            return MISS
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._items[key] = (value, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "size": len(self._items),
+                    "hit_rate": self._stats["hits"] / total if total else 0.0}
+
+
+def make_tool_cache(cache: Any) -> Optional[ToolCache]:
+    """
+    把cache参数转换为ToolCache
+
+    None/False: 不缓存；True: 默认策略；int: LRU大小；
+    dict: ToolCache的参数（max_size/ttl/key）；ToolCache: 直接使用
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return ToolCache()
+    if isinstance(cache, ToolCache):
+        return cache
+    if isinstance(cache, int):
+        return ToolCache(max_size=cache)
+    if isinstance(cache, dict):
+        return ToolCache(**cache)
+    raise TypeError(f"不支持的cache参数: {cache!r}")
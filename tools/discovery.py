@@ -0,0 +1,131 @@
+"""
+工具发现 - 扫描tools目录和插件入口点，按清单懒加载
+清单缓存每个模块的工具名、描述和参数Schema；模块文件没变时启动不再导入，
+工具第一次被调用时才导入所在模块
+"""
+import importlib
+import importlib.util
+import json
+import os
+from importlib.metadata import entry_points
+from typing import Dict, List
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+# 工具系统自身的模块，不是工具模块
+INTERNAL_MODULES = {"__init__", "base", "index", "cache", "executor", "discovery"}
+# 第三方包通过这个入口点组提供工具模块，如 [project.entry-points."opensoul.tools"] my_tools = "my_pkg.tools"
+ENTRY_POINT_GROUP = "opensoul.tools"
+
+
+def local_modules() -> Dict[str, str]:
+    """tools目录下的工具模块 {模块名: 文件路径}"""
+    modules = {}
+    for filename in sorted(os.listdir(TOOLS_DIR)):
+        if filename.endswith('.py') and filename[:-3] not in INTERNAL_MODULES:
+            modules[f"tools.{filename[:-3]}"] = os.path.join(TOOLS_DIR, filename)
+    return modules
+
+
+def plugin_modules() -> Dict[str, str]:
+    """入口点声明的插件工具模块 {模块名: 文件路径}（只定位文件，不导入）"""
+    modules = {}
+    for entry in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            spec = importlib.util.find_spec(entry.value)
+            if spec is None or not spec.origin:
+                raise ImportError("找不到模块")
+            modules[entry.value] = spec.origin
+        except Exception as e:
+            print(f"❌ 插件工具模块无法定位 {entry.value}: {e}")
+    return modules
+
+
+def manifest_path() -> str:
+    return os.getenv("TOOL_MANIFEST_PATH") or os.path.join(TOOLS_DIR, "__pycache__", "tool_manifest.json")
+
+
+def load_manifest(path: str) -> Dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: str, manifest: Dict):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 工具清单写入失败 {path}: {e}")
+
+
+def _fingerprint(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def manifest_entry(registry, tool_info: Dict) -> Dict:
+    """已注册工具在清单中的记录：足够生成描述、检索索引和function定义"""
+    return {
+        "name": tool_info["name"],
+        "description": tool_info["description"],
+        "line": tool_info["line"],
+        "parameters": tool_info["parameters"],
+        "required": tool_info["required"],
+        "pinned": tool_info["pinned"],
+        "schema": registry._json_schema(tool_info),
+    }
+
+
+def discover(registry, lazy: bool = True) -> int:
+    """
+    发现并注册工具模块，返回模块数
+
+    lazy=False时与以前一样逐个导入；lazy=True时清单里没变的模块只登记占位工具，
+    新增或修改过的模块导入一次并更新清单
+    """
+    modules = {**local_modules(), **plugin_modules()}
+    if not lazy:
+        for module in modules:
+            try:
+                importlib.import_module(module)
+                print(f"✅ 自动注册工具模块: {module}")
+            except Exception as e:
+                print(f"❌ 注册工具模块失败 {module}: {e}")
+        return len(modules)
+
+    path = manifest_path()
+    manifest = load_manifest(path)
+    updated = {}
+    for module, filename in modules.items():
+        try:
+            fingerprint = _fingerprint(filename)
+        except OSError as e:
+            print(f"❌ 注册工具模块失败 {module}: {e}")
+            continue
+
+        record = manifest.get(module)
+        if record is not None and record.get("fingerprint") == fingerprint:
+            for entry in record["tools"]:
+                registry.register_lazy(module, entry)
+        else:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                print(f"❌ 注册工具模块失败 {module}: {e}")
+                continue
+            record = {
+                "path": filename,
+                "fingerprint": fingerprint,
+                "tools": [manifest_entry(registry, info) for info in registry.tools.values()
+                          if info.get("module") == module],
+            }
+        updated[module] = record
+
+    if updated != manifest:
+        save_manifest(path, updated)
+    return len(updated)
@@ -0,0 +1,172 @@
+"""
+工具执行器 - 按工具声明的执行策略运行：inline / 共享线程池 / 进程池
+带墙钟超时、排队上限，并统计排队等待与实际运行时间
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+
+class ToolTimeoutError(TimeoutError):
+    """工具在超时时间内没有完成（包括排队时间）"""
+
+    def __init__(self, tool_name: str, timeout: float, stage: str):
+        self.tool_name = tool_name
+        self.timeout = timeout
+        self.stage = stage
+        super().__init__(f"工具 {tool_name} {stage}超时（{timeout}秒）")
+
+
+def _timed_call(func: Callable, kwargs: Dict[str, Any]) -> Tuple[Any, float, float]:
+    """在工作线程/进程中执行，返回(结果, 开始时间, 结束时间)；用墙钟时间以便跨进程比较"""
+    started = time.time()
+    result = func(**kwargs)
+    return result, started, time.time()
+
+
+class ToolStats:
+    """单个工具的执行统计"""
+
+    __slots__ = ("calls", "finished", "errors", "timeouts", "cancelled", "queue_wait", "max_queue_wait",
+                 "run_time", "max_run_time")
+
+    def __init__(self):
+        self.calls = self.finished = self.errors = self.timeouts = self.cancelled = 0
+        self.queue_wait = self.max_queue_wait = 0.0
+        self.run_time = self.max_run_time = 0.0
+
+    def record(self, queue_wait: float, run_time: float):
+        self.finished += 1
+        self.queue_wait += queue_wait
+        self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+        self.run_time += run_time
+        self.max_run_time = max(self.max_run_time, run_time)
+
+    def as_dict(self) -> Dict[str, Any]:
+        finished = max(self.finished, 1)
+        return {
+            "calls": self.calls, "errors": self.errors, "timeouts": self.timeouts, "cancelled": self.cancelled,
+            "avg_queue_wait": self.queue_wait / finished, "max_queue_wait": self.max_queue_wait,
+            "avg_run_time": self.run_time / finished, "max_run_time": self.max_run_time,
+        }
+
+
+class ToolExecutor:
+    """
+    共享的工具执行池
+
+    Args:
+        thread_workers: 线程池大小（I/O型工具）
+        process_workers: 进程池大小（CPU密集或长时间持有GIL的工具），默认CPU核数
+        queue_size: 每个池允许同时排队+运行的调用数，超出时调用方阻塞等待（计入超时）
+
+    超时后会取消还在排队的调用；已经开始运行的线程/进程无法强行中断，
+    调用方不再等待，它占用的排队名额在真正结束后才释放
+    """
+
+    def __init__(self, thread_workers: int = None, process_workers: int = None, queue_size: int = None):
+        self.thread_workers = thread_workers or int(os.getenv("TOOL_THREAD_WORKERS") or 8)
+        self.process_workers = process_workers or int(os.getenv("TOOL_PROCESS_WORKERS") or (os.cpu_count() or 2))
+        self.queue_size = queue_size or int(os.getenv("TOOL_QUEUE_SIZE") or 64)
+        self._pools: Dict[str, Any] = {}
+        self._slots = {mode: threading.BoundedSemaphore(self.queue_size) for mode in ("thread", "process")}
+        self._stats: Dict[str, ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, mode: str):
+        with self._lock:
+            pool = self._pools.get(mode)
+            if pool is None:
+                if mode == "thread":
+                    pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="tool")
+                else:
+                    pool = ProcessPoolExecutor(max_workers=self.process_workers)
+                self._pools[mode] = pool
+            return pool
+
+    def _tool_stats(self, tool_name: str) -> ToolStats:
+        with self._lock:
+            stats = self._stats.get(tool_name)
+            if stats is None:
+                stats = self._stats[tool_name] = ToolStats()
+            return stats
+
+    def run(self, tool_name: str, func: Callable, kwargs: Dict[str, Any],
+            mode: str = "inline", timeout: Optional[float] = None) -> Any:
+        """
+        按执行策略运行工具，工具自身抛出的异常原样抛出
+
+        Raises:
+            ToolTimeoutError: 排队或运行超过timeout秒
+        """
+        stats = self._tool_stats(tool_name)
+        with self._lock:
+            stats.calls += 1
+        submitted = time.time()
+
+        if mode == "inline":
+            try:
+                result, started, finished = _timed_call(func, kwargs)
+            except Exception:
+                with self._lock:
+                    stats.errors += 1
+                raise
+            with self._lock:
+                stats.record(started - submitted, finished - started)
+            return result
+
+        # 排队名额：超出queue_size时等待，等待时间计入超时
+        slots = self._slots[mode]
+        if not slots.acquire(timeout=timeout):
+            with self._lock:
+                stats.timeouts += 1
+            raise ToolTimeoutError(tool_name, timeout, "排队")
+        try:
+            future: Future = self._pool(mode).submit(_timed_call, func, kwargs)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+
+        remaining = None if timeout is None else max(timeout - (time.time() - submitted), 0)
+        try:
+            result, started, finished = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            cancelled = future.cancel()
+            with self._lock:
+                stats.timeouts += 1
+                stats.cancelled += int(cancelled)
+            raise ToolTimeoutError(tool_name, timeout, "排队" if cancelled else "运行") from None
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+        with self._lock:
+            stats.record(max(started - submitted, 0.0), finished - started)
+        return result
+
+    def stats(self, tool_name: str = None) -> Dict[str, Dict]:
+        with self._lock:
+            items = self._stats.items() if tool_name is None else \
+                [(tool_name, self._stats[tool_name])] if tool_name in self._stats else []
+            return {name: stats.as_dict() for name, stats in items}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池和进程池（之后再调用会重新创建）"""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# 全局工具执行器
+tool_executor = ToolExecutor()
@@ -0,0 +1,316 @@
+"""
+文件工具 - 基于mmap的分块扫描与按范围读写
+大文件不整体读入内存：搜索按块匹配并在达到匹配数后立即停止，读取只映射需要的范围，
+写入先写临时文件再原子替换；每个工具的输出不超过 TOOL_MAX_OUTPUT 个字符
+"""
+import fnmatch
+import glob
+import mmap
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Pattern
+from tools.base import ai_tool
+
+# 每块大约的字节数，块边界对齐到换行符（匹配不跨行）
+CHUNK_SIZE = 8 * 1024 * 1024
+# 返回的单行文本最大字符数
+MAX_LINE_CHARS = 200
+
+
+class FileMatch(NamedTuple):
+    """一处匹配：文件、行号（从1开始）、该行起始的字节偏移、行文本"""
+    path: str
+    line: int
+    offset: int
+    text: str
+
+
+def compile_pattern(pattern: str, regex: bool = False, ignore_case: bool = False) -> Pattern[bytes]:
+    """编译为bytes正则；regex=False时按字面量匹配，正则模式下^和$匹配每行的行首行尾"""
+    source = pattern.encode("utf-8")
+    flags = re.IGNORECASE if ignore_case else 0
+    if regex:
+        # 按多行的块扫描，不加MULTILINE时^/$只在块边界处匹配
+        flags |= re.MULTILINE
+    else:
+        source = re.escape(source)
+    return re.compile(source, flags)
+
+
+def _is_binary(mm: mmap.mmap) -> bool:
+    return b"\0" in mm[:8192]
+
+
+def _line_text(raw: bytes) -> str:
+    text = raw.rstrip(b"\r").decode("utf-8", errors="replace")
+    return text if len(text) <= MAX_LINE_CHARS else text[:MAX_LINE_CHARS] + "…"
+
+
+def scan_file(path: str, pattern: Pattern[bytes], stop: threading.Event = None,
+              chunk_size: int = CHUNK_SIZE) -> Iterator[FileMatch]:
+    """
+    用mmap分块扫描单个文件，逐个产出匹配行（同一行只产出一次）
+
+    stop被设置时在下一处匹配前停止；空文件和二进制文件直接跳过
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if _is_binary(mm):
+                return
+            size = len(mm)
+            start, line = 0, 1
+            while start < size:
+                if stop is not None and stop.is_set():
+                    return
+                end = mm.find(b"\n", min(start + chunk_size, size))
+                end = size if end < 0 else end + 1
+                chunk = mm[start:end]
+
+                counted, last_line_start = 0, -1
+                for match in pattern.finditer(chunk):
+                    if stop is not None and stop.is_set():
+                        return
+                    line_start = chunk.rfind(b"\n", 0, match.start()) + 1
+                    if line_start == last_line_start:
+                        continue
+                    line += chunk.count(b"\n", counted, line_start)
+                    counted = line_start
+                    last_line_start = line_start
+                    line_end = chunk.find(b"\n", match.end())
+                    line_end = len(chunk) if line_end < 0 else line_end
+                    yield FileMatch(path, line, start + line_start, _line_text(chunk[line_start:line_end]))
+
+                line += chunk.count(b"\n", counted)
+                start = end
+
+
+def expand_targets(target: str, include: str = "*") -> List[str]:
+    """把文件、目录（递归）或glob模式展开为文件列表；include过滤目录下的文件名"""
+    if os.path.isfile(target):
+        return [target]
+    if os.path.isdir(target):
+        files = []
+        for root, dirs, names in os.walk(target):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            files.extend(os.path.join(root, name) for name in sorted(names) if fnmatch.fnmatch(name, include))
+        return files
+    return sorted(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+
+
+def search_files(target: str, pattern: str, regex: bool = False, ignore_case: bool = False,
+                 max_matches: int = 20, include: str = "*", max_workers: int = 4) -> List[FileMatch]:
+    """
+    在一个或多个文件中搜索，达到max_matches后所有文件立即停止扫描
+
+    多个文件并行扫描；结果按文件顺序和偏移排序
+    """
+    compiled = compile_pattern(pattern, regex, ignore_case)
+    files = expand_targets(target, include)
+    stop = threading.Event()
+    lock = threading.Lock()
+    matches: List[FileMatch] = []
+
+    def scan(path: str):
+        try:
+            for match in scan_file(path, compiled, stop):
+                with lock:
+                    if len(matches) >= max_matches:
+                        stop.set()
+                        return
+                    matches.append(match)
+                    if len(matches) >= max_matches:
+                        stop.set()
+                        return
+        except (OSError, ValueError):
+            # 无权限或无法映射的文件跳过
+            return
+
+    if len(files) <= 1 or max_workers <= 1:
+        for path in files:
+            scan(path)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(files))) as pool:
+            list(pool.map(scan, files))
+
+    order = {path: i for i, path in enumerate(files)}
+    return sorted(matches, key=lambda m: (order[m.path], m.offset))
+
+
+def max_output() -> int:
+    """单次工具输出的字符上限"""
+    return int(os.getenv("TOOL_MAX_OUTPUT") or 4000)
+
+
+def _umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def atomic_write(path: str, data: bytes):
+    """写入同目录的临时文件后用rename原子替换，读者只会看到旧内容或完整的新内容"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp创建的文件是0600：已有文件沿用原权限，新文件与open()一致（0666去掉umask）
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        else:
+            os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _line_offset(mm: mmap.mmap, line: int) -> Optional[int]:
+    """第line行（从1开始）起始的字节偏移，超出文件时返回None"""
+    position, remaining = 0, line - 1
+    size = len(mm)
+    while remaining > 0:
+        if position >= size:
+            return None
+        chunk = mm[position:position + CHUNK_SIZE]
+        newlines = chunk.count(b"\n")
+        if newlines < remaining:
+            remaining -= newlines
+            position += len(chunk)
+            continue
+        index = -1
+        for _ in range(remaining):
+            index = chunk.find(b"\n", index + 1)
+        return position + index + 1 if position + index + 1 < size else None
+    return 0
+
+
+@ai_tool(description="按行读取文件的一段（适合大文件，返回带行号的内容）")
+def read_lines(filename: str, start_line: int = 1, max_lines: int = 100) -> str:
+    """读取从start_line开始的最多max_lines行，输出超过上限时提前截断并提示下一次的start_line"""
+    limit = max_output()
+    try:
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return f"{filename} 是空文件"
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                position = _line_offset(mm, max(start_line, 1))
+                if position is None:
+                    return f"{filename} 没有第{start_line}行"
+                lines, used, number = [], 0, max(start_line, 1)
+                while position < size and len(lines) < max_lines:
+                    end = mm.find(b"\n", position)
+                    end = size if end < 0 else end
+                    raw = mm[position:end].rstrip(b"\r").decode("utf-8", errors="replace")
+                    text = f"{number}: {raw}"
+                    if used + len(text) > limit and lines:
+                        break
+                    lines.append(text[:limit])
+                    used += len(text) + 1
+                    position, number = end + 1, number + 1
+    except Exception as e:
+        return f"读取失败: {e}"
+
+    rest = "" if position >= size else f"\n...[未读完，从start_line={number}继续读取]"
+    return "\n".join(lines) + rest
+
+
+@ai_tool(description="按字节范围读取文件（适合大文件或二进制文件的定位读取，可配合search_file返回的偏移）")
+def read_bytes(filename: str, offset: int = 0, length: int = 4096) -> str:
+    """读取[offset, offset+length)字节并按UTF-8解码，长度受输出上限约束"""
+    length = max(0, min(length, max_output()))
+    try:
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset >= size:
+                return f"偏移{offset}超出文件大小{size}"
+            f.seek(offset)
+            data = f.read(length)
+    except Exception as e:
+        return f"读取失败: {e}"
+
+    end = offset + len(data)
+    rest = "" if end >= size else f"\n...[共{size}字节，从offset={end}继续读取]"
+    return f"[字节 {offset}-{end}]\n{data.decode('utf-8', errors='replace')}{rest}"
+
+
+@ai_tool(description="在文件末尾追加内容（文件不存在时创建）", pure=False)
+def append_file(filename: str, content: str) -> str:
+    """追加写入，不读取原有内容"""
+    try:
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write(content)
+        return f"已向 {filename} 追加 {len(content)} 个字符"
+    except Exception as e:
+        return f"追加失败: {e}"
+
+
+@ai_tool(description="把文件中的一段文本替换为新文本（原子写入，只需给出要修改的片段）", pure=False)
+def patch_file(filename: str, old_text: str, new_text: str, count: int = 1) -> str:
+    """替换前count处old_text；通过mmap定位，分块复制到临时文件后原子替换，不整体读入内存"""
+    old, new = old_text.encode("utf-8"), new_text.encode("utf-8")
+    if not old:
+        return "old_text不能为空"
+    try:
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return f"在 {filename} 中未找到要替换的文本"
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                positions, start = [], 0
+                while len(positions) < max(count, 1):
+                    found = mm.find(old, start)
+                    if found < 0:
+                        break
+                    positions.append(found)
+                    start = found + len(old)
+                if not positions:
+                    return f"在 {filename} 中未找到要替换的文本"
+
+                directory = os.path.dirname(os.path.abspath(filename))
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filename)}.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        cursor = 0
+                        for found in positions:
+                            _copy_range(mm, out, cursor, found)
+                            out.write(new)
+                            cursor = found + len(old)
+                        _copy_range(mm, out, cursor, size)
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.chmod(tmp, os.stat(filename).st_mode & 0o7777)
+                    os.replace(tmp, filename)
+                except BaseException:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                    raise
+    except Exception as e:
+        return f"修改失败: {e}"
+    return f"已在 {filename} 中替换 {len(positions)} 处"
+
+
+def _copy_range(mm: mmap.mmap, out, start: int, end: int):
+    while start < end:
+        step = min(CHUNK_SIZE, end - start)
+        out.write(mm[start:start + step])
+        start += step
+
+
+@ai_tool(description="写入整个文件（原子写入：先写临时文件再替换，失败时原文件不变）", pure=False)
+def write_file(filename: str, content: str) -> str:
+    """原子地写入完整内容"""
+    try:
+        atomic_write(filename, content.encode("utf-8"))
+        return f"文件 {filename} 写入成功"
+    except Exception as e:
+        return f"文件写入失败: {e}"
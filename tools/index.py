@@ -0,0 +1,67 @@
+"""
+工具检索索引 - 本地BM25，按问题和上下文挑出最相关的工具
+不依赖向量模型；中文按单字+二元组切分，英文按单词（含snake_case拆分）切分
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_WORD = re.compile(r'[a-z0-9]+')
+_CJK_RUN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为检索用的词项"""
+    text = text.lower()
+    tokens = _WORD.findall(text)
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class ToolIndex:
+    """BM25索引：文档为 工具名 + 描述 + 参数名"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    def build(self, documents: Dict[str, str]):
+        """用 {工具名: 文本} 重建索引"""
+        self._docs = {name: Counter(tokenize(text)) for name, text in documents.items()}
+        self._lengths = {name: sum(counts.values()) for name, counts in self._docs.items()}
+        self._avg_length = sum(self._lengths.values()) / max(len(self._docs), 1)
+
+        frequency = Counter()
+        for counts in self._docs.values():
+            frequency.update(counts.keys())
+        total = len(self._docs)
+        self._idf = {term: math.log(1 + (total - n + 0.5) / (n + 0.5)) for term, n in frequency.items()}
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """返回得分最高的k个(工具名, 得分)，只包含得分大于0的工具"""
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        if not terms:
+            return []
+
+        scores = []
+        for name, counts in self._docs.items():
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[name] / (self._avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((name, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:k]
+
+    def __len__(self) -> int:
+        return len(self._docs)
@@ -1,41 +1,47 @@
+import os
 from tools.base import ai_tool
 
 # 示例工具定义
-@ai_tool(description="获取当前时间")
+@ai_tool(description="获取当前时间", pure=False)
 def get_current_time() -> str:
     """获取当前时间"""
     from datetime import datetime
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-@ai_tool(description="计算两个数的和")
+@ai_tool(description="计算两个数的和", cache=True)
 def add_numbers(a: int, b: int) -> int:
     """计算两个数的和"""
     return a + b
 
 
-@ai_tool(description="搜索文件内容")
-def search_file(filename: str, keyword: str) -> str:
-    """在文件中搜索关键词"""
+@ai_tool(description="搜索文件内容（支持正则，filename可以是文件、目录或glob模式如 logs/*.log）")
+def search_file(filename: str, keyword: str, regex: bool = False, ignore_case: bool = False,
+                max_matches: int = 5, include: str = "*") -> str:
+    """在文件中搜索关键词，返回行号和字节偏移，找够max_matches个匹配后立即停止"""
+    from tools.files import max_output, search_files
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            content = f.read()
-            if keyword in content:
-                lines = content.split('\n')
-                results = [f"第{i+1}行: {line}" for i, line in enumerate(lines) if keyword in line]
-                return f"找到 {len(results)} 个匹配:\n" + "\n".join(results[:5])
-            else:
-                return f"在 {filename} 中未找到 '{keyword}'"
+        matches = search_files(filename, keyword, regex=regex, ignore_case=ignore_case,
+                               max_matches=max_matches, include=include)
     except Exception as e:
         return f"搜索失败: {e}"
+    if not matches:
+        return f"在 {filename} 中未找到 '{keyword}'"
 
+    multiple = len({m.path for m in matches}) > 1 or os.path.isdir(filename) or not os.path.isfile(filename)
+    lines = [f"{m.path + ' ' if multiple else ''}第{m.line}行(偏移{m.offset}): {m.text}" for m in matches]
+    more = "（已达上限，可能还有更多）" if len(matches) >= max_matches else ""
+    result = f"找到 {len(matches)} 个匹配{more}:\n" + "\n".join(lines)
+    limit = max_output()
+    return result if len(result) <= limit else result[:limit] + "\n...[输出已截断]"
 
-@ai_tool(description="创建文件")
+
+@ai_tool(description="创建文件", pure=False)
 def create_file(filename: str, content: str) -> str:
-    """创建文件并写入内容"""
+    """创建文件并写入内容（原子写入）"""
+    from tools.files import atomic_write
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(content)
+        atomic_write(filename, content.encode('utf-8'))
         return f"文件 {filename} 创建成功"
     except Exception as e:
         return f"文件创建失败: {e}"
\ No newline at end of file